@@ -1,6 +1,15 @@
 from flask import Flask
-from app.extensions import db
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.extensions import db, response_cache
 from app.routes import register_routes
+from app.cli import register_commands
+from app.snapshot import snapshot_store
+from app.versioning import version_tracker
+from app.db_pool import configure_engine, engine_options
+from app.replicas import replica_router
+from app.metrics import instrumentation
+from app.compression import response_compressor
+from app.ratelimit import rate_limiter
 import os
 from dotenv import load_dotenv
 
@@ -21,9 +30,59 @@ def create_app(config_name=None):
     database_uri = f'postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}'
     app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
     app.config['TESTING'] = config_name == 'testing'
+    app.config['SWIFT_CACHE_SIZE'] = int(os.getenv('SWIFT_CACHE_SIZE', 10000))
+    app.config['SWIFT_CACHE_TTL'] = float(os.getenv('SWIFT_CACHE_TTL', 300))
+    app.config['SWIFT_SNAPSHOT'] = \
+        os.getenv('SWIFT_SNAPSHOT', '0').lower() in ('1', 'true')
+    app.config['SWIFT_SNAPSHOT_REFRESH'] = \
+        float(os.getenv('SWIFT_SNAPSHOT_REFRESH', 60))
+    app.config['SWIFT_SNAPSHOT_FILE'] = os.getenv('SWIFT_SNAPSHOT_FILE') or None
+    app.config['SWIFT_BATCH_LOOKUP_LIMIT'] = \
+        int(os.getenv('SWIFT_BATCH_LOOKUP_LIMIT', 100000))
+    app.config['SWIFT_BULK_LIMIT'] = int(os.getenv('SWIFT_BULK_LIMIT', 100000))
+    app.config['SWIFT_PAGE_LIMIT'] = int(os.getenv('SWIFT_PAGE_LIMIT', 1000))
+    app.config['SWIFT_SEARCH_LIMIT'] = int(os.getenv('SWIFT_SEARCH_LIMIT', 100))
+    app.config['SWIFT_VERSION_TTL'] = float(os.getenv('SWIFT_VERSION_TTL', 1))
+    app.config['SWIFT_HTTP_MAX_AGE'] = int(os.getenv('SWIFT_HTTP_MAX_AGE', 0))
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [
+        uri.strip() for uri in os.getenv('DB_REPLICA_URIS', '').split(',')
+        if uri.strip()
+    ]
+    app.config['SWIFT_REPLICA_STRATEGY'] = \
+        os.getenv('DB_REPLICA_STRATEGY', 'round_robin')
+    app.config['SWIFT_REPLICA_STICKY'] = float(os.getenv('DB_REPLICA_STICKY', 5))
+    app.config['SWIFT_METRICS'] = \
+        os.getenv('SWIFT_METRICS', '0').lower() in ('1', 'true')
+    app.config['SWIFT_SLOW_REQUEST_MS'] = float(os.getenv('SWIFT_SLOW_REQUEST_MS', 0))
+    app.config['SWIFT_COMPRESSION_MIN_SIZE'] = \
+        int(os.getenv('SWIFT_COMPRESSION_MIN_SIZE', 1024))
+    app.config['SWIFT_GZIP_LEVEL'] = int(os.getenv('SWIFT_GZIP_LEVEL', 6))
+    app.config['SWIFT_BROTLI_QUALITY'] = int(os.getenv('SWIFT_BROTLI_QUALITY', 5))
+    app.config['SWIFT_RATE_LIMIT'] = float(os.getenv('SWIFT_RATE_LIMIT', 0))
+    app.config['SWIFT_RATE_LIMIT_BURST'] = int(os.getenv('SWIFT_RATE_LIMIT_BURST', 0))
+    app.config['SWIFT_RATE_LIMIT_BACKEND'] = \
+        os.getenv('SWIFT_RATE_LIMIT_BACKEND', 'memory')
+    app.config['SWIFT_API_KEYS'] = [
+        key.strip() for key in os.getenv('SWIFT_API_KEYS', '').split(',') if key.strip()
+    ]
+    app.config['SWIFT_TRUSTED_PROXIES'] = int(os.getenv('SWIFT_TRUSTED_PROXIES', 0))
+
+    if app.config['SWIFT_TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['SWIFT_TRUSTED_PROXIES'])
 
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+    replica_router.init_app(app)
+    instrumentation.init_app(app)
+    response_compressor.init_app(app)
+    rate_limiter.init_app(app)
+    response_cache.init_app(app)
+    snapshot_store.init_app(app)
+    version_tracker.init_app(app)
     register_routes(app)
+    register_commands(app)
 
     return app
@@ -0,0 +1,535 @@
+import asyncio
+import io
+import logging
+import time
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException, BadRequest, Conflict, NotFound
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.routing import Map, Rule
+from werkzeug.wrappers import Request, Response
+from app import create_app
+from app.db_pool import async_database_uri, async_engine_options, configure_engine
+from app.extensions import response_cache
+from app.metrics import instrumentation, registry, CONTENT_TYPE
+from app.queries import (details_query, split_details, banks_query, branches_query,
+                         group_branches, country_query, search_query,
+                         insert_banks_query, delete_banks_query)
+from app.compression import CachedResponse, response_compressor
+from app.coalescing import AsyncSingleFlight
+from app.ratelimit import rate_limiter
+from app.routes import (BATCH_LOOKUP_CHUNK_SIZE, invalidate_cached, page_args,
+                        read_bulk_items, requested_swift_codes, prepare_bulk_items,
+                        bulk_add_summary, bulk_delete_summary, bank_payload_error,
+                        bank_values, lookup_item, search_args, validation_results,
+                        country_cache_key)
+from app.snapshot import BankRecord
+from app.stats import (stats_statements, country_stats_query, headquarter_stats_query,
+                       stats_payload)
+from app.serializers import (dumps, json_response, wants_pretty, wants_columnar,
+                             bank_details, country_entry, country_listing,
+                             search_results, JSON_MIMETYPE)
+from app.versioning import (VersionTracker, dataset_version_query, version_state,
+                            bump_version_query, make_etag, not_modified,
+                            set_cache_headers)
+
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 1000
+
+
+class StreamingResponse(Response):
+    def __init__(self, chunks, release=None, **kwargs):
+        super().__init__(**kwargs)
+        self.chunks = chunks
+        self.release = release
+
+
+class AsyncVersionTracker(VersionTracker):
+    def __init__(self, engine, ttl=1.0):
+        super().__init__(ttl)
+        self.engine = engine
+        self._refreshing = None
+        self._refreshing_loop = None
+
+    def refreshing(self):
+        # Made inside the running loop: the app is built at import time, and
+        # before Python 3.10 a lock created then binds to the default loop
+        # rather than the server's.
+        loop = asyncio.get_running_loop()
+        if self._refreshing_loop is not loop:
+            self._refreshing, self._refreshing_loop = asyncio.Lock(), loop
+        return self._refreshing
+
+    async def current(self):
+        if (self._checked_at is not None
+                and time.monotonic() - self._checked_at < self.ttl):
+            return self.version, self.updated_at
+
+        async with self.refreshing():
+            if (self._checked_at is None
+                    or time.monotonic() - self._checked_at >= self.ttl):
+                try:
+                    async with self.engine.connect() as conn:
+                        row = (await conn.execute(dataset_version_query())).first()
+                    self.version, self.updated_at = version_state(row)
+                except Exception as e:
+                    logger.error(f"Error while reading dataset version: {e}")
+                self._checked_at = time.monotonic()
+        return self.version, self.updated_at
+
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+    }
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def send_response(send, response):
+    headers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+               for name, value in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code,
+                "headers": headers})
+
+    if isinstance(response, StreamingResponse):
+        async for chunk in response.chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    else:
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+
+class AsyncSwiftApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        # Both are wired into the Flask routes only; serving without them
+        # would silently read from the primary instead.
+        unsupported = [name for name, enabled in (
+            ("SWIFT_SNAPSHOT", self.config["SWIFT_SNAPSHOT"]),
+            ("DB_REPLICA_URIS", self.config["SQLALCHEMY_REPLICA_URIS"]),
+        ) if enabled]
+        if unsupported:
+            raise RuntimeError(f"{' and '.join(unsupported)} not supported in async "
+                               f"mode; unset it or serve the WSGI app")
+        self.engine = create_async_engine(
+            async_database_uri(self.config["SQLALCHEMY_DATABASE_URI"]),
+            **async_engine_options()
+        )
+        configure_engine(self.engine.sync_engine)
+        if instrumentation.enabled:
+            instrumentation.instrument_engine(self.engine.sync_engine, "async")
+        # ProxyFix only rewrites the environ it passes on, so wrapping a
+        # function that returns it applies the same X-Forwarded-For rules.
+        self.proxy_fix = None
+        if self.config["SWIFT_TRUSTED_PROXIES"]:
+            self.proxy_fix = ProxyFix(lambda environ, start_response: environ,
+                                      x_for=self.config["SWIFT_TRUSTED_PROXIES"])
+        self.versions = AsyncVersionTracker(self.engine,
+                                            self.config["SWIFT_VERSION_TTL"])
+        self.details_flight = AsyncSingleFlight("details")
+        self.country_flight = AsyncSingleFlight("country")
+        self.url_map = Map([
+            Rule("/v1/swift-codes/<swift_code>", methods=["GET"],
+                 endpoint=self.get_swift_code_details),
+            Rule("/v1/swift-codes/country/<country_iso2>", methods=["GET"],
+                 endpoint=self.get_swift_codes_by_country),
+            Rule("/v1/swift-codes/stats", methods=["GET"],
+                 endpoint=self.get_swift_code_stats),
+            Rule("/v1/swift-codes/search", methods=["GET"],
+                 endpoint=self.search_swift_codes),
+            Rule("/v1/swift-codes/batch-lookup", methods=["POST"],
+                 endpoint=self.batch_lookup_swift_codes),
+            Rule("/v1/swift-codes/validate", methods=["POST"],
+                 endpoint=self.validate_swift_codes),
+            Rule("/v1/swift-codes", methods=["POST"], endpoint=self.add_swift_code),
+            Rule("/v1/swift-codes/<swift_code>", methods=["DELETE"],
+                 endpoint=self.delete_swift_code),
+            Rule("/v1/swift-codes/bulk", methods=["POST"],
+                 endpoint=self.bulk_add_swift_codes),
+            Rule("/v1/swift-codes/bulk", methods=["DELETE"],
+                 endpoint=self.bulk_delete_swift_codes),
+            Rule("/metrics", methods=["GET"], endpoint=self.get_metrics),
+        ])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        if self.proxy_fix is not None:
+            environ = self.proxy_fix(environ, None)
+        request = Request(environ)
+        response = await self.dispatch(request)
+        await send_response(send, response)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def dispatch(self, request):
+        if not instrumentation.enabled:
+            return self.compress((await self.limit_or_handle(request))[1], request)
+
+        timer, token = instrumentation.start_request()
+        rule, response = await self.limit_or_handle(request)
+        response = self.compress(response, request)
+        instrumentation.finish_request(timer, token, request.method,
+                                       rule.rule if rule else "unmatched",
+                                       response.status_code, request.path)
+        return response
+
+    def compress(self, response, request):
+        if not response_compressor.enabled or isinstance(response, StreamingResponse):
+            return response
+        return response_compressor.compress_response(response, request)
+
+    async def limit_or_handle(self, request):
+        if rate_limiter.enabled:
+            if rate_limiter.blocking:
+                limited = await asyncio.to_thread(rate_limiter.check, request)
+            else:
+                limited = rate_limiter.check(request)
+            if limited is not None:
+                return None, limited
+        return await self.handle(request)
+
+    async def handle(self, request):
+        rule = None
+        try:
+            adapter = self.url_map.bind_to_environ(request.environ)
+            rule, values = adapter.match(return_rule=True)
+            return rule, await rule.endpoint(request, **values)
+        except HTTPException as e:
+            return rule, json_response({"message": e.description}, e.code,
+                                       pretty=False)
+        except Exception as e:
+            logger.error(f"Internal error during {request.method} {request.path}: {e}")
+            return rule, json_response({"message": "Internal Server Error"}, 500,
+                                       pretty=False)
+
+    async def dataset_state(self):
+        version, updated_at = await self.versions.current()
+        max_age = self.config["SWIFT_HTTP_MAX_AGE"]
+        return version, make_etag(version), updated_at, max_age
+
+    async def conditional(self, request, response, etag, updated_at, max_age):
+        # Like versioning.conditional_response, but a dropped stream has to
+        # hand its connection back.
+        unchanged = not_modified(etag, updated_at, max_age, request)
+        if unchanged is None:
+            return set_cache_headers(response, etag, updated_at, max_age)
+        if isinstance(response, StreamingResponse) and response.release:
+            await response.release()
+        return unchanged
+
+    async def cached_render(self, key, version, render, flight):
+        cached = response_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        async def load():
+            entry = (version, await render(), {})
+            response_cache.set(key, entry)
+            return entry[1], entry[2]
+
+        return await flight.do((key, version), load)
+
+    async def get_swift_code_details(self, request, swift_code):
+        swift_code = swift_code.upper()
+        version, etag, updated_at, max_age = await self.dataset_state()
+        pretty = wants_pretty(request)
+
+        async def render():
+            async with self.engine.connect() as conn:
+                rows = await conn.execute(details_query(swift_code))
+            bank, branches = split_details(rows, swift_code)
+            if not bank:
+                raise NotFound("SWIFT code not found")
+            return dumps(bank_details(bank, branches), pretty)
+
+        if pretty:
+            body, encoded = await render(), {}
+        else:
+            body, encoded = await self.cached_render(swift_code, version, render,
+                                                     self.details_flight)
+
+        response = CachedResponse(body, encoded, mimetype=JSON_MIMETYPE)
+        return await self.conditional(request, response, etag, updated_at, max_age)
+
+    async def get_swift_codes_by_country(self, request, country_iso2):
+        country_iso2 = country_iso2.upper()
+        limit, after = page_args(self.config["SWIFT_PAGE_LIMIT"], request)
+        paginated = limit is not None or after is not None
+        version, etag, updated_at, max_age = await self.dataset_state()
+        columnar = wants_columnar(request)
+        pretty = wants_pretty(request)
+        if request.args.get("stream") == "1" and not paginated and not columnar:
+            response = await self.stream_country_listing(country_iso2)
+            return await self.conditional(request, response, etag, updated_at, max_age)
+
+        async def fetch():
+            fetch_limit = limit + 1 if limit is not None else None
+            async with self.engine.connect() as conn:
+                query = country_query(country_iso2, fetch_limit, after)
+                banks = (await conn.execute(query)).all()
+            if not banks and after is None:
+                raise NotFound("No SWIFT codes found for the specified country")
+            return banks
+
+        if not paginated:
+            async def render():
+                return dumps(country_listing(country_iso2, await fetch(), columnar),
+                             pretty)
+
+            if pretty:
+                body, encoded = await render(), {}
+            else:
+                body, encoded = await self.cached_render(
+                    country_cache_key(country_iso2, columnar), version, render,
+                    self.country_flight)
+            response = CachedResponse(body, encoded, mimetype=JSON_MIMETYPE)
+            return await self.conditional(request, response, etag, updated_at, max_age)
+
+        banks = await fetch()
+        listing = country_listing(country_iso2, banks[:limit], columnar)
+        has_more = limit is not None and len(banks) > limit
+        listing["nextAfter"] = banks[limit - 1].swift_code if has_more else None
+        response = json_response(listing, pretty=pretty)
+        return await self.conditional(request, response, etag, updated_at, max_age)
+
+    async def stream_country_listing(self, country_iso2):
+        conn = await self.engine.connect()
+        try:
+            rows = await conn.stream(country_query(country_iso2),
+                                     execution_options={"yield_per": 1000})
+            first = await rows.fetchone()
+        except Exception:
+            await conn.close()
+            raise
+        if first is None:
+            await conn.close()
+            raise NotFound("No SWIFT codes found for the specified country")
+
+        async def generate():
+            try:
+                yield (b'{"countryISO2":' + dumps(country_iso2) +
+                       b',"countryName":' + dumps(first.country_name) +
+                       b',"swiftCodes":[')
+                yield dumps(country_entry(first))
+                async for row in rows:
+                    yield b"," + dumps(country_entry(row))
+                yield b"]}"
+            finally:
+                await conn.close()
+
+        return StreamingResponse(generate(), conn.close, mimetype=JSON_MIMETYPE)
+
+    async def get_swift_code_stats(self, request):
+        country_iso2 = request.args.get("country", "").strip().upper() or None
+        limit, _ = page_args(self.config["SWIFT_PAGE_LIMIT"], request)
+        _, etag, updated_at, max_age = await self.dataset_state()
+        headquarters = None
+        async with self.engine.connect() as conn:
+            countries = (await conn.execute(country_stats_query(country_iso2))).all()
+            if country_iso2 is not None:
+                headquarters = (await conn.execute(
+                    headquarter_stats_query(country_iso2, limit or 100)
+                )).all()
+        if country_iso2 is not None and not countries:
+            raise NotFound("No SWIFT codes found for the specified country")
+
+        response = json_response(stats_payload(countries, headquarters),
+                                 pretty=wants_pretty(request))
+        return await self.conditional(request, response, etag, updated_at, max_age)
+
+    async def search_swift_codes(self, request):
+        prefix, name, country_iso2, limit = search_args(
+            self.config["SWIFT_SEARCH_LIMIT"], request)
+        _, etag, updated_at, max_age = await self.dataset_state()
+        async with self.engine.connect() as conn:
+            query = search_query(prefix, name, country_iso2, limit)
+            banks = (await conn.execute(query)).all()
+        response = json_response(search_results(banks, wants_columnar(request)),
+                                 pretty=wants_pretty(request))
+        return await self.conditional(request, response, etag, updated_at, max_age)
+
+    async def batch_lookup_results(self, swift_codes, include_branches=False,
+                                   chunk_size=BATCH_LOOKUP_CHUNK_SIZE):
+        async with self.engine.connect() as conn:
+            for start in range(0, len(swift_codes), chunk_size):
+                chunk = swift_codes[start:start + chunk_size]
+                rows = await conn.execute(banks_query(set(chunk)))
+                found = {row.swift_code: row for row in rows}
+
+                branches = {}
+                headquarters = {code for code, bank in found.items()
+                                if bank.is_headquarter}
+                if include_branches and headquarters:
+                    rows = await conn.execute(branches_query(headquarters))
+                    branches = group_branches(rows)
+
+                for code in chunk:
+                    code_branches = branches.get(code, []) if include_branches else None
+                    yield lookup_item(code, found.get(code), code_branches)
+
+    async def batch_lookup_swift_codes(self, request):
+        data = request.get_json(force=True)
+        swift_codes = requested_swift_codes(data,
+                                            self.config["SWIFT_BATCH_LOOKUP_LIMIT"],
+                                            "batch lookup")
+        results = self.batch_lookup_results(swift_codes,
+                                            bool(data.get("includeBranches")))
+
+        streaming = (request.args.get("format") == "ndjson" or
+                     request.accept_mimetypes.best == "application/x-ndjson")
+        if streaming:
+            async def generate():
+                async for item in results:
+                    yield dumps(item) + b"\n"
+
+            return StreamingResponse(generate(), mimetype="application/x-ndjson")
+
+        items = [item async for item in results]
+        return json_response({"results": items}, pretty=wants_pretty(request))
+
+    async def validate_swift_codes(self, request):
+        swift_codes = requested_swift_codes(request.get_json(force=True),
+                                            self.config["SWIFT_BATCH_LOOKUP_LIMIT"],
+                                            "validation request")
+        return json_response(validation_results(swift_codes),
+                             pretty=wants_pretty(request))
+
+    async def record_changes(self, conn, banks, sign):
+        for stmt in stats_statements(banks, sign):
+            await conn.execute(stmt)
+        return (await conn.execute(bump_version_query())).one()
+
+    def committed(self, bumped, swift_codes):
+        if bumped is not None:
+            self.versions.update(bumped)
+        for swift_code in swift_codes:
+            invalidate_cached(swift_code)
+
+    async def add_swift_code(self, request):
+        data = request.get_json(force=True)
+
+        error = bank_payload_error(data)
+        if error:
+            raise BadRequest(error)
+
+        values = bank_values(data)
+        swift_code = values["swift_code"]
+        async with self.engine.begin() as conn:
+            if not (await conn.scalars(insert_banks_query([values]))).all():
+                raise Conflict("SWIFT code already exists")
+            bumped = await self.record_changes(conn, [BankRecord(**values)], 1)
+
+        self.committed(bumped, [swift_code])
+        return json_response({
+            "message": f"SWIFT code, with value {swift_code} added successfully"
+        }, 201, pretty=False)
+
+    async def delete_swift_code(self, request, swift_code):
+        swift_code = swift_code.upper()
+        async with self.engine.begin() as conn:
+            deleted = (await conn.execute(delete_banks_query([swift_code]))).all()
+            if not deleted:
+                raise NotFound("SWIFT code not found")
+            bumped = await self.record_changes(conn, deleted, -1)
+
+        self.committed(bumped, [swift_code])
+        return json_response({
+            "message": f"SWIFT code, with value {swift_code} deleted successfully"
+        }, 200, pretty=False)
+
+    async def bulk_add_swift_codes(self, request):
+        items = read_bulk_items(request)
+        limit = self.config["SWIFT_BULK_LIMIT"]
+        if len(items) > limit:
+            raise BadRequest(f"At most {limit} SWIFT codes per bulk request")
+
+        results, values = prepare_bulk_items(items)
+        created = set()
+        bumped = None
+        async with self.engine.begin() as conn:
+            for start in range(0, len(values), WRITE_BATCH_SIZE):
+                batch = values[start:start + WRITE_BATCH_SIZE]
+                created.update(await conn.scalars(insert_banks_query(batch)))
+            if created:
+                records = [BankRecord(**row) for row in values
+                           if row["swift_code"] in created]
+                bumped = await self.record_changes(conn, records, 1)
+
+        self.committed(bumped, created)
+        return json_response(bulk_add_summary(results, created),
+                             pretty=wants_pretty(request))
+
+    async def bulk_delete_swift_codes(self, request):
+        swift_codes = requested_swift_codes(request.get_json(force=True),
+                                            self.config["SWIFT_BULK_LIMIT"],
+                                            "bulk request")
+        unique = list(dict.fromkeys(swift_codes))
+        deleted = {}
+        bumped = None
+        async with self.engine.begin() as conn:
+            for start in range(0, len(unique), WRITE_BATCH_SIZE):
+                batch = unique[start:start + WRITE_BATCH_SIZE]
+                rows = await conn.execute(delete_banks_query(batch))
+                deleted.update((row.swift_code, row) for row in rows)
+            if deleted:
+                bumped = await self.record_changes(conn, deleted.values(), -1)
+
+        self.committed(bumped, deleted)
+        return json_response(bulk_delete_summary(swift_codes, deleted),
+                             pretty=wants_pretty(request))
+
+    async def get_metrics(self, request):
+        if not instrumentation.enabled:
+            raise NotFound("Metrics are disabled")
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def create_asgi_app(config_name=None):
+    return AsyncSwiftApp(create_app(config_name))
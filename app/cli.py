@@ -0,0 +1,116 @@
+import os
+import json
+import click
+from sqlalchemy import text
+from app.extensions import db
+from app.data_parser import parse_swift_codes, DEFAULT_BATCH_SIZE
+from app.importer import import_files, load_snapshot_file, reload_files
+from app.snapshot_file import dump_snapshot_file
+from app.metrics import write_metrics_file
+from app.search import ensure_trigram_index
+from app.stats import refresh_stats, stats_missing
+
+
+IMPORT_LOCK_KEY = 9362
+
+
+def acquire_import_lock():
+    return db.session.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": IMPORT_LOCK_KEY}
+    ).scalar()
+
+
+def prepare_database():
+    # Only called while holding the import lock, in the same transaction, so
+    # concurrent imports never race to create tables or rebuild the stats.
+    db.metadata.create_all(db.session.connection())
+    ensure_trigram_index()
+    if stats_missing():
+        refresh_stats()
+
+
+def register_commands(app):
+    @app.cli.command("import-swift-codes")
+    @click.option("--file", "filenames", default=["swift_codes.csv"], show_default=True,
+                  multiple=True, type=click.Path(exists=True),
+                  help="CSV file with the SWIFT directory, or a directory of CSV "
+                       "files. Repeat to import several; later files win on "
+                       "duplicate codes.")
+    @click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True,
+                  type=click.IntRange(min=1), help="Rows per read chunk and upsert.")
+    @click.option("--dry-run", is_flag=True,
+                  help="Run the whole import and roll it back.")
+    @click.option("--full", is_flag=True,
+                  help="Re-import every row even if the file has not changed.")
+    @click.option("--reject-file", type=click.Path(dir_okay=False),
+                  help="Write rows that fail ISO 9362 validation to this CSV file.")
+    @click.option("--workers", default=1, show_default=True, type=click.IntRange(min=0),
+                  help="Processes parsing files in parallel (0 = one per CPU).")
+    @click.option("--writers", default=1, show_default=True, type=click.IntRange(min=1),
+                  help="Database connections staging partitions of the codes in "
+                       "parallel.")
+    @click.option("--swap", is_flag=True,
+                  help="Replace the whole dataset: load the files into a shadow "
+                       "table, index and validate it, then swap it in atomically. "
+                       "Codes missing from the files are removed.")
+    @click.option("--snapshot-out", type=click.Path(dir_okay=False),
+                  help="After the import, write the dataset to this binary snapshot "
+                       "file.")
+    @click.option("--metrics-file", type=click.Path(dir_okay=False),
+                  help="Write the import metrics to this file in Prometheus text "
+                       "format.")
+    def import_swift_codes(filenames, batch_size, dry_run, full, reject_file, workers,
+                           writers, swap, snapshot_out, metrics_file):
+        """Import SWIFT codes from CSV files into the database."""
+        try:
+            if not acquire_import_lock():
+                raise click.ClickException(
+                    "Another SWIFT code import is already running.")
+            prepare_database()
+
+            single_file = len(filenames) == 1 and os.path.isfile(filenames[0])
+            if swap:
+                stats = reload_files(filenames, workers or None, batch_size,
+                                     dry_run=dry_run, reject_file=reject_file)
+            elif single_file and workers == 1 and writers == 1:
+                stats = parse_swift_codes(filenames[0], batch_size,
+                                          incremental=not full, dry_run=dry_run,
+                                          reject_file=reject_file)
+            else:
+                stats = import_files(filenames, workers or None, writers, batch_size,
+                                     incremental=not full, dry_run=dry_run,
+                                     reject_file=reject_file)
+        finally:
+            db.session.rollback()
+
+        click.echo(json.dumps(stats.as_dict()))
+        if metrics_file:
+            write_metrics_file(metrics_file, "swift_import")
+        if stats.error:
+            raise click.ClickException(f"Import failed: {stats.error}")
+
+        if snapshot_out and not dry_run:
+            dump_snapshot_file(snapshot_out)
+            db.session.rollback()
+
+    @app.cli.command("load-snapshot")
+    @click.option("--file", "filename", required=True,
+                  type=click.Path(exists=True, dir_okay=False),
+                  help="Binary snapshot written by import-swift-codes --snapshot-out.")
+    @click.option("--dry-run", is_flag=True,
+                  help="Run the whole load and roll it back.")
+    def load_snapshot(filename, dry_run):
+        """Replace the SWIFT codes in the database with a binary snapshot."""
+        try:
+            if not acquire_import_lock():
+                raise click.ClickException(
+                    "Another SWIFT code import is already running.")
+            db.metadata.create_all(db.session.connection())
+
+            stats = load_snapshot_file(filename, dry_run=dry_run)
+        finally:
+            db.session.rollback()
+
+        click.echo(json.dumps(stats.as_dict()))
+        if stats.error:
+            raise click.ClickException(f"Snapshot load failed: {stats.error}")
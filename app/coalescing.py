@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from app.metrics import registry
+
+
+coalesced_requests = registry.counter(
+    "swift_coalesced_requests_total",
+    "Requests that waited for an identical in-flight lookup instead of "
+    "querying the database.", ["route"])
+
+
+class Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            coalesced_requests.inc(self.name)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class AsyncSingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+
+    async def do(self, key, fn):
+        task = self._flights.get(key)
+        if task is None:
+            task = self._flights[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            coalesced_requests.inc(self.name)
+        # Shielded so a caller that goes away does not cancel the query the
+        # others are waiting for.
+        return await asyncio.shield(task)
+
+
+details_flight = SingleFlight("details")
+country_flight = SingleFlight("country")
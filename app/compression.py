@@ -0,0 +1,89 @@
+import gzip
+from flask import Response, request
+from app.versioning import encoded_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson"}
+
+
+class CachedResponse(Response):
+    # A response whose body comes from the response cache; `encoded` is the
+    # dict of compressed bodies stored in the same cache entry, so each
+    # encoding is compressed once per dataset version.
+    def __init__(self, body, encoded, **kwargs):
+        super().__init__(body, **kwargs)
+        self.encoded = encoded
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(req):
+    # Brotli wins ties with gzip; `*` and q-values are honoured.
+    return req.accept_encodings.best_match(available_encodings())
+
+
+def compress(body, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # A fixed mtime keeps the bytes, and so the cached copies, stable.
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class ResponseCompressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def init_app(self, app):
+        self.min_size = app.config.get("SWIFT_COMPRESSION_MIN_SIZE", self.min_size)
+        self.gzip_level = app.config.get("SWIFT_GZIP_LEVEL", self.gzip_level)
+        self.brotli_quality = app.config.get("SWIFT_BROTLI_QUALITY",
+                                             self.brotli_quality)
+        if self.enabled:
+            app.after_request(self.after_request)
+
+    @property
+    def enabled(self):
+        return self.min_size > 0
+
+    def after_request(self, response):
+        return self.compress_response(response, request)
+
+    def compress_response(self, response, req):
+        if (response.status_code != 200 or response.is_streamed
+                or response.direct_passthrough or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding(req)
+        if encoding is None:
+            return response
+
+        encoded = getattr(response, "encoded", None)
+        data = encoded.get(encoding) if encoded is not None else None
+        if data is None:
+            data = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            if encoded is not None:
+                encoded[encoding] = data
+
+        response.set_data(data)
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(encoded_etag(etag, encoding), weak)
+        return response
+
+
+response_compressor = ResponseCompressor()
@@ -1,68 +1,368 @@
+import os
+import time
+import hashlib
 import pandas as pd
 import logging
+from contextlib import contextmanager
+from sqlalchemy import delete, exists, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import insert
 from app.models.bank import Bank
-from app.extensions import db
+from app.models.import_file import ImportedFile, ImportedCode
+from app.extensions import db, response_cache
+from app.snapshot import snapshot_store
+from app.versioning import bump_dataset_version
+from app.stats import refresh_stats
+from app.validation import swift_code_checks, REASONS
+from app.metrics import record_import
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 5000
 
-def parse_swift_codes(filename):
+CSV_COLUMNS = {
+    "SWIFT CODE": "swift_code",
+    "ADDRESS": "address",
+    "NAME": "bank_name",
+    "COUNTRY ISO2 CODE": "country_iso2",
+    "COUNTRY NAME": "country_name",
+}
+
+BANK_FIELDS = [
+    "swift_code", "address", "bank_name", "country_iso2",
+    "country_name", "is_headquarter", "associated_headquarter"
+]
+
+RECORD_FIELDS = BANK_FIELDS + ["row_hash"]
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.rejected = 0
+        self.linked = 0
+        self.skipped = False
+        self.elapsed = 0.0
+        self.error = None
+        self.files = []
+        self.phases = {}
+
+    def add(self, other):
+        self.rows += other.rows
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.deleted += other.deleted
+        self.rejected += other.rejected
+        self.add_phases(other.phases)
+
+    def add_phases(self, phases):
+        for name, elapsed in phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phases({name: time.perf_counter() - started})
+
+    def timed(self, name, iterable):
+        # Charges the time spent producing each item to the phase.
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, None)
+            if item is None:
+                return
+            yield item
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "deleted": self.deleted,
+            "rejected": self.rejected,
+            "linked": self.linked,
+            "skipped": self.skipped,
+            "elapsed": round(self.elapsed, 3),
+            "rowsPerSec": round(self.rows_per_sec, 1),
+            "files": self.files,
+            "phases": {name: round(elapsed, 3)
+                       for name, elapsed in self.phases.items()},
+        }
+
+    def __repr__(self):
+        return (f"ImportStats(rows={self.rows}, inserted={self.inserted}, "
+                f"updated={self.updated}, unchanged={self.unchanged}, "
+                f"deleted={self.deleted}, rejected={self.rejected}, "
+                f"rows_per_sec={self.rows_per_sec:.0f})")
+
+
+def resolve_headquarters(codes, headquarters=None):
+    is_headquarter = codes.str.endswith("XXX")
+    if headquarters is None:
+        headquarters = set(codes[is_headquarter])
+
+    candidates = codes.str[:8] + "XXX"
+    associated = candidates.where(~is_headquarter & candidates.isin(headquarters))
+    return is_headquarter, associated
+
+
+def split_invalid(df):
+    reasons = swift_code_checks(df["SWIFT CODE"].str.upper(),
+                                df["COUNTRY ISO2 CODE"].str.upper())
+    valid = reasons == 0
+    if valid.all():
+        return df, df.iloc[0:0]
+
+    rejected = df[~valid].copy()
+    rejected.insert(0, "LINE", rejected.index + 2)
+    rejected["REASON"] = [REASONS[reason - 1] for reason in reasons[~valid]]
+    return df[valid], rejected
+
+
+def write_rejects(rejected, reject_file, header):
+    rejected.to_csv(reject_file, mode="w" if header else "a", header=header,
+                    index=False)
+
+
+def clean_frame(df, headquarters=None):
+    df = df.rename(columns=CSV_COLUMNS)
+    df["swift_code"] = df["swift_code"].str.upper()
+    df["country_iso2"] = df["country_iso2"].str.upper()
+    df["country_name"] = df["country_name"].str.upper()
+    df = df.drop_duplicates(subset="swift_code", keep="last")
+
+    df["is_headquarter"], df["associated_headquarter"] = resolve_headquarters(
+        df["swift_code"], headquarters
+    )
+
+    df = df[BANK_FIELDS]
+    row_hash = pd.util.hash_pandas_object(df, index=False).astype("int64")
+
+    df = df.astype(object).where(df.notna(), None)
+    df["row_hash"] = row_hash
+    return df
+
+
+def upsert_statement(stmt):
+    table = Bank.__table__
+    updatable = [name for name in RECORD_FIELDS if name != "swift_code"]
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.swift_code],
+        set_={name: stmt.excluded[name] for name in updatable},
+        where=or_(*(table.c[name].is_distinct_from(stmt.excluded[name])
+                    for name in updatable)),
+    ).returning(literal_column("xmax = 0").label("inserted"))
+
+
+def count_upserted(rows):
+    inserted = sum(1 for row in rows if row.inserted)
+    return inserted, len(rows) - inserted
+
+
+def upsert_banks(records, connection=None):
+    if not records:
+        return 0, 0
+
+    # Parameters go through executemany so the statement is compiled once
+    # and cached; SQLAlchemy still sends them as multi-row VALUES pages.
+    stmt = upsert_statement(insert(Bank.__table__))
+    return count_upserted((connection or db.session).execute(stmt, records).all())
+
+
+def write_batches(records, stats, batch_size=DEFAULT_BATCH_SIZE, connection=None):
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        inserted, updated = upsert_banks(batch, connection)
+        stats.rows += len(batch)
+        stats.inserted += inserted
+        stats.updated += updated
+        stats.unchanged += len(batch) - inserted - updated
+
+
+def claim_codes(source, codes, batch_size=DEFAULT_BATCH_SIZE):
+    # Records `codes` as coming from `source`, taking them over from any
+    # other file, and returns the codes `source` had before but no longer has.
+    previous = set(db.session.scalars(
+        select(ImportedCode.swift_code).where(ImportedCode.source == source)))
+    released = sorted(previous - codes)
+    claimed = sorted(codes - previous)
+    for start in range(0, len(released), batch_size):
+        db.session.execute(delete(ImportedCode).where(
+            ImportedCode.source == source,
+            ImportedCode.swift_code.in_(released[start:start + batch_size])))
+
+    stmt = insert(ImportedCode)
+    stmt = stmt.on_conflict_do_update(index_elements=[ImportedCode.swift_code],
+                                      set_={"source": stmt.excluded.source})
+    for start in range(0, len(claimed), batch_size):
+        db.session.execute(stmt, [{"swift_code": code, "source": source}
+                                  for code in claimed[start:start + batch_size]])
+    return released
+
+
+def delete_released(codes, batch_size=DEFAULT_BATCH_SIZE):
+    # Only codes no imported file claims any more: a code that moved to
+    # another file, or was added through the API, stays.
+    codes = sorted(codes)
+    deleted = 0
+    for start in range(0, len(codes), batch_size):
+        result = db.session.execute(delete(Bank).where(
+            Bank.swift_code.in_(codes[start:start + batch_size]),
+            ~exists().where(ImportedCode.swift_code == Bank.swift_code)))
+        deleted += result.rowcount
+    return deleted
+
+
+def file_digest(filename, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_row_hashes():
+    rows = db.session.execute(
+        select(Bank.swift_code, Bank.row_hash).where(Bank.row_hash.isnot(None))
+    )
+    return dict(rows.all())
+
+
+def filter_changed(records, existing, stats):
+    changed = []
+    for record in records:
+        if existing.pop(record["swift_code"], None) != record["row_hash"]:
+            changed.append(record)
+
+    stats.rows += len(records) - len(changed)
+    stats.unchanged += len(records) - len(changed)
+    return changed
+
+
+def scan_headquarters(filename, chunksize=DEFAULT_BATCH_SIZE):
+    headquarters = set()
+    for chunk in pd.read_csv(filename, usecols=["SWIFT CODE"], chunksize=chunksize):
+        codes = chunk["SWIFT CODE"].str.upper()
+        codes = codes[swift_code_checks(codes) == 0]
+        headquarters.update(codes[codes.str.endswith("XXX")])
+    return headquarters
+
+
+def read_chunks(filename, chunksize=DEFAULT_BATCH_SIZE):
+    return pd.read_csv(filename, usecols=list(CSV_COLUMNS), chunksize=chunksize)
+
+
+def finish_import(changed, dry_run=False):
+    if changed:
+        refresh_stats()
+        bump_dataset_version()
+    publish_import(dry_run)
+
+
+def publish_import(dry_run=False):
+    if dry_run:
+        db.session.rollback()
+        logger.info("Dry run, all changes rolled back.")
+    else:
+        db.session.commit()
+        response_cache.clear()
+        if snapshot_store.snapshot is not None:
+            snapshot_store.refresh_in_background()
+
+
+def parse_swift_codes(filename, batch_size=DEFAULT_BATCH_SIZE, return_banks=False,
+                      incremental=False, dry_run=False, reject_file=None):
+    started = time.perf_counter()
+    stats = ImportStats()
     cleaned_data = []
+    existing = None
+    codes = set()
 
     try:
-        df = pd.read_csv(filename)
+        if incremental:
+            source = os.path.abspath(filename)
+            digest = file_digest(filename)
+            imported = db.session.get(ImportedFile, source)
+            if imported is not None and imported.digest == digest:
+                logger.info(f"File {filename} unchanged since last import, skipping.")
+                stats.skipped = True
+                record_import(stats)
+                return [] if return_banks else stats
+            existing = load_row_hashes()
 
-        df["COUNTRY ISO2 CODE"] = df["COUNTRY ISO2 CODE"].str.upper()
-        df["COUNTRY NAME"] = df["COUNTRY NAME"].str.upper()
-        df = df.drop(columns=['CODE TYPE', 'TOWN NAME', 'TIME ZONE'], errors='ignore')
+        with stats.phase("headquarters"):
+            headquarters = scan_headquarters(filename, batch_size)
+        chunks = read_chunks(filename, batch_size)
 
-        logger.info("File successfully read and cleaned.")
+        logger.info(f"File successfully opened, {len(headquarters)} headquarters "
+                    f"found.")
 
     except Exception as e:
         logger.error(f"Error while reading CSV file: {e}")
-        return []
+        stats.error = str(e)
+        db.session.rollback()
+        record_import(stats)
+        return [] if return_banks else stats
 
     try:
-        for _, row in df.iterrows():
-            swift_code = row['SWIFT CODE'].upper()
-            is_headquarter = swift_code.endswith("XXX")
-            associated_hq = None
-
-            if not is_headquarter:
-                associated_hq = swift_code[:8] + "XXX"
-                if df[df['SWIFT CODE'].str.upper() == associated_hq].empty:
-                    associated_hq = None
-
-            bank = Bank(
-                swift_code=swift_code,
-                address=row['ADDRESS'],
-                bank_name=row['NAME'],
-                country_iso2=row['COUNTRY ISO2 CODE'],
-                country_name=row['COUNTRY NAME'],
-                is_headquarter=is_headquarter,
-                associated_headquarter=associated_hq
-            )
-
-            cleaned_data.append(bank)
-
-            existing_bank = Bank.query.filter_by(swift_code=swift_code).first()
-            if existing_bank:
-                existing_bank.address = bank.address
-                existing_bank.bank_name = bank.bank_name
-                existing_bank.country_iso2 = bank.country_iso2
-                existing_bank.country_name = bank.country_name
-                existing_bank.is_headquarter = bank.is_headquarter
-                existing_bank.associated_headquarter = bank.associated_headquarter
-            else:
-                db.session.add(bank)
+        for chunk in stats.timed("read", chunks):
+            with stats.phase("clean"):
+                chunk, rejected = split_invalid(chunk)
+                if len(rejected):
+                    if reject_file is not None:
+                        write_rejects(rejected, reject_file, header=not stats.rejected)
+                    stats.rejected += len(rejected)
 
-        db.session.commit()
-        logger.info("Data inserted successfully.")
+                records = clean_frame(chunk, headquarters).to_dict("records")
+                codes.update(record["swift_code"] for record in records)
+                if return_banks:
+                    cleaned_data.extend(Bank(**record) for record in records)
+                if existing is not None:
+                    records = filter_changed(records, existing, stats)
+            with stats.phase("write"):
+                write_batches(records, stats, batch_size)
+
+        if stats.rejected:
+            logger.warning(f"{stats.rejected} rows failed ISO 9362 validation and were "
+                           f"skipped"
+                           + (f", see {reject_file}." if reject_file else "."))
+
+        if existing is not None:
+            with stats.phase("write"):
+                released = claim_codes(source, codes, batch_size)
+                stats.deleted = delete_released(released, batch_size)
+                db.session.merge(ImportedFile(source=source, digest=digest,
+                                              row_count=stats.rows))
+
+        with stats.phase("finish"):
+            finish_import(stats.inserted or stats.updated or stats.deleted, dry_run)
+
+        stats.elapsed = time.perf_counter() - started
+        logger.info(f"Data {'checked' if dry_run else 'inserted'} successfully: "
+                    f"{stats.rows} rows in "
+                    f"{stats.elapsed:.2f}s ({stats.rows_per_sec:.0f} rows/sec), "
+                    f"inserted={stats.inserted}, updated={stats.updated}, "
+                    f"unchanged={stats.unchanged}, deleted={stats.deleted}")
 
     except Exception as e:
         logger.error(f"Database error: {e}")
+        stats.error = str(e)
         db.session.rollback()
 
-    return cleaned_data
+    record_import(stats)
+    return cleaned_data if return_banks else stats
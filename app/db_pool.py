@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+import threading
+import uuid
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql import Select
+
+
+logger = logging.getLogger(__name__)
+
+POOL_MODES = ("queue", "external")
+
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true")
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def metrics(self):
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "checkedOut": self.checkedout(),
+                "overflow": max(self.overflow(), 0),
+                "idle": self.checkedin(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "waitTotal": round(self.wait_total, 6),
+                "waitMax": round(self.wait_max, 6),
+                "waitAvg": (round(self.wait_total / self.checkouts, 6)
+                            if self.checkouts else 0.0),
+            }
+
+
+class RoutingSession(Session):
+    # Plain SELECTs go to the replica picked for this request, if any;
+    # flushes and INSERT/UPDATE/DELETE statements always use the primary.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get("replica")
+        if (bind is None and replica is not None and not self._flushing
+                and (clause is None or isinstance(clause, Select))):
+            return replica
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+def pool_mode(mode=None):
+    mode = (mode or os.getenv("DB_POOL_MODE", "queue")).lower()
+    if mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}, "
+                         f"got {mode!r}")
+    return mode
+
+
+def pool_settings():
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_use_lifo": True,
+    }
+
+
+def engine_options(mode=None):
+    mode = pool_mode(mode)
+    connect_args = {"connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", 5))}
+    options = {
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "1"),
+        "connect_args": connect_args,
+    }
+
+    if mode == "external":
+        # PgBouncer in transaction mode hands out a different server connection
+        # per transaction, so keep no local pool and no session-level settings.
+        options["poolclass"] = NullPool
+        return options
+
+    options.update(poolclass=InstrumentedQueuePool, **pool_settings())
+
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+    if statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    return options
+
+
+def async_database_uri(database_uri, mode=None):
+    url = make_url(database_uri).set(drivername="postgresql+asyncpg")
+    if pool_mode(mode) == "external":
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+    return url
+
+
+def async_engine_options(mode=None):
+    mode = pool_mode(mode)
+    connect_args = {"timeout": int(os.getenv("DB_CONNECT_TIMEOUT", 5))}
+    options = {
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "1"),
+        "connect_args": connect_args,
+    }
+
+    if mode == "external":
+        # asyncpg prepares every statement; under a transaction pooler the
+        # names must be unique and nothing may be cached per connection.
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = \
+            lambda: f"__asyncpg_{uuid.uuid4()}__"
+        options["poolclass"] = NullPool
+        return options
+
+    options.update(pool_settings())
+
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+    if statement_timeout:
+        connect_args["server_settings"] = {"statement_timeout": str(statement_timeout)}
+    return options
+
+
+def configure_engine(engine, mode=None):
+    mode = pool_mode(mode)
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+
+    if mode == "external" and statement_timeout:
+        # Startup options are rejected by PgBouncer, so scope the timeout to
+        # each transaction instead.
+        @event.listens_for(engine, "begin")
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {statement_timeout}")
+
+    logger.info(f"Database pool mode={mode}, pool={engine.pool.status()}")
+
+
+def pool_metrics(engine):
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.metrics()
+    if isinstance(pool, QueuePool):
+        return {"size": pool.size(), "checkedOut": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0), "idle": pool.checkedin()}
+    return {"size": 0, "checkedOut": 0, "overflow": 0, "idle": 0}
+
+
+def dispose_after_fork(engine):
+    # Connections inherited from a preloading parent process must not be
+    # shared; drop them without closing the parent's sockets.
+    engine.dispose(close=False)
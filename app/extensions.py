@@ -1,4 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from app.cache import ResponseCache
+from app.db_pool import RoutingSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+response_cache = ResponseCache()
@@ -0,0 +1,483 @@
+import io
+import os
+import time
+import zlib
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+from sqlalchemy import column, delete, exists, func, select, table, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models.bank import Bank
+from app.models.import_file import ImportedFile, ImportedCode
+from app.data_parser import (DEFAULT_BATCH_SIZE, ImportStats, split_invalid,
+                             clean_frame, read_chunks, scan_headquarters, write_batches,
+                             write_rejects, file_digest, load_row_hashes,
+                             filter_changed, claim_codes, delete_released,
+                             finish_import, publish_import,
+                             upsert_statement, count_upserted, RECORD_FIELDS)
+from app.metrics import record_import
+from app.snapshot_file import FILE_FIELDS, SnapshotFile
+from app.stats import refresh_stats
+from app.table_swap import (SHADOW_TABLE, index_definitions, create_shadow_table,
+                            build_shadow_indexes, validate_shadow, compare_with_live,
+                            hold_writes, swap_shadow_table, drop_shadow_table,
+                            shadow_table)
+from app.versioning import bump_dataset_version, read_dataset_version
+
+
+logger = logging.getLogger(__name__)
+
+# Workers are started with "spawn": the importer's parent process holds
+# database connections and writer threads that must not be forked.
+WORKER_CONTEXT = "spawn"
+
+STAGING_TABLE = f"{Bank.__tablename__}_import_staging"
+
+
+def csv_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(".csv")))
+        else:
+            files.append(path)
+    return files
+
+
+def scan_file(filename, batch_size=DEFAULT_BATCH_SIZE):
+    return file_digest(filename), scan_headquarters(filename, batch_size)
+
+
+def parse_file(filename, headquarters, batches, batch_size=DEFAULT_BATCH_SIZE):
+    # Each cleaned batch and its rejected rows go out through `batches`, a
+    # queue holding one batch, so a worker never keeps more of the file than
+    # that. None marks the end, also when parsing fails.
+    started = time.perf_counter()
+    stats = ImportStats()
+    try:
+        for chunk in stats.timed("read", read_chunks(filename, batch_size)):
+            with stats.phase("clean"):
+                chunk, rejected = split_invalid(chunk)
+                records = clean_frame(chunk, headquarters).to_dict("records")
+            batches.put((records, rejected if len(rejected) else None))
+    finally:
+        batches.put(None)
+
+    return {
+        "file": filename,
+        "worker": os.getpid(),
+        "parseTime": time.perf_counter() - started,
+        "phases": stats.phases,
+    }
+
+
+def parsed_files(pool, manager, files, headquarters, batch_size, window):
+    # Yields (batches, future) per file in input order, so later delta files
+    # still win over earlier ones, with at most `window` files started ahead
+    # of the writer. Drain the batches before asking the future for the
+    # file's summary.
+    pending = deque()
+    for filename in files:
+        batches = manager.Queue(maxsize=1)
+        pending.append((batches, pool.submit(parse_file, filename, headquarters,
+                                             batches, batch_size)))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def scan_files(pool, files, batch_size, stats):
+    with stats.phase("headquarters"):
+        scans = list(pool.map(scan_file, files, [batch_size] * len(files)))
+        headquarters = set().union(*(found for _, found in scans))
+    logger.info(f"{len(files)} files scanned, {len(headquarters)} headquarters found.")
+    return [digest for digest, _ in scans], headquarters
+
+
+def save_rejects(filename, rejected, reject_file, header):
+    if rejected is None:
+        return 0
+    if reject_file is not None:
+        rejected.insert(0, "FILE", filename)
+        write_rejects(rejected, reject_file, header=header)
+    return len(rejected)
+
+
+def warn_rejected(stats, reject_file):
+    if stats.rejected:
+        logger.warning(f"{stats.rejected} rows failed ISO 9362 validation and were "
+                       f"skipped" + (f", see {reject_file}." if reject_file else "."))
+
+
+def link_headquarters_query():
+    headquarter = aliased(Bank)
+    headquarter_code = func.concat(func.left(Bank.swift_code, 8), "XXX")
+    return (update(Bank)
+            .where(headquarter.swift_code == headquarter_code,
+                   Bank.is_headquarter.is_(False),
+                   Bank.associated_headquarter.is_distinct_from(headquarter.swift_code))
+            .values(associated_headquarter=headquarter.swift_code))
+
+
+def staging_table():
+    return table(STAGING_TABLE, *(column(name) for name in RECORD_FIELDS),
+                 column("file_index"), column("position"))
+
+
+class SessionWriter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def write(self, records, stats, file_index):
+        write_batches(records, stats, self.batch_size)
+
+    def apply(self):
+        return None
+
+    def finish(self):
+        pass
+
+
+class PartitionedWriter:
+    # One connection per partition of the SWIFT code space, each fed by its
+    # own thread, COPYs the rows into an unlogged staging table. The banks
+    # table itself is only written by apply(), in the import's own
+    # transaction, so nothing is committed unless the whole import is.
+    def __init__(self, engine, partitions, batch_size=DEFAULT_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        with engine.begin() as connection:
+            # Left behind by an import that died before cleaning up.
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            # Not LIKE banks: on a fresh database the import creates banks in
+            # its own transaction, which this connection cannot see yet.
+            columns = ", ".join(
+                f"{name} {Bank.__table__.c[name].type.compile(engine.dialect)}"
+                for name in RECORD_FIELDS)
+            connection.exec_driver_sql(
+                f"CREATE UNLOGGED TABLE {STAGING_TABLE} "
+                f"({columns}, file_index integer NOT NULL, position bigserial)")
+        self.connections = [engine.connect() for _ in range(partitions)]
+        self.threads = ThreadPoolExecutor(max_workers=partitions,
+                                          thread_name_prefix="swift-import-writer")
+
+    def _write(self, records, connection, file_index):
+        frame = pd.DataFrame.from_records(records, columns=RECORD_FIELDS)
+        with connection.begin():
+            for start in range(0, len(frame), self.batch_size):
+                copy_frame(frame[start:start + self.batch_size].assign(
+                    file_index=file_index), STAGING_TABLE, connection)
+        return len(records)
+
+    def write(self, records, stats, file_index):
+        # A code always lands in the same partition, in file order, so the
+        # staging table's position column orders its duplicates.
+        parts = [[] for _ in self.connections]
+        for record in records:
+            parts[zlib.crc32(record["swift_code"].encode()) % len(parts)].append(record)
+
+        futures = [self.threads.submit(self._write, part, connection, file_index)
+                   for part, connection in zip(parts, self.connections) if part]
+        for future in futures:
+            stats.rows += future.result()
+
+    def apply(self):
+        # Upserts the last staged row of every code into banks and returns
+        # {file_index: (inserted, updated)} for the files those rows came from.
+        staged = staging_table()
+        latest = (select(*(staged.c[name] for name in RECORD_FIELDS),
+                         staged.c.file_index)
+                  .distinct(staged.c.swift_code)
+                  .order_by(staged.c.swift_code, staged.c.position.desc())
+                  .cte("latest"))
+        upserted = upsert_statement(insert(Bank.__table__).from_select(
+            RECORD_FIELDS, select(*(latest.c[name] for name in RECORD_FIELDS)))
+        ).returning(Bank.swift_code).cte("upserted")
+        rows = db.session.execute(
+            select(latest.c.file_index,
+                   func.count().filter(upserted.c.inserted),
+                   func.count().filter(~upserted.c.inserted))
+            .select_from(upserted.join(latest,
+                                       latest.c.swift_code == upserted.c.swift_code))
+            .group_by(latest.c.file_index))
+        return {file_index: (inserted, updated)
+                for file_index, inserted, updated in rows}
+
+    def finish(self):
+        # Only once the import's transaction has ended: until then it holds a
+        # lock on the staging table that the DROP would wait for.
+        self.threads.shutdown()
+        for connection in self.connections:
+            connection.close()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+
+def import_files(paths, workers=None, writers=1, batch_size=DEFAULT_BATCH_SIZE,
+                 incremental=False, dry_run=False, reject_file=None):
+    started = time.perf_counter()
+    stats = ImportStats()
+    files = csv_files(paths)
+    if not files:
+        stats.error = "No CSV files to import"
+        record_import(stats)
+        return stats
+
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    writer = None
+    context = multiprocessing.get_context(WORKER_CONTEXT)
+    try:
+        # The manager shuts down first on the way out, which fails the puts
+        # of workers still waiting on a batch nobody will read.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, \
+                context.Manager() as manager:
+            digests, headquarters = scan_files(pool, files, batch_size, stats)
+
+            pending = []
+            for filename, digest in zip(files, digests):
+                imported = db.session.get(ImportedFile, os.path.abspath(filename)) \
+                    if incremental else None
+                if imported is not None and imported.digest == digest:
+                    logger.info(f"File {filename} unchanged since last import, "
+                                f"skipping.")
+                    stats.files.append({"file": filename, "skipped": True})
+                    continue
+                pending.append((filename, digest))
+
+            existing = load_row_hashes() if incremental and pending else None
+            released = set()
+            written = []
+            if writers > 1:
+                writer = PartitionedWriter(db.engine, writers, batch_size)
+            else:
+                writer = SessionWriter(batch_size)
+
+            parsing = parsed_files(pool, manager, [filename for filename, _ in pending],
+                                   headquarters, batch_size, 2 * workers)
+            for file_index, ((filename, digest), (batches, parsed)) in enumerate(
+                    zip(pending, parsing)):
+                file_stats = ImportStats()
+                codes = set()
+                for records, rejected in iter(batches.get, None):
+                    with file_stats.phase("write"):
+                        file_stats.rejected += save_rejects(
+                            filename, rejected, reject_file,
+                            header=not (stats.rejected or file_stats.rejected))
+                        codes.update(record["swift_code"] for record in records)
+                        if existing is not None:
+                            records = filter_changed(records, existing, file_stats)
+                        writer.write(records, file_stats, file_index)
+                parsed = parsed.result()
+                # Worker read and clean times add up across processes.
+                stats.add_phases(parsed["phases"])
+
+                with file_stats.phase("write"):
+                    if incremental:
+                        released.update(claim_codes(os.path.abspath(filename), codes,
+                                                    batch_size))
+                        db.session.merge(ImportedFile(
+                            source=os.path.abspath(filename), digest=digest,
+                            row_count=file_stats.rows))
+                stats.add(file_stats)
+                written.append({
+                    "file": filename,
+                    "worker": parsed["worker"],
+                    "rows": file_stats.rows,
+                    "inserted": file_stats.inserted,
+                    "updated": file_stats.updated,
+                    "unchanged": file_stats.unchanged,
+                    "rejected": file_stats.rejected,
+                    "parseTime": round(parsed["parseTime"], 3),
+                    "writeTime": round(file_stats.phases["write"], 3),
+                })
+                stats.files.append(written[-1])
+                logger.info(f"Imported {filename}: {file_stats!r}")
+
+        stats.skipped = not pending
+        warn_rejected(stats, reject_file)
+
+        with stats.phase("write"):
+            applied = writer.apply()
+            if applied is not None:
+                for file_index, entry in enumerate(written):
+                    inserted, updated = applied.get(file_index, (0, 0))
+                    entry["inserted"], entry["updated"] = inserted, updated
+                    entry["unchanged"] = entry["rows"] - inserted - updated
+                    stats.inserted += inserted
+                    stats.updated += updated
+                stats.unchanged = stats.rows - stats.inserted - stats.updated
+            # Only once every file has claimed its codes, so a code that moved
+            # to a later file in this run is kept.
+            stats.deleted = delete_released(released, batch_size)
+        if stats.inserted or stats.updated:
+            with stats.phase("headquarters"):
+                # Fresh statistics keep the linkage join from being planned
+                # against the table as it was before the load.
+                db.session.execute(text("ANALYZE banks"))
+                stats.linked = db.session.execute(link_headquarters_query()).rowcount
+        with stats.phase("finish"):
+            finish_import(stats.inserted or stats.updated or stats.deleted, dry_run)
+            writer.finish()
+
+        stats.elapsed = time.perf_counter() - started
+        logger.info(f"{len(files)} files {'checked' if dry_run else 'imported'} with "
+                    f"{workers} workers and {writers} writers: {stats.rows} rows in "
+                    f"{stats.elapsed:.2f}s ({stats.rows_per_sec:.0f} rows/sec), "
+                    f"inserted={stats.inserted}, updated={stats.updated}, "
+                    f"unchanged={stats.unchanged}, deleted={stats.deleted}, "
+                    f"linked={stats.linked}")
+
+    except Exception as e:
+        logger.error(f"Import error: {e}")
+        stats.error = str(e)
+        db.session.rollback()
+        if writer is not None:
+            writer.finish()
+
+    record_import(stats)
+    return stats
+
+
+def copy_frame(frame, table_name, connection=None):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False, na_rep="\\N")
+    buffer.seek(0)
+    cursor = (connection or db.session.connection()).connection.cursor()
+    cursor.copy_expert(f"COPY {table_name} ({', '.join(frame.columns)}) FROM STDIN "
+                       f"WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def load_snapshot_file(path, dry_run=False):
+    """Replace the banks table with the contents of a snapshot file."""
+    started = time.perf_counter()
+    stats = ImportStats()
+    try:
+        with stats.phase("read"), SnapshotFile(path) as snapshot_file:
+            frame = snapshot_file.frame()
+
+        loaded = table("banks_load", *(column(name) for name in FILE_FIELDS))
+        with stats.phase("write"):
+            db.session.execute(text("CREATE TEMP TABLE banks_load "
+                                    "(LIKE banks INCLUDING DEFAULTS) ON COMMIT DROP"))
+            copy_frame(frame, "banks_load")
+
+            stmt = upsert_statement(insert(Bank.__table__).from_select(
+                FILE_FIELDS, select(*(loaded.c[name] for name in FILE_FIELDS))))
+            rows = db.session.execute(stmt).all()
+            stats.inserted, stats.updated = count_upserted(rows)
+            stats.rows = len(frame)
+            stats.unchanged = stats.rows - stats.inserted - stats.updated
+            stats.deleted = db.session.execute(delete(Bank).where(
+                ~exists().where(loaded.c.swift_code == Bank.swift_code))).rowcount
+
+        with stats.phase("finish"):
+            finish_import(stats.inserted or stats.updated or stats.deleted, dry_run)
+        stats.elapsed = time.perf_counter() - started
+        logger.info(f"Snapshot {path} loaded: {stats!r}")
+
+    except Exception as e:
+        logger.error(f"Error while loading snapshot {path}: {e}")
+        stats.error = str(e)
+        db.session.rollback()
+
+    record_import(stats)
+    return stats
+
+
+def reload_files(paths, workers=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False,
+                 reject_file=None):
+    """Replace the banks table with the files through a shadow table."""
+    started = time.perf_counter()
+    stats = ImportStats()
+    files = csv_files(paths)
+    if not files:
+        stats.error = "No CSV files to import"
+        record_import(stats)
+        return stats
+
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    context = multiprocessing.get_context(WORKER_CONTEXT)
+    try:
+        version, _ = read_dataset_version()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, \
+                context.Manager() as manager:
+            digests, headquarters = scan_files(pool, files, batch_size, stats)
+
+            frames = []
+            parsing = parsed_files(pool, manager, files, headquarters, batch_size,
+                                   2 * workers)
+            for filename, (batches, parsed) in zip(files, parsing):
+                rows = rejected = 0
+                for records, rejects in iter(batches.get, None):
+                    rejected += save_rejects(filename, rejects, reject_file,
+                                             header=not (stats.rejected or rejected))
+                    frame = pd.DataFrame.from_records(records, columns=RECORD_FIELDS)
+                    frames.append(frame.assign(source=os.path.abspath(filename)))
+                    rows += len(frame)
+                parsed = parsed.result()
+                stats.add_phases(parsed["phases"])
+                stats.rejected += rejected
+                stats.files.append({
+                    "file": filename,
+                    "worker": parsed["worker"],
+                    "rows": rows,
+                    "rejected": rejected,
+                    "parseTime": round(parsed["parseTime"], 3),
+                })
+        warn_rejected(stats, reject_file)
+
+        with stats.phase("write"):
+            # Later files win on duplicate codes, as with a regular import.
+            frame = pd.concat(frames).drop_duplicates("swift_code", keep="last")
+            stats.rows = len(frame)
+            definitions = index_definitions()
+            create_shadow_table()
+            copy_frame(frame[RECORD_FIELDS], SHADOW_TABLE)
+        with stats.phase("index"):
+            build_shadow_indexes(definitions)
+        with stats.phase("validate"):
+            validate_shadow(stats.rows)
+            stats.inserted, stats.updated, stats.deleted = \
+                compare_with_live(RECORD_FIELDS[1:-1])
+            stats.unchanged = stats.rows - stats.inserted - stats.updated
+
+        db.session.execute(delete(ImportedFile))
+        for filename, digest, file_info in zip(files, digests, stats.files):
+            db.session.add(ImportedFile(source=os.path.abspath(filename),
+                                        digest=digest, row_count=file_info["rows"]))
+        db.session.execute(delete(ImportedCode))
+        copy_frame(frame[["swift_code", "source"]], ImportedCode.__tablename__)
+
+        changed = stats.inserted or stats.updated or stats.deleted
+        if changed and not dry_run:
+            with stats.phase("swap"):
+                hold_writes(version)
+                refresh_stats(shadow_table())
+                swap_shadow_table(definitions)
+                bump_dataset_version()
+        else:
+            drop_shadow_table()
+        with stats.phase("finish"):
+            publish_import(dry_run)
+
+        stats.elapsed = time.perf_counter() - started
+        logger.info(f"{len(files)} files {'checked' if dry_run else 'reloaded'} with "
+                    f"{workers} workers: {stats.rows} rows in {stats.elapsed:.2f}s "
+                    f"({stats.rows_per_sec:.0f} rows/sec), "
+                    f"inserted={stats.inserted}, updated={stats.updated}, "
+                    f"unchanged={stats.unchanged}, deleted={stats.deleted}"
+                    + ("" if changed else ", nothing to swap"))
+
+    except Exception as e:
+        logger.error(f"Reload error: {e}")
+        stats.error = str(e)
+        db.session.rollback()
+
+    record_import(stats)
+    return stats
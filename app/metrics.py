@@ -0,0 +1,392 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import weakref
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from app.extensions import db, response_cache
+from app.db_pool import pool_metrics
+from app.replicas import replica_router
+from app.snapshot import snapshot_store
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+# A slow request keeps at most this many statements for the log line.
+SLOW_LOG_STATEMENTS = 50
+SLOW_LOG_STATEMENT_CHARS = 500
+
+# The request being served on this thread or asyncio task, if any; the
+# engine listeners add their query timings to it.
+current_request = ContextVar("current_request", default=None)
+engine_labels = weakref.WeakKeyDictionary()
+
+
+def format_value(value):
+    return "+Inf" if value == float("inf") else str(value)
+
+
+def escape_label(value):
+    return format_value(value).replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+def format_sample(name, labels, value):
+    if labels:
+        pairs = ",".join(f'{key}="{escape_label(label)}"'
+                         for key, label in labels.items())
+        name = f"{name}{{{pairs}}}"
+    return f"{name} {format_value(value)}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        for label_values, value in sorted(series):
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._series[label_values] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        # le is inclusive, so a value equal to a bound lands in that bucket.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1),
+                                                       0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, (list(counts), total))
+                      for labels, (counts, total) in self._series.items()]
+        for label_values, (counts, total) in sorted(series):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": bound}, cumulative
+            yield f"{self.name}_sum", labels, round(total, 6)
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def add_collector(self, collector):
+        # Collectors are called at scrape time and return freshly built
+        # metrics, for numbers another component already keeps.
+        self.collectors.append(collector)
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    def collect(self):
+        metrics = list(self.metrics)
+        for collector in self.collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                logger.error(f"Error while collecting metrics: {e}")
+        return metrics
+
+    def render(self, prefix=""):
+        lines = []
+        for metric in self.collect():
+            if not metric.name.startswith(prefix):
+                continue
+            samples = [format_sample(*sample) for sample in metric.samples()]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    "swift_http_request_duration_seconds",
+    "Time to build each response, by route.", ["method", "route", "status"])
+request_queries = registry.histogram(
+    "swift_http_request_db_queries",
+    "Database queries issued per request.", ["method", "route"],
+    QUERY_COUNT_BUCKETS)
+request_db_seconds = registry.histogram(
+    "swift_http_request_db_seconds",
+    "Time spent in database queries per request.", ["method", "route"])
+slow_requests = registry.counter(
+    "swift_http_slow_requests_total",
+    "Requests slower than SWIFT_SLOW_REQUEST_MS.", ["method", "route"])
+query_seconds = registry.histogram(
+    "swift_db_query_duration_seconds",
+    "Duration of every database query, in or outside a request.", ["engine"])
+imports = registry.counter(
+    "swift_imports_total",
+    "Imports run in this process, by outcome.", ["outcome"])
+import_rows = registry.counter(
+    "swift_import_rows_total",
+    "Rows handled by imports, by result.", ["result"])
+import_phase_seconds = registry.gauge(
+    "swift_import_last_phase_seconds",
+    "Time each phase of the last import took.", ["phase"])
+import_seconds = registry.gauge(
+    "swift_import_last_duration_seconds",
+    "Wall time of the last import.")
+
+
+class RequestTimer:
+    __slots__ = ("started", "queries", "db_time", "statements")
+
+    def __init__(self, capture=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = [] if capture else None
+
+    def query(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if self.statements is not None and len(self.statements) < SLOW_LOG_STATEMENTS:
+            self.statements.append((elapsed, statement))
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    query_seconds.observe(elapsed, engine_labels.get(conn.engine, "primary"))
+    timer = current_request.get()
+    if timer is not None:
+        timer.query(statement, elapsed)
+
+
+def instrument_engine(engine, label):
+    engine_labels[engine] = label
+    if not event.contains(engine, "after_cursor_execute", after_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def gauge_of(name, description, labels, values):
+    gauge = Gauge(name, description, labels)
+    for label_values, value in values:
+        gauge.set(value, *label_values)
+    return gauge
+
+
+def counter_of(name, description, labels, values):
+    counter = Counter(name, description, labels)
+    for label_values, value in values:
+        counter.inc(*label_values, amount=value)
+    return counter
+
+
+def pool_collector(engines):
+    def collect():
+        stats = [(label, pool_metrics(engine)) for label, engine in engines.items()]
+        yield gauge_of("swift_db_pool_connections",
+                       "Pooled connections by state.", ["engine", "state"],
+                       [((label, state), metrics[key])
+                        for label, metrics in stats
+                        for state, key in (("checked_out", "checkedOut"),
+                                           ("idle", "idle"),
+                                           ("overflow", "overflow"))])
+        yield gauge_of("swift_db_pool_size", "Configured pool size.", ["engine"],
+                       [((label,), metrics["size"]) for label, metrics in stats])
+
+        # Only the instrumented queue pool counts checkouts and waits.
+        stats = [(label, metrics) for label, metrics in stats if "checkouts" in metrics]
+        yield counter_of("swift_db_pool_checkouts_total",
+                         "Connections checked out of the pool.", ["engine"],
+                         [((label,), metrics["checkouts"]) for label, metrics in stats])
+        yield counter_of("swift_db_pool_timeouts_total",
+                         "Checkouts that gave up waiting for a connection.",
+                         ["engine"],
+                         [((label,), metrics["timeouts"]) for label, metrics in stats])
+        yield counter_of("swift_db_pool_wait_seconds_total",
+                         "Time spent waiting for a pooled connection.", ["engine"],
+                         [((label,), metrics["waitTotal"]) for label, metrics in stats])
+        yield gauge_of("swift_db_pool_wait_max_seconds",
+                       "Longest wait for a pooled connection.", ["engine"],
+                       [((label,), metrics["waitMax"]) for label, metrics in stats])
+    return collect
+
+
+def cache_collector():
+    if not response_cache.enabled:
+        return
+    stats = response_cache.stats()
+    for key in ("hits", "misses", "evictions"):
+        yield counter_of(f"swift_response_cache_{key}_total",
+                         f"Response cache {key}.", [], [((), stats[key])])
+    yield gauge_of("swift_response_cache_entries", "Entries in the response cache.",
+                   [], [((), stats["size"])])
+    yield gauge_of("swift_response_cache_max_entries",
+                   "Capacity of the response cache.", [], [((), stats["maxsize"])])
+
+
+def snapshot_collector():
+    snapshot = snapshot_store.snapshot
+    if not snapshot_store.enabled or snapshot is None:
+        return
+    yield gauge_of("swift_snapshot_rows", "SWIFT codes in the in-memory snapshot.",
+                   [], [((), len(snapshot))])
+    yield gauge_of("swift_snapshot_version", "Dataset version of the snapshot.",
+                   [], [((), snapshot.version)])
+    yield gauge_of("swift_snapshot_age_seconds", "Time since the snapshot was built.",
+                   [], [((), round(time.monotonic() - snapshot.loaded_at, 3))])
+
+
+def record_import(stats):
+    outcome = "error" if stats.error else "skipped" if stats.skipped else "ok"
+    imports.inc(outcome)
+    for result in ("inserted", "updated", "unchanged", "deleted", "rejected"):
+        import_rows.inc(result, amount=getattr(stats, result))
+    for phase, elapsed in stats.phases.items():
+        import_phase_seconds.set(round(elapsed, 6), phase)
+    import_seconds.set(round(stats.elapsed, 6))
+
+
+def write_metrics_file(path, prefix=""):
+    # Written atomically for node_exporter's textfile collector.
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(registry.render(prefix))
+    os.replace(temporary, path)
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.slow_request = 0.0
+        self.engines = {}
+        registry.add_collector(pool_collector(self.engines))
+        registry.add_collector(cache_collector)
+        registry.add_collector(snapshot_collector)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("SWIFT_METRICS", False)
+        self.slow_request = app.config.get("SWIFT_SLOW_REQUEST_MS", 0) / 1000
+        self.engines.clear()
+        registry.reset()
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            self.instrument_engine(db.engine, "primary")
+        for number, engine in enumerate(replica_router.engines):
+            self.instrument_engine(engine, f"replica{number}")
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def instrument_engine(self, engine, label):
+        instrument_engine(engine, label)
+        self.engines[label] = engine
+
+    def start_request(self):
+        timer = RequestTimer(capture=self.slow_request > 0)
+        return timer, current_request.set(timer)
+
+    def finish_request(self, timer, token, method, route, status, path):
+        current_request.reset(token)
+        elapsed = time.perf_counter() - timer.started
+        request_seconds.observe(elapsed, method, route, status)
+        request_queries.observe(timer.queries, method, route)
+        request_db_seconds.observe(timer.db_time, method, route)
+
+        if self.slow_request and elapsed >= self.slow_request:
+            slow_requests.inc(method, route)
+            statements = "".join(
+                f"\n  [{took * 1000:.1f} ms] {statement[:SLOW_LOG_STATEMENT_CHARS]}"
+                for took, statement in timer.statements)
+            logger.warning(f"Slow request {method} {path}: {elapsed * 1000:.1f} ms, "
+                           f"{timer.queries} queries in {timer.db_time * 1000:.1f} ms"
+                           f"{statements}")
+
+    def before_request(self):
+        g.request_timer = self.start_request()
+
+    def after_request(self, response):
+        timer, token = g.pop("request_timer", (None, None))
+        if timer is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            self.finish_request(timer, token, request.method, route,
+                                response.status_code, request.path)
+        return response
+
+    def teardown_request(self, error=None):
+        # Only left over when the response never reached after_request.
+        timer, token = g.pop("request_timer", (None, None))
+        if token is not None:
+            current_request.reset(token)
+
+
+instrumentation = Instrumentation()
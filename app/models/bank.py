@@ -3,6 +3,12 @@ from app import db
 
 class Bank(db.Model):
     __tablename__ = 'banks'
+    __table_args__ = (
+        db.Index('idx_associated_headquarter', 'associated_headquarter'),
+        db.Index('idx_country_iso2', 'country_iso2'),
+        db.Index('idx_swift_code_pattern', 'swift_code',
+                 postgresql_ops={'swift_code': 'varchar_pattern_ops'}),
+    )
 
     swift_code = db.Column(db.String(11), primary_key=True)
     address = db.Column(db.Text)
@@ -11,3 +17,4 @@ class Bank(db.Model):
     country_name = db.Column(db.String(255))
     is_headquarter = db.Column(db.Boolean)
     associated_headquarter = db.Column(db.String(11), nullable=True)
+    row_hash = db.Column(db.BigInteger, nullable=True)
@@ -0,0 +1,9 @@
+from app import db
+
+
+class DatasetVersion(db.Model):
+    __tablename__ = 'dataset_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
@@ -0,0 +1,20 @@
+from app import db
+
+
+class ImportedFile(db.Model):
+    __tablename__ = 'imported_files'
+
+    source = db.Column(db.String(1024), primary_key=True)
+    digest = db.Column(db.String(64), nullable=False)
+    row_count = db.Column(db.Integer)
+    imported_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(),
+                            onupdate=db.func.now())
+
+
+class ImportedCode(db.Model):
+    # Which imported file each SWIFT code last came from, so an incremental
+    # import only removes the codes its own file dropped.
+    __tablename__ = 'imported_codes'
+
+    swift_code = db.Column(db.String(11), primary_key=True)
+    source = db.Column(db.String(1024), nullable=False, index=True)
@@ -0,0 +1,22 @@
+from app import db
+
+
+class CountryStats(db.Model):
+    __tablename__ = 'country_stats'
+
+    country_iso2 = db.Column(db.String(2), primary_key=True)
+    country_name = db.Column(db.String(255))
+    codes = db.Column(db.Integer, nullable=False, default=0)
+    headquarters = db.Column(db.Integer, nullable=False, default=0)
+    branches = db.Column(db.Integer, nullable=False, default=0)
+
+
+class HeadquarterStats(db.Model):
+    __tablename__ = 'headquarter_stats'
+    __table_args__ = (
+        db.Index('idx_headquarter_stats_country', 'country_iso2', 'branches'),
+    )
+
+    swift_code = db.Column(db.String(11), primary_key=True)
+    country_iso2 = db.Column(db.String(2))
+    branches = db.Column(db.Integer, nullable=False, default=0)
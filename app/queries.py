@@ -0,0 +1,136 @@
+from collections import defaultdict
+from sqlalchemy import select, delete, func, or_, any_, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from app.models.bank import Bank
+from app.extensions import db
+
+
+BANK_COLUMNS = [
+    Bank.swift_code, Bank.address, Bank.bank_name, Bank.country_iso2,
+    Bank.country_name, Bank.is_headquarter, Bank.associated_headquarter
+]
+
+COUNTRY_COLUMNS = [
+    Bank.swift_code, Bank.address, Bank.bank_name, Bank.country_iso2,
+    Bank.country_name, Bank.is_headquarter
+]
+
+
+def any_of(values, name="values"):
+    return any_(bindparam(name, list(values), type_=ARRAY(String)))
+
+
+def details_query(swift_code):
+    return select(*BANK_COLUMNS).where(or_(Bank.swift_code == swift_code,
+                                           Bank.associated_headquarter == swift_code))
+
+
+def split_details(rows, swift_code):
+    bank = None
+    branches = []
+    for row in rows:
+        if row.swift_code == swift_code:
+            bank = row
+        else:
+            branches.append(row)
+    return bank, branches
+
+
+def fetch_details(swift_code):
+    return split_details(db.session.execute(details_query(swift_code)), swift_code)
+
+
+def banks_query(swift_codes):
+    return select(*BANK_COLUMNS).where(
+        Bank.swift_code == any_of(swift_codes, "swift_codes"))
+
+
+def fetch_banks(swift_codes):
+    rows = db.session.execute(banks_query(swift_codes))
+    return {row.swift_code: row for row in rows}
+
+
+def branches_query(headquarters):
+    return select(*BANK_COLUMNS).where(
+        Bank.associated_headquarter == any_of(headquarters, "headquarters")
+    )
+
+
+def group_branches(rows):
+    branches = defaultdict(list)
+    for row in rows:
+        branches[row.associated_headquarter].append(row)
+    return branches
+
+
+def fetch_branches(headquarters):
+    if not headquarters:
+        return defaultdict(list)
+    return group_branches(db.session.execute(branches_query(headquarters)))
+
+
+def country_query(country_iso2, limit=None, after=None):
+    stmt = select(*COUNTRY_COLUMNS).where(Bank.country_iso2 == country_iso2)
+    if limit is not None or after is not None:
+        stmt = stmt.order_by(Bank.swift_code)
+    if after is not None:
+        stmt = stmt.where(Bank.swift_code > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def fetch_country(country_iso2, limit=None, after=None):
+    return db.session.execute(country_query(country_iso2, limit, after)).all()
+
+
+def stream_country(country_iso2, batch_size=1000):
+    return db.session.execute(
+        country_query(country_iso2),
+        execution_options={"stream_results": True, "yield_per": batch_size},
+    )
+
+
+def search_query(prefix=None, name=None, country_iso2=None, limit=20):
+    stmt = select(*COUNTRY_COLUMNS).order_by(Bank.swift_code).limit(limit)
+    if prefix is not None:
+        stmt = stmt.where(Bank.swift_code.startswith(prefix, autoescape=True))
+    if name is not None:
+        stmt = stmt.where(
+            func.upper(Bank.bank_name).contains(name.upper(), autoescape=True))
+    if country_iso2 is not None:
+        stmt = stmt.where(Bank.country_iso2 == country_iso2)
+    return stmt
+
+
+def search_banks(prefix=None, name=None, country_iso2=None, limit=20):
+    return db.session.execute(search_query(prefix, name, country_iso2, limit)).all()
+
+
+def insert_banks_query(records):
+    stmt = insert(Bank).values(records)
+    stmt = stmt.on_conflict_do_nothing(index_elements=[Bank.swift_code])
+    return stmt.returning(Bank.swift_code)
+
+
+def delete_banks_query(swift_codes):
+    stmt = delete(Bank).where(Bank.swift_code == any_of(swift_codes, "swift_codes"))
+    return stmt.returning(*BANK_COLUMNS)
+
+
+def insert_new_banks(records, batch_size=1000):
+    created = set()
+    for start in range(0, len(records), batch_size):
+        created.update(db.session.scalars(
+            insert_banks_query(records[start:start + batch_size])
+        ))
+    return created
+
+
+def delete_swift_codes(swift_codes, batch_size=1000):
+    deleted = {}
+    for start in range(0, len(swift_codes), batch_size):
+        batch = swift_codes[start:start + batch_size]
+        rows = db.session.execute(delete_banks_query(batch))
+        deleted.update((row.swift_code, row) for row in rows)
+    return deleted
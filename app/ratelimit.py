@@ -0,0 +1,187 @@
+import hashlib
+import importlib
+import logging
+import math
+import threading
+import time
+from flask import request
+from app.metrics import registry
+from app.serializers import json_response
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+API_KEY_HEADER = "X-API-Key"
+EXEMPT_PATHS = {"/metrics"}
+PRUNE_INTERVAL = 60.0
+
+rate_limited_requests = registry.counter(
+    "swift_rate_limited_requests_total",
+    "Requests rejected with 429 by the per-client rate limit.")
+
+
+def key_digest(api_key):
+    return hashlib.sha256(api_key.encode()).hexdigest()[:32]
+
+
+def client_key(req, api_keys=frozenset()):
+    # Clients with a configured API key share a bucket across addresses;
+    # everyone else, including unknown keys that would otherwise buy a fresh
+    # bucket per request, is limited per address. `api_keys` holds digests.
+    api_key = req.headers.get(API_KEY_HEADER)
+    if api_key:
+        digest = key_digest(api_key)
+        if digest in api_keys:
+            return f"key:{digest}"
+    return f"ip:{req.remote_addr}"
+
+
+class MemoryBackend:
+    """Token buckets kept in this process; the limit applies per worker."""
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def take(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                allowed, retry_after = True, 0.0
+                tokens -= 1
+            else:
+                allowed, retry_after = False, (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+
+            if now - self._pruned_at > PRUNE_INTERVAL:
+                self._prune(now, rate, capacity)
+        return allowed, retry_after
+
+    def _prune(self, now, rate, capacity):
+        # A bucket that has refilled is the same as no bucket at all.
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate < capacity
+        }
+        self._pruned_at = now
+
+
+# Runs atomically in Redis and uses the server clock, so every worker sees
+# one bucket per client.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    allowed = 1
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBackend:
+    blocking = True
+
+    def __init__(self, url, prefix="swift:ratelimit:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the "
+                               f"rate limit backend {url!r}")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, rate, capacity):
+        allowed, retry_after = self.script(keys=[self.prefix + key],
+                                           args=[rate, capacity])
+        return bool(allowed), float(retry_after)
+
+
+def load_backend(spec, app):
+    # "memory", a redis:// URL, or "package.module:factory" for any other
+    # shared store; the factory is called with the app and must return an
+    # object with take(key, rate, capacity) -> (allowed, retry_after).
+    if not spec or spec == "memory":
+        return MemoryBackend()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    module_name, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"Rate limit backend must be 'memory', a redis:// URL or "
+                         f"'module:factory', got {spec!r}")
+    return getattr(importlib.import_module(module_name), factory)(app)
+
+
+class RateLimiter:
+    def __init__(self):
+        self.rate = 0
+        self.capacity = 0
+        self.backend = None
+        self.api_keys = frozenset()
+
+    def init_app(self, app):
+        self.rate = app.config.get("SWIFT_RATE_LIMIT", 0)
+        self.capacity = app.config.get("SWIFT_RATE_LIMIT_BURST", 0) or max(self.rate, 1)
+        self.backend = None
+        self.api_keys = frozenset(key_digest(key)
+                                  for key in app.config.get("SWIFT_API_KEYS", []))
+        if self.enabled:
+            self.backend = load_backend(app.config.get("SWIFT_RATE_LIMIT_BACKEND"), app)
+            logger.info(f"Rate limiting clients to {self.rate} requests/s, "
+                        f"burst={self.capacity}, "
+                        f"backend={type(self.backend).__name__}")
+            app.before_request(self.before_request)
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    @property
+    def blocking(self):
+        return getattr(self.backend, "blocking", True)
+
+    def check(self, req):
+        # Returns a 429 response for a client over its limit, otherwise None.
+        if req.path in EXEMPT_PATHS:
+            return None
+        try:
+            key = client_key(req, self.api_keys)
+            allowed, retry_after = self.backend.take(key, self.rate, self.capacity)
+        except Exception as e:
+            # An unreachable shared store must not take the API down with it.
+            logger.error(f"Rate limit backend failed, allowing request: {e}")
+            return None
+        if allowed:
+            return None
+
+        rate_limited_requests.inc()
+        response = json_response({"message": "Too many requests"}, 429, pretty=False)
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def before_request(self):
+        return self.check(request)
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,102 @@
+import itertools
+import logging
+import threading
+import time
+from flask import g, request
+from sqlalchemy import create_engine
+from app.db_pool import configure_engine, engine_options
+from app.versioning import VersionTracker, version_tracker
+
+
+logger = logging.getLogger(__name__)
+
+REPLICA_STRATEGIES = ("round_robin", "least_connections")
+
+STICKY_COOKIE = "swift_primary_until"
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.engines = []
+        self.trackers = {}
+        self.strategy = "round_robin"
+        self.sticky = 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        for engine in self.engines:
+            engine.dispose()
+
+        self.strategy = app.config.get("SWIFT_REPLICA_STRATEGY", "round_robin")
+        if self.strategy not in REPLICA_STRATEGIES:
+            raise ValueError(f"Replica strategy must be one of "
+                             f"{', '.join(REPLICA_STRATEGIES)}, got {self.strategy!r}")
+        self.sticky = app.config.get("SWIFT_REPLICA_STICKY", 0)
+
+        options = engine_options()
+        self.engines = []
+        for uri in app.config.get("SQLALCHEMY_REPLICA_URIS", []):
+            engine = create_engine(uri, **options)
+            configure_engine(engine)
+            self.engines.append(engine)
+        ttl = app.config.get("SWIFT_VERSION_TTL", 1.0)
+        self.trackers = {engine: VersionTracker(ttl) for engine in self.engines}
+
+        if self.engines:
+            logger.info(f"Routing reads to {len(self.engines)} replica(s), "
+                        f"strategy={self.strategy}, sticky={self.sticky}s")
+            app.after_request(self.set_sticky_cookie)
+
+    @property
+    def enabled(self):
+        return bool(self.engines)
+
+    def choose(self):
+        if self.strategy == "least_connections":
+            return min(self.engines, key=checked_out)
+        with self._lock:
+            return self.engines[next(self._counter) % len(self.engines)]
+
+    def route_reads(self, session):
+        if not self.engines or primary_pinned():
+            return None
+
+        engine = self.choose()
+        session.info["replica"] = engine
+        session.info["version_tracker"] = self.trackers[engine]
+        return engine
+
+    def mark_write(self):
+        if self.engines and self.sticky:
+            g.primary_until = time.time() + self.sticky
+
+    def set_sticky_cookie(self, response):
+        until = g.get("primary_until")
+        if until is not None:
+            response.set_cookie(STICKY_COOKIE, f"{until:.3f}",
+                                max_age=int(self.sticky) + 1,
+                                httponly=True, samesite="Lax")
+        return response
+
+
+def checked_out(engine):
+    try:
+        return engine.pool.checkedout()
+    except AttributeError:
+        return 0
+
+
+def primary_pinned():
+    until = request.cookies.get(STICKY_COOKIE)
+    try:
+        return until is not None and float(until) > time.time()
+    except ValueError:
+        return False
+
+
+def session_version_tracker(session):
+    return session.info.get("version_tracker", version_tracker)
+
+
+replica_router = ReplicaRouter()
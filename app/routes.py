@@ -1,81 +1,437 @@
-from flask import jsonify, abort, request, Response
+from flask import abort, request, Response, stream_with_context
 from app.models.bank import Bank
-from app.extensions import db
+from app.extensions import db, response_cache
+from app.snapshot import snapshot_store, BankRecord
+from app.queries import (fetch_details, fetch_banks, fetch_branches, fetch_country,
+                         stream_country, search_banks, insert_new_banks,
+                         delete_swift_codes)
+from app.versioning import (version_tracker, bump_dataset_version, make_etag,
+                            conditional_response)
+from app.replicas import replica_router, session_version_tracker
+from app.serializers import (dumps, json_response, wants_pretty, wants_columnar,
+                             bank_details, country_entry, country_listing,
+                             country_listing_bytes, search_results, JSON_MIMETYPE)
+from app.compression import CachedResponse
+from app.coalescing import details_flight, country_flight
+from app.search import MIN_NAME_QUERY
+from app.stats import apply_stats, fetch_stats
+from app.validation import swift_code_checks, reason_text, swift_code_error
+from app.metrics import instrumentation, registry, CONTENT_TYPE
 import logging
 import json
 
 
 logger = logging.getLogger(__name__)
 
+BATCH_LOOKUP_CHUNK_SIZE = 1000
+
+REQUIRED_FIELDS = [
+    "swiftCode", "address", "bankName",
+    "countryISO2", "countryName", "isHeadquarter"
+]
+
+STRING_FIELDS = {
+    "swiftCode": Bank.swift_code,
+    "address": Bank.address,
+    "bankName": Bank.bank_name,
+    "countryISO2": Bank.country_iso2,
+    "countryName": Bank.country_name,
+}
+
+
+def dataset_state(snapshot):
+    if snapshot is not None:
+        return snapshot.version, snapshot.updated_at
+    return session_version_tracker(db.session).current()
+
+
+def invalidate_cached(swift_code):
+    response_cache.invalidate(swift_code, swift_code[:8] + "XXX")
+
+
+def cached_render(key, version, render, flight):
+    # Concurrent misses for the same key and dataset version share a single
+    # render, and so a single set of queries; the result is then cached
+    # together with a dict for its compressed copies.
+    cached = response_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    def load():
+        entry = (version, render(), {})
+        response_cache.set(key, entry)
+        return entry[1], entry[2]
+
+    return flight.do((key, version), load)
+
+
+def country_cache_key(country_iso2, columnar=False):
+    # SWIFT codes are alphanumeric, so these keys never collide with the
+    # detail entries.
+    return f"country:{country_iso2}:{'columns' if columnar else 'rows'}"
+
+
+def stream_country_listing(country_iso2, rows):
+    first = next(rows, None)
+    if first is None:
+        abort(404, description="No SWIFT codes found for the specified country")
+
+    def generate():
+        try:
+            yield (b'{"countryISO2":' + dumps(country_iso2) +
+                   b',"countryName":' + dumps(first.country_name) + b',"swiftCodes":[')
+            yield dumps(country_entry(first))
+            for row in rows:
+                yield b"," + dumps(country_entry(row))
+            yield b"]}"
+        finally:
+            db.session.close()
+
+    return Response(stream_with_context(generate()), mimetype=JSON_MIMETYPE)
+
+
+def page_args(max_limit, req=None):
+    if req is None:
+        req = request
+    limit = req.args.get("limit")
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= max_limit:
+            abort(400,
+                  description=f"limit must be an integer between 1 and {max_limit}")
+        limit = int(limit)
+
+    after = req.args.get("after")
+    if after is not None:
+        after = after.upper()
+    return limit, after
+
+
+def search_args(max_limit, req=None):
+    if req is None:
+        req = request
+    prefix = req.args.get("prefix", "").strip().upper() or None
+    name = req.args.get("q", "").strip() or None
+    country_iso2 = req.args.get("country", "").strip().upper() or None
+    if prefix is None and name is None:
+        abort(400, description="Provide a prefix or q parameter")
+    if name is not None and len(name) < MIN_NAME_QUERY:
+        abort(400, description=f"q must be at least {MIN_NAME_QUERY} characters")
+
+    limit = req.args.get("limit", "20")
+    if not limit.isdigit() or not 1 <= int(limit) <= max_limit:
+        abort(400, description=f"limit must be an integer between 1 and {max_limit}")
+    return prefix, name, country_iso2, int(limit)
+
+
+def bank_payload_error(data):
+    if not isinstance(data, dict):
+        return "Item must be a JSON object"
+
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return f"Missing field: {field}"
+
+    for field, column in STRING_FIELDS.items():
+        if not isinstance(data[field], str):
+            return f"Field {field} must be a string"
+        # Longer values and NULs would only fail in the database, as a 500.
+        length = column.type.length
+        if length is not None and len(data[field]) > length:
+            return f"Field {field} must be at most {length} characters"
+        if "\x00" in data[field]:
+            return f"Field {field} must not contain NUL characters"
+
+    if not isinstance(data["isHeadquarter"], bool):
+        return "Field isHeadquarter must be a boolean"
+
+    return swift_code_error(data["swiftCode"].upper(), data["countryISO2"].upper())
+
+
+def bank_values(data):
+    return {
+        "swift_code": data["swiftCode"].upper(),
+        "address": data["address"],
+        "bank_name": data["bankName"],
+        "country_iso2": data["countryISO2"].upper(),
+        "country_name": data["countryName"].upper(),
+        "is_headquarter": data["isHeadquarter"],
+    }
+
+
+def read_bulk_items(req=None):
+    if req is None:
+        req = request
+    if req.mimetype == "application/x-ndjson":
+        items = []
+        for line in req.stream:
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+
+    items = req.get_json(force=True)
+    if not isinstance(items, list):
+        abort(400, description="Request body must be a JSON array")
+    return items
+
+
+def requested_swift_codes(data, limit, label):
+    swift_codes = data.get("swiftCodes") if isinstance(data, dict) else None
+    if not isinstance(swift_codes, list) or not all(
+            isinstance(code, str) for code in swift_codes):
+        abort(400, description="swiftCodes must be a list of strings")
+
+    if len(swift_codes) > limit:
+        abort(400, description=f"At most {limit} SWIFT codes per {label}")
+
+    return [code.upper() for code in swift_codes]
+
+
+def prepare_bulk_items(items):
+    results = []
+    values = []
+    seen = set()
+    for item in items:
+        error = bank_payload_error(item)
+        if error:
+            swift_code = item.get("swiftCode") if isinstance(item, dict) else None
+            results.append({"swiftCode": swift_code, "status": "invalid",
+                            "message": error})
+            continue
+
+        row = bank_values(item)
+        if row["swift_code"] in seen:
+            results.append({"swiftCode": row["swift_code"], "status": "conflict",
+                            "message": "Duplicate SWIFT code in request"})
+            continue
+
+        seen.add(row["swift_code"])
+        values.append(row)
+        results.append({"swiftCode": row["swift_code"], "status": None})
+    return results, values
+
+
+def bulk_add_summary(results, created):
+    summary = {status: 0 for status in ("created", "conflict", "invalid")}
+    for result in results:
+        if result["status"] is None:
+            if result["swiftCode"] in created:
+                result["status"] = "created"
+            else:
+                result["status"] = "conflict"
+                result["message"] = "SWIFT code already exists"
+        summary[result["status"]] += 1
+    return {"results": results, **summary}
+
+
+def bulk_delete_summary(swift_codes, deleted):
+    results = [
+        {"swiftCode": code, "status": "deleted" if code in deleted else "not_found"}
+        for code in swift_codes
+    ]
+    return {
+        "results": results,
+        "deleted": len(deleted),
+        "notFound": sum(r["status"] == "not_found" for r in results),
+    }
+
+
+def validation_results(swift_codes):
+    results = []
+    for code, reason in zip(swift_codes, swift_code_checks(swift_codes)):
+        item = {"swiftCode": code, "valid": not reason}
+        if reason:
+            item["reason"] = reason_text(reason)
+        results.append(item)
+
+    valid = sum(item["valid"] for item in results)
+    return {"results": results, "valid": valid, "invalid": len(results) - valid}
+
+
+def lookup_item(swift_code, bank, branches=None):
+    if bank is None:
+        return {"swiftCode": swift_code, "found": False}
+    item = {"found": True}
+    item.update(bank_details(bank, branches))
+    return item
+
+
+def batch_lookup_results(swift_codes, include_branches=False,
+                         chunk_size=BATCH_LOOKUP_CHUNK_SIZE):
+    snapshot = snapshot_store.current()
+
+    for start in range(0, len(swift_codes), chunk_size):
+        chunk = swift_codes[start:start + chunk_size]
+        if snapshot is not None:
+            found = {code: snapshot.get(code) for code in chunk}
+        else:
+            found = fetch_banks(set(chunk))
+
+        branches = {}
+        if include_branches:
+            headquarters = {code for code, bank in found.items()
+                            if bank is not None and bank.is_headquarter}
+            if snapshot is not None:
+                branches = {code: snapshot.branches_of(code) for code in headquarters}
+            else:
+                branches = fetch_branches(headquarters)
+
+        for code in chunk:
+            yield lookup_item(code, found.get(code),
+                              branches.get(code, []) if include_branches else None)
+
 
 def register_routes(app):
     @app.route("/v1/swift-codes/<string:swift_code>", methods=["GET"])
     def get_swift_code_details(swift_code):
         swift_code = swift_code.upper()
-        bank = Bank.query.filter_by(swift_code=swift_code).first()
-        if not bank:
-            abort(404, description="SWIFT code not found")
+        replica_router.route_reads(db.session)
+        snapshot = snapshot_store.current()
+        version, updated_at = dataset_state(snapshot)
+        etag = make_etag(version)
+        max_age = app.config["SWIFT_HTTP_MAX_AGE"]
+        pretty = wants_pretty()
+
+        def render():
+            if snapshot is not None:
+                bank = snapshot.get(swift_code)
+                branches = snapshot.branches_of(swift_code)
+            else:
+                bank, branches = fetch_details(swift_code)
+            if not bank:
+                abort(404, description="SWIFT code not found")
+            return dumps(bank_details(bank, branches), pretty)
+
+        if pretty:
+            body, encoded = render(), {}
+        else:
+            body, encoded = cached_render(swift_code, version, render, details_flight)
 
-        base_response = {
-            "address": bank.address,
-            "bankName": bank.bank_name,
-            "countryISO2": bank.country_iso2,
-            "countryName": bank.country_name,
-            "isHeadquarter": bank.is_headquarter,
-            "swiftCode": bank.swift_code
-        }
-
-        if bank.is_headquarter:
-            branches = Bank.query.filter_by(associated_headquarter=swift_code).all()
-            base_response["branches"] = [
-                {
-                    "address": b.address,
-                    "bankName": b.bank_name,
-                    "countryISO2": b.country_iso2,
-                    "isHeadquarter": b.is_headquarter,
-                    "swiftCode": b.swift_code
-                }
-                for b in branches
-            ]
-
-        return Response(json.dumps(base_response,
-                                   indent=4,
-                                   sort_keys=False), mimetype="application/json")
+        response = CachedResponse(body, encoded, mimetype=JSON_MIMETYPE)
+        return conditional_response(response, etag, updated_at, max_age)
 
     @app.route("/v1/swift-codes/country/<string:country_iso2>", methods=["GET"])
     def get_swift_codes_by_country(country_iso2):
         country_iso2 = country_iso2.upper()
-        banks = Bank.query.filter_by(country_iso2=country_iso2).all()
-        if not banks:
+        limit, after = page_args(app.config["SWIFT_PAGE_LIMIT"])
+        paginated = limit is not None or after is not None
+        replica_router.route_reads(db.session)
+        snapshot = snapshot_store.current()
+        version, updated_at = dataset_state(snapshot)
+        etag = make_etag(version)
+        max_age = app.config["SWIFT_HTTP_MAX_AGE"]
+        columnar = wants_columnar()
+        pretty = wants_pretty()
+        if (request.args.get("stream") == "1" and not paginated and not columnar
+                and snapshot is None):
+            response = stream_country_listing(country_iso2,
+                                              iter(stream_country(country_iso2)))
+            return conditional_response(response, etag, updated_at, max_age)
+
+        def fetch():
+            fetch_limit = limit + 1 if limit is not None else None
+            if snapshot is not None and paginated:
+                banks = snapshot.country_page(country_iso2, fetch_limit, after)
+            elif snapshot is not None:
+                banks = snapshot.country(country_iso2)
+            else:
+                banks = fetch_country(country_iso2, fetch_limit, after)
+            if not banks and after is None:
+                abort(404, description="No SWIFT codes found for the specified country")
+            return banks
+
+        if not paginated:
+            def render():
+                banks = fetch()
+                if snapshot is not None and not pretty and not columnar:
+                    return country_listing_bytes(country_iso2, banks)
+                return dumps(country_listing(country_iso2, banks, columnar), pretty)
+
+            if pretty:
+                body, encoded = render(), {}
+            else:
+                body, encoded = cached_render(country_cache_key(country_iso2, columnar),
+                                              version, render, country_flight)
+            response = CachedResponse(body, encoded, mimetype=JSON_MIMETYPE)
+            return conditional_response(response, etag, updated_at, max_age)
+
+        banks = fetch()
+        has_more = limit is not None and len(banks) > limit
+        banks = banks[:limit]
+        listing = country_listing(country_iso2, banks, columnar)
+        listing["nextAfter"] = banks[-1].swift_code if has_more else None
+        return conditional_response(json_response(listing), etag, updated_at, max_age)
+
+    @app.route("/v1/swift-codes/stats", methods=["GET"])
+    def get_swift_code_stats():
+        country_iso2 = request.args.get("country", "").strip().upper() or None
+        limit, _ = page_args(app.config["SWIFT_PAGE_LIMIT"])
+        replica_router.route_reads(db.session)
+        version, updated_at = session_version_tracker(db.session).current()
+        etag = make_etag(version)
+        max_age = app.config["SWIFT_HTTP_MAX_AGE"]
+        stats = fetch_stats(country_iso2, limit or 100)
+        if country_iso2 is not None and not stats["countries"]:
             abort(404, description="No SWIFT codes found for the specified country")
-        country_name = banks[0].country_name if banks else ""
-        return jsonify({
-            "countryISO2": country_iso2,
-            "countryName": country_name,
-            "swiftCodes": [
-                {
-                    "swiftCode": bank.swift_code,
-                    "address": bank.address,
-                    "bankName": bank.bank_name,
-                    "countryISO2": bank.country_iso2,
-                    "isHeadquarter": bank.is_headquarter
-                }
-                for bank in banks
-            ]
-        })
+        return conditional_response(json_response(stats), etag, updated_at, max_age)
+
+    @app.route("/v1/swift-codes/search", methods=["GET"])
+    def search_swift_codes():
+        prefix, name, country_iso2, limit = \
+            search_args(app.config["SWIFT_SEARCH_LIMIT"])
+        replica_router.route_reads(db.session)
+        snapshot = snapshot_store.current()
+        version, updated_at = dataset_state(snapshot)
+        etag = make_etag(version)
+        max_age = app.config["SWIFT_HTTP_MAX_AGE"]
+        if snapshot is not None:
+            banks = snapshot.search(prefix, name, country_iso2, limit)
+        else:
+            banks = search_banks(prefix, name, country_iso2, limit)
+        response = json_response(search_results(banks, wants_columnar()))
+        return conditional_response(response, etag, updated_at, max_age)
+
+    @app.route("/v1/swift-codes/batch-lookup", methods=["POST"])
+    def batch_lookup_swift_codes():
+        data = request.get_json(force=True)
+        swift_codes = requested_swift_codes(data,
+                                            app.config["SWIFT_BATCH_LOOKUP_LIMIT"],
+                                            "batch lookup")
+        replica_router.route_reads(db.session)
+        results = batch_lookup_results(swift_codes, bool(data.get("includeBranches")))
+
+        streaming = (request.args.get("format") == "ndjson" or
+                     request.accept_mimetypes.best == "application/x-ndjson")
+        if streaming:
+            def generate():
+                try:
+                    for item in results:
+                        yield dumps(item) + b"\n"
+                finally:
+                    db.session.close()
+
+            return Response(stream_with_context(generate()),
+                            mimetype="application/x-ndjson")
+
+        return json_response({"results": list(results)})
+
+    @app.route("/v1/swift-codes/validate", methods=["POST"])
+    def validate_swift_codes():
+        swift_codes = requested_swift_codes(request.get_json(force=True),
+                                            app.config["SWIFT_BATCH_LOOKUP_LIMIT"],
+                                            "validation request")
+        return json_response(validation_results(swift_codes))
 
     @app.route("/v1/swift-codes", methods=["POST"])
     def add_swift_code():
         data = request.get_json(force=True)
 
-        required_fields = [
-            "swiftCode", "address", "bankName",
-            "countryISO2", "countryName", "isHeadquarter"
-        ]
-
-        for field in required_fields:
-            if field not in data:
-                abort(400, description=f"Missing field: {field}")
+        error = bank_payload_error(data)
+        if error:
+            abort(400, description=error)
 
         swift_code = data["swiftCode"].upper()
         if Bank.query.filter_by(swift_code=swift_code).first():
@@ -92,12 +448,22 @@ def register_routes(app):
                 is_headquarter=data["isHeadquarter"]
             )
 
+            record = BankRecord(new_bank.swift_code, new_bank.address,
+                                new_bank.bank_name, new_bank.country_iso2,
+                                new_bank.country_name, new_bank.is_headquarter)
+
             db.session.add(new_bank)
+            apply_stats([record], 1)
+            bumped = bump_dataset_version()
             db.session.commit()
+            replica_router.mark_write()
+            version_tracker.update(bumped)
+            invalidate_cached(swift_code)
+            snapshot_store.update(added=[record], bumped=bumped)
 
-            return jsonify({
+            return json_response({
                 "message": f"SWIFT code, with value {swift_code} added successfully"
-            }), 201
+            }, 201)
 
         except Exception as e:
             db.session.rollback()
@@ -113,32 +479,101 @@ def register_routes(app):
             abort(404, description="SWIFT code not found")
         try:
             db.session.delete(bank)
+            apply_stats([bank], -1)
+            bumped = bump_dataset_version()
             db.session.commit()
+            replica_router.mark_write()
+            version_tracker.update(bumped)
+            invalidate_cached(swift_code)
+            snapshot_store.update(removed=[swift_code], bumped=bumped)
 
-            return jsonify({
+            return json_response({
                 "message": f"SWIFT code, with value {swift_code} deleted successfully"
-            }), 200
+            }, 200)
 
         except Exception as e:
             db.session.rollback()
             logger.error(f"Internal error during SWIFT code deletion: {e}")
             abort(500, description="Internal Server Error")
 
+    @app.route("/v1/swift-codes/bulk", methods=["POST"])
+    def bulk_add_swift_codes():
+        items = read_bulk_items()
+        limit = app.config["SWIFT_BULK_LIMIT"]
+        if len(items) > limit:
+            abort(400, description=f"At most {limit} SWIFT codes per bulk request")
+
+        results, values = prepare_bulk_items(items)
+        bumped = None
+        try:
+            created = insert_new_banks(values)
+            if created:
+                apply_stats([BankRecord(**row) for row in values
+                             if row["swift_code"] in created], 1)
+                bumped = bump_dataset_version()
+            db.session.commit()
+            replica_router.mark_write()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Internal error during bulk SWIFT code creation: {e}")
+            abort(500, description="Internal Server Error")
+
+        if bumped is not None:
+            version_tracker.update(bumped)
+        added = [BankRecord(**row) for row in values if row["swift_code"] in created]
+        for record in added:
+            invalidate_cached(record.swift_code)
+        snapshot_store.update(added=added, bumped=bumped)
+
+        return json_response(bulk_add_summary(results, created))
+
+    @app.route("/v1/swift-codes/bulk", methods=["DELETE"])
+    def bulk_delete_swift_codes():
+        swift_codes = requested_swift_codes(request.get_json(force=True),
+                                            app.config["SWIFT_BULK_LIMIT"],
+                                            "bulk request")
+        bumped = None
+        try:
+            deleted = delete_swift_codes(list(dict.fromkeys(swift_codes)))
+            if deleted:
+                apply_stats(deleted.values(), -1)
+                bumped = bump_dataset_version()
+            db.session.commit()
+            replica_router.mark_write()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Internal error during bulk SWIFT code deletion: {e}")
+            abort(500, description="Internal Server Error")
+
+        if bumped is not None:
+            version_tracker.update(bumped)
+        for swift_code in deleted:
+            invalidate_cached(swift_code)
+        snapshot_store.update(removed=list(deleted), bumped=bumped)
+
+        return json_response(bulk_delete_summary(swift_codes, deleted))
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        if not instrumentation.enabled:
+            abort(404, description="Metrics are disabled")
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
     @app.errorhandler(404)
     def handle_404_error(error):
         description = getattr(error, "description", "Not Found")
-        return jsonify({"message": description}), 404
+        return json_response({"message": description}, 404)
 
     @app.errorhandler(400)
     def handle_400_error(error):
         description = getattr(error, "description", "Bad Request")
-        return jsonify({"message": description}), 400
+        return json_response({"message": description}, 400)
 
     @app.errorhandler(409)
     def handle_409_error(error):
         description = getattr(error, "description", "Conflict")
-        return jsonify({"message": description}), 409
+        return json_response({"message": description}, 409)
 
     @app.errorhandler(500)
     def handle_500_error(error):
-        return jsonify({"message": "Internal Server Error"}), 500
+        return json_response({"message": "Internal Server Error"}, 500)
@@ -0,0 +1,153 @@
+import bisect
+import copy
+import logging
+from collections import defaultdict
+from sqlalchemy import text
+from app.extensions import db
+
+
+logger = logging.getLogger(__name__)
+
+MIN_NAME_QUERY = 3
+
+# A name query whose rarest trigram appears in more than this share of the
+# names is answered by walking the sorted codes instead of the postings.
+DENSE_QUERY_SHARE = 0.05
+
+# Up to this many changes to a sorted list are bisected into a copy of it.
+BISECT_CHANGES = 32
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def sorted_update(values, gone=(), new=(), key=None):
+    # A new sorted list: `values` without `gone` and with the sorted `new`.
+    # Bisecting into a copy suits a handful of changes, one merge a batch.
+    if len(gone) + len(new) <= BISECT_CHANGES:
+        values = values.copy()
+        for value in gone:
+            values.pop(bisect.bisect_left(values, key(value) if key else value,
+                                          key=key))
+        for value in new:
+            bisect.insort(values, value, key=key)
+        return values
+
+    values = [value for value in values if value not in gone]
+    values.extend(new)
+    values.sort(key=key)
+    return values
+
+
+class SearchIndex:
+    # Never changed once built: updated() returns a new index sharing what
+    # the changes do not touch, so searches running meanwhile are unaffected.
+    def __init__(self, records=()):
+        records = list(records)
+        self.codes = sorted(record.swift_code for record in records)
+        self.records = {record.swift_code: record for record in records}
+        self.names = defaultdict(list)
+        self.grams = defaultdict(set)
+        self.code_names = {}
+        for record in records:
+            name = (record.bank_name or "").upper()
+            self.names[name].append(record.swift_code)
+            self.code_names[record.swift_code] = name
+        for name, codes in self.names.items():
+            codes.sort()
+            for gram in trigrams(name):
+                self.grams[gram].add(name)
+
+    def updated(self, added=(), removed=()):
+        # `added` replaces records with the same code; `removed` are codes.
+        added = {record.swift_code: record for record in added}
+        gone = {code for code in set(removed) | added.keys() if code in self.records}
+
+        index = copy.copy(self)
+        index.codes = sorted_update(self.codes, gone, sorted(added))
+        index.records = self.records.copy()
+        index.code_names = self.code_names.copy()
+        changes = defaultdict(lambda: (set(), []))
+        for code in gone:
+            del index.records[code]
+            changes[index.code_names.pop(code)][0].add(code)
+        for code, record in added.items():
+            name = (record.bank_name or "").upper()
+            index.records[code] = record
+            index.code_names[code] = name
+            changes[name][1].append(code)
+
+        index.names = self.names.copy()
+        gram_changes = defaultdict(lambda: (set(), set()))
+        for name, (gone_codes, new_codes) in changes.items():
+            codes = sorted_update(self.names.get(name, []), gone_codes,
+                                  sorted(new_codes))
+            if codes:
+                index.names[name] = codes
+            else:
+                index.names.pop(name, None)
+            if (name in self.names) != bool(codes):
+                for gram in trigrams(name):
+                    gram_changes[gram][bool(codes)].add(name)
+
+        index.grams = self.grams.copy()
+        for gram, (gone_names, new_names) in gram_changes.items():
+            names = (self.grams.get(gram, set()) - gone_names) | new_names
+            if names:
+                index.grams[gram] = names
+            else:
+                index.grams.pop(gram, None)
+        return index
+
+    def _prefixed(self, prefix):
+        for position in range(bisect.bisect_left(self.codes, prefix), len(self.codes)):
+            code = self.codes[position]
+            if not code.startswith(prefix):
+                break
+            yield code
+
+    def _named(self, name, prefix=None):
+        postings = [self.grams.get(gram, ()) for gram in trigrams(name)]
+        rarest = min(postings, key=len) if postings else None
+        if rarest is None or len(rarest) > DENSE_QUERY_SHARE * len(self.names):
+            return (code for code in self._prefixed(prefix or "")
+                    if name in self.code_names[code])
+
+        return sorted(code for candidate in rarest if name in candidate
+                      for code in self.names[candidate])
+
+    def search(self, prefix=None, name=None, country_iso2=None, limit=20):
+        if name is not None:
+            codes = self._named(name.upper(), prefix)
+        else:
+            codes = self._prefixed(prefix or "")
+
+        results = []
+        for code in codes:
+            if prefix is not None and not code.startswith(prefix):
+                continue
+            record = self.records[code]
+            if country_iso2 is not None and record.country_iso2 != country_iso2:
+                continue
+            results.append(record)
+            if len(results) == limit:
+                break
+        return results
+
+
+def ensure_trigram_index():
+    # pg_trgm ships with contrib; without it name search still works, just
+    # as a sequential scan. CREATE INDEX locks banks against writes until the
+    # transaction ends even when the index exists, so look it up first.
+    if db.session.execute(text("SELECT to_regclass('idx_bank_name_trgm')")).scalar():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_bank_name_trgm "
+                "ON banks USING gin (upper(bank_name) gin_trgm_ops)"
+            ))
+    except Exception as e:
+        logger.warning(f"Trigram index for bank name search not available: {e}")
@@ -0,0 +1,117 @@
+import json
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_MIMETYPE = "application/json"
+
+COLUMN_FIELDS = {
+    "swiftCode": "swift_code",
+    "address": "address",
+    "bankName": "bank_name",
+    "countryISO2": "country_iso2",
+    "isHeadquarter": "is_headquarter",
+}
+
+
+def dumps(obj, pretty=False):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        # Same bytes as orjson's OPT_INDENT_2, so the ETag-keyed body does not
+        # depend on which encoder is installed.
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def wants_pretty(req=None):
+    if req is None:
+        req = request
+    return req.args.get("pretty") in ("1", "true")
+
+
+def wants_columnar(req=None):
+    if req is None:
+        req = request
+    return req.args.get("shape") == "columnar"
+
+
+def json_response(obj, status=200, pretty=None):
+    if pretty is None:
+        pretty = wants_pretty()
+    return Response(dumps(obj, pretty), status=status, mimetype=JSON_MIMETYPE)
+
+
+def join_fragments(fragments):
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def branch_entry(bank):
+    return {
+        "address": bank.address,
+        "bankName": bank.bank_name,
+        "countryISO2": bank.country_iso2,
+        "isHeadquarter": bank.is_headquarter,
+        "swiftCode": bank.swift_code
+    }
+
+
+def bank_details(bank, branches=None):
+    details = {
+        "address": bank.address,
+        "bankName": bank.bank_name,
+        "countryISO2": bank.country_iso2,
+        "countryName": bank.country_name,
+        "isHeadquarter": bank.is_headquarter,
+        "swiftCode": bank.swift_code
+    }
+
+    if bank.is_headquarter and branches is not None:
+        details["branches"] = [branch_entry(b) for b in branches]
+
+    return details
+
+
+def country_entry(bank):
+    return {
+        "swiftCode": bank.swift_code,
+        "address": bank.address,
+        "bankName": bank.bank_name,
+        "countryISO2": bank.country_iso2,
+        "isHeadquarter": bank.is_headquarter
+    }
+
+
+def columns(banks):
+    # Parallel arrays keyed like country_entry, for clients that would
+    # rather not parse the same keys on every row.
+    return {key: [getattr(bank, field) for bank in banks]
+            for key, field in COLUMN_FIELDS.items()}
+
+
+def country_listing(country_iso2, banks, columnar=False):
+    return {
+        "countryISO2": country_iso2,
+        "countryName": banks[0].country_name if banks else "",
+        "swiftCodes": (columns(banks) if columnar
+                       else [country_entry(bank) for bank in banks])
+    }
+
+
+def search_results(banks, columnar=False):
+    return {
+        "count": len(banks),
+        "results": (columns(banks) if columnar
+                    else [country_entry(bank) for bank in banks])
+    }
+
+
+def country_listing_bytes(country_iso2, banks):
+    country_name = banks[0].country_name if banks else ""
+    return (b'{"countryISO2":' + dumps(country_iso2) +
+            b',"countryName":' + dumps(country_name) +
+            b',"swiftCodes":' + join_fragments(bank.fragment for bank in banks) + b"}")
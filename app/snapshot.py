@@ -0,0 +1,316 @@
+import bisect
+import copy
+import logging
+import threading
+import time
+from collections import defaultdict
+from operator import attrgetter
+from sqlalchemy import select
+from app.models.bank import Bank
+from app.extensions import db
+from app.serializers import dumps, country_entry
+from app.versioning import read_dataset_version, version_tracker
+from app.search import SearchIndex, sorted_update
+from app.snapshot_file import SnapshotFile
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = [
+    "swift_code", "address", "bank_name", "country_iso2",
+    "country_name", "is_headquarter", "associated_headquarter"
+]
+
+
+class BankRecord:
+    __slots__ = tuple(SNAPSHOT_FIELDS) + ("_fragment",)
+
+    def __init__(self, swift_code, address, bank_name, country_iso2,
+                 country_name, is_headquarter, associated_headquarter=None):
+        self.swift_code = swift_code
+        self.address = address
+        self.bank_name = bank_name
+        self.country_iso2 = country_iso2
+        self.country_name = country_name
+        self.is_headquarter = is_headquarter
+        self.associated_headquarter = associated_headquarter
+        self._fragment = None
+
+    @property
+    def fragment(self):
+        if self._fragment is None:
+            self._fragment = dumps(country_entry(self))
+        return self._fragment
+
+
+def swift_code_of(bank):
+    return bank.swift_code
+
+
+def regrouped(groups, group_of, gone, new, ordered):
+    # A copy of `groups` in which only the lists of touched groups are new.
+    changes = defaultdict(lambda: (set(), []))
+    for bank in gone:
+        changes[group_of(bank)][0].add(bank)
+    for bank in new:
+        changes[group_of(bank)][1].append(bank)
+    changes.pop(None, None)
+
+    groups = groups.copy()
+    for group, (gone_banks, new_banks) in changes.items():
+        banks = groups.get(group, [])
+        if ordered:
+            new_banks.sort(key=swift_code_of)
+            banks = sorted_update(banks, gone_banks, new_banks, key=swift_code_of)
+        else:
+            banks = [bank for bank in banks if bank not in gone_banks] + new_banks
+        if banks:
+            groups[group] = banks
+        else:
+            groups.pop(group, None)
+    return groups
+
+
+class DirectorySnapshot:
+    # Never changed once published: writes go through updated(), which
+    # builds a new snapshot sharing whatever they do not touch, and the
+    # store swaps it in. A request holding a snapshot sees it whole.
+    def __init__(self, records=(), version=0, updated_at=None):
+        self.version = version
+        self.updated_at = updated_at
+        self.banks = {record.swift_code: record for record in records}
+        self.branches = defaultdict(list)
+        self.countries = defaultdict(list)
+        self.loaded_at = time.monotonic()
+
+        for record in self.banks.values():
+            self.countries[record.country_iso2].append(record)
+            if record.associated_headquarter:
+                self.branches[record.associated_headquarter].append(record)
+        # Kept sorted from here on, so a country page is a bisect and a slice.
+        for banks in self.countries.values():
+            banks.sort(key=swift_code_of)
+        self.search_index = SearchIndex(self.banks.values())
+
+    def __len__(self):
+        return len(self.banks)
+
+    def updated(self, added=(), removed=(), version=None, updated_at=None):
+        # `added` replaces records with the same code; `removed` are codes.
+        added = {record.swift_code: record for record in added}
+        gone = [self.banks[code] for code in set(removed) | added.keys()
+                if code in self.banks]
+
+        snapshot = copy.copy(self)
+        if version is not None:
+            snapshot.version, snapshot.updated_at = version, updated_at
+        snapshot.banks = self.banks.copy()
+        for record in gone:
+            del snapshot.banks[record.swift_code]
+        snapshot.banks.update(added)
+        snapshot.countries = regrouped(self.countries, attrgetter("country_iso2"),
+                                       gone, added.values(), ordered=True)
+        snapshot.branches = regrouped(self.branches,
+                                      attrgetter("associated_headquarter"),
+                                      gone, added.values(), ordered=False)
+        snapshot.search_index = self.search_index.updated(added.values(), removed)
+        return snapshot
+
+    def get(self, swift_code):
+        return self.banks.get(swift_code)
+
+    def branches_of(self, swift_code):
+        return self.branches.get(swift_code, [])
+
+    def country(self, country_iso2):
+        return self.countries.get(country_iso2, [])
+
+    def country_page(self, country_iso2, limit=None, after=None):
+        banks = self.country(country_iso2)
+        start = 0
+        if after is not None:
+            start = bisect.bisect_right(banks, after, key=swift_code_of)
+        end = start + limit if limit is not None else len(banks)
+        return banks[start:end]
+
+    def search(self, prefix=None, name=None, country_iso2=None, limit=20):
+        return self.search_index.search(prefix, name, country_iso2, limit)
+
+
+def load_snapshot(batch_size=10000):
+    version, updated_at = read_dataset_version()
+    columns = [getattr(Bank, name) for name in SNAPSHOT_FIELDS]
+    rows = db.session.execute(
+        select(*columns).execution_options(yield_per=batch_size)
+    )
+    return DirectorySnapshot((BankRecord(*row) for row in rows), version, updated_at)
+
+
+class FileSnapshot:
+    # Warm start: lookups are answered straight from the mmap'd file, so a
+    # worker serves them as soon as the file is open. Country listings,
+    # search and writes need the full DirectorySnapshot, built once by
+    # directory(); the store builds it in the background and swaps it in.
+    def __init__(self, snapshot_file, version=0, updated_at=None):
+        self.file = snapshot_file
+        self.version = version
+        self.updated_at = updated_at
+        self.loaded_at = time.monotonic()
+        self._directory = None
+        self._building = threading.Lock()
+
+    def __len__(self):
+        return len(self.file)
+
+    def directory(self):
+        if self._directory is None:
+            with self._building:
+                if self._directory is None:
+                    started = time.perf_counter()
+                    records = (BankRecord(*row) for row in self.file.records())
+                    self._directory = DirectorySnapshot(records, self.version,
+                                                        self.updated_at)
+                    logger.info(f"SWIFT snapshot indexed from file in "
+                                f"{time.perf_counter() - started:.2f}s.")
+        return self._directory
+
+    def get(self, swift_code):
+        row = self.file.get(swift_code)
+        return None if row is None else BankRecord(*row)
+
+    def branches_of(self, swift_code):
+        return [BankRecord(*row) for row in self.file.branches_of(swift_code)]
+
+    def country(self, country_iso2):
+        return self.directory().country(country_iso2)
+
+    def country_page(self, country_iso2, limit=None, after=None):
+        return self.directory().country_page(country_iso2, limit, after)
+
+    def search(self, prefix=None, name=None, country_iso2=None, limit=20):
+        return self.directory().search(prefix, name, country_iso2, limit)
+
+    def updated(self, added=(), removed=(), version=None, updated_at=None):
+        return self.directory().updated(added, removed, version, updated_at)
+
+
+def load_snapshot_file(path):
+    # Only a file written at the current dataset version is used.
+    version, updated_at = read_dataset_version()
+    try:
+        snapshot_file = SnapshotFile(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Snapshot file {path} not usable: {e}")
+        return None
+    if snapshot_file.version != version:
+        logger.warning(f"Snapshot file {path} is at dataset version "
+                       f"{snapshot_file.version}, database is at {version}; "
+                       f"ignoring it.")
+        snapshot_file.close()
+        return None
+    return FileSnapshot(snapshot_file, version, updated_at)
+
+
+class SnapshotStore:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.refresh_interval = 60.0
+        self.snapshot_file = None
+        self.snapshot = None
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._updating = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("SWIFT_SNAPSHOT", False)
+        self.refresh_interval = app.config.get("SWIFT_SNAPSHOT_REFRESH",
+                                               self.refresh_interval)
+        self.snapshot_file = app.config.get("SWIFT_SNAPSHOT_FILE")
+        self.snapshot = None
+
+    def current(self):
+        if not self.enabled:
+            return None
+
+        if self.snapshot is None:
+            with self._lock:
+                if self.snapshot is None:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        logger.error(f"Error while loading SWIFT snapshot: {e}")
+                        db.session.rollback()
+            return self.snapshot
+
+        stale = version_tracker.current()[0] != self.snapshot.version
+        if stale or time.monotonic() - self._checked_at > self.refresh_interval:
+            self.refresh_in_background()
+        return self.snapshot
+
+    def refresh(self):
+        self._checked_at = time.monotonic()
+        snapshot = None
+        if self.snapshot is None and self.snapshot_file:
+            snapshot = load_snapshot_file(self.snapshot_file)
+        if snapshot is None:
+            snapshot = load_snapshot()
+        with self._updating:
+            # A write may have moved the snapshot past what was just read.
+            current = self.snapshot
+            if current is not None and snapshot.version < current.version:
+                return
+            self.snapshot = snapshot
+        logger.info(f"SWIFT snapshot loaded with {len(snapshot)} codes.")
+        if isinstance(snapshot, FileSnapshot):
+            threading.Thread(target=self.promote, args=(snapshot,), daemon=True).start()
+
+    def promote(self, snapshot):
+        # Swaps a file-backed snapshot for its full in-memory build, unless
+        # a write or refresh has replaced it meanwhile.
+        try:
+            directory = snapshot.directory()
+        except Exception as e:
+            logger.error(f"Error while indexing SWIFT snapshot file: {e}")
+            return
+        with self._updating:
+            if self.snapshot is snapshot:
+                self.snapshot = directory
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._checked_at = time.monotonic()
+
+        thread = threading.Thread(target=self._refresh_worker, daemon=True)
+        thread.start()
+
+    def _refresh_worker(self):
+        try:
+            with self.app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Error while refreshing SWIFT snapshot: {e}")
+                finally:
+                    db.session.remove()
+        finally:
+            self._refreshing = False
+
+    def update(self, added=(), removed=(), bumped=None):
+        # Writers take turns so none of them swaps out another's changes.
+        with self._updating:
+            snapshot = self.snapshot
+            if snapshot is None or not (added or removed):
+                return
+            version, updated_at = snapshot.version, snapshot.updated_at
+            if bumped is not None and bumped.version == version + 1:
+                version, updated_at = bumped.version, bumped.updated_at
+            self.snapshot = snapshot.updated(added, removed, version, updated_at)
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,254 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from app.extensions import db
+from app.models.bank import Bank
+from app.versioning import read_dataset_version
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SWIFTSNP"
+SCHEMA_VERSION = 1
+
+# magic, schema version, manifest length, crc32 of everything after the
+# header, payload length.
+HEADER = struct.Struct("<8sHxxIIQ")
+ALIGNMENT = 8
+
+FILE_FIELDS = [
+    "swift_code", "address", "bank_name", "country_iso2",
+    "country_name", "is_headquarter", "associated_headquarter", "row_hash"
+]
+STRING_FIELDS = ["address", "bank_name", "country_name"]
+MISSING_HASH = np.iinfo(np.int64).min
+
+
+class SnapshotFileError(ValueError):
+    pass
+
+
+def string_table(values):
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    encoded = [value.encode() for value in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return codes.astype("<i4"), offsets, np.frombuffer(b"".join(encoded), dtype="u1")
+
+
+def snapshot_arrays(frame):
+    frame = frame.sort_values("swift_code", kind="stable")
+    codes = frame["swift_code"].to_numpy(dtype="S11")
+
+    associated = frame["associated_headquarter"]
+    present = associated.notna().to_numpy()
+    positions = np.full(len(frame), -1, dtype="<i4")
+    if present.any():
+        targets = associated[present].to_numpy(dtype="S11")
+        found = np.searchsorted(codes, targets)
+        found[found == len(codes)] = 0
+        positions[present] = np.where(codes[found] == targets, found, -1)
+
+    is_headquarter = frame["is_headquarter"].astype(object)
+    arrays = {
+        "swift_code": codes,
+        "country_iso2": frame["country_iso2"].fillna("").to_numpy(dtype="S2"),
+        "is_headquarter": (is_headquarter.map({True: 1, False: 0}).fillna(-1)
+                           .to_numpy(dtype="i1")),
+        "associated_headquarter": positions,
+        "row_hash": frame["row_hash"].fillna(MISSING_HASH).to_numpy(dtype="<i8"),
+    }
+    for field in STRING_FIELDS:
+        codes_, offsets, data = string_table(frame[field])
+        arrays[f"{field}.codes"] = codes_
+        arrays[f"{field}.offsets"] = offsets
+        arrays[f"{field}.data"] = data
+    return arrays
+
+
+def padding(size):
+    return -size % ALIGNMENT
+
+
+def write_snapshot_file(path, frame, version=0, updated_at=None):
+    arrays = snapshot_arrays(frame)
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset += array.nbytes + padding(array.nbytes)
+    manifest = json.dumps({
+        "rows": len(frame),
+        "version": version,
+        "updatedAt": updated_at.isoformat() if updated_at else None,
+        "fields": FILE_FIELDS,
+        "arrays": layout,
+    }).encode()
+    manifest += b" " * padding(HEADER.size + len(manifest))
+
+    checksum = zlib.crc32(manifest)
+    for array in arrays.values():
+        checksum = zlib.crc32(array.tobytes() + b"\0" * padding(array.nbytes), checksum)
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, SCHEMA_VERSION, len(manifest), checksum, offset))
+        f.write(manifest)
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b"\0" * padding(array.nbytes))
+    os.replace(temporary, path)
+    return len(frame)
+
+
+class SnapshotFile:
+    """Read-only view of a snapshot file; arrays point straight into the mmap."""
+
+    def __init__(self, path, verify=True):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._open(verify)
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self, verify):
+        if len(self._mmap) < HEADER.size:
+            raise SnapshotFileError("Snapshot file is truncated")
+        magic, schema_version, manifest_size, checksum, payload_size = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise SnapshotFileError("Not a SWIFT snapshot file")
+        if schema_version != SCHEMA_VERSION:
+            raise SnapshotFileError(f"Snapshot schema version {schema_version} is not "
+                                    f"supported, expected {SCHEMA_VERSION}")
+        if len(self._mmap) != HEADER.size + manifest_size + payload_size:
+            raise SnapshotFileError("Snapshot file is truncated")
+        if verify and zlib.crc32(memoryview(self._mmap)[HEADER.size:]) != checksum:
+            raise SnapshotFileError("Snapshot checksum mismatch")
+
+        manifest = json.loads(self._mmap[HEADER.size:HEADER.size + manifest_size])
+        self.version = manifest["version"]
+        updated_at = manifest["updatedAt"]
+        self.updated_at = updated_at and datetime.fromisoformat(updated_at)
+        self.rows = manifest["rows"]
+
+        start = HEADER.size + manifest_size
+        self.arrays = {
+            name: np.frombuffer(self._mmap, dtype=dtype, count=count,
+                                offset=start + offset)
+            for name, (dtype, offset, count) in manifest["arrays"].items()
+        }
+        self.codes = self.arrays["swift_code"]
+        self._strings = {}
+        self._branches = None
+
+    def __len__(self):
+        return self.rows
+
+    def close(self):
+        self.arrays = self.codes = None
+        self._strings = {}
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _string(self, field, position):
+        code = self.arrays[f"{field}.codes"][position]
+        if code < 0:
+            return None
+        offsets = self.arrays[f"{field}.offsets"]
+        data = self.arrays[f"{field}.data"]
+        return data[offsets[code]:offsets[code + 1]].tobytes().decode()
+
+    def _string_column(self, field):
+        if field not in self._strings:
+            offsets = self.arrays[f"{field}.offsets"].tolist()
+            data = self.arrays[f"{field}.data"].tobytes()
+            uniques = [data[lo:hi].decode() for lo, hi in zip(offsets, offsets[1:])]
+            # Index -1 (missing) picks the trailing None.
+            self._strings[field] = np.array(uniques + [None], dtype=object)
+        return self._strings[field][self.arrays[f"{field}.codes"]]
+
+    def find(self, swift_code):
+        key = swift_code.encode()
+        position = int(np.searchsorted(self.codes, key))
+        if position < self.rows and self.codes[position] == key:
+            return position
+        return None
+
+    def row(self, position):
+        associated = self.arrays["associated_headquarter"][position]
+        is_headquarter = self.arrays["is_headquarter"][position]
+        return (
+            self.codes[position].decode(),
+            self._string("address", position),
+            self._string("bank_name", position),
+            self.arrays["country_iso2"][position].decode() or None,
+            self._string("country_name", position),
+            None if is_headquarter < 0 else bool(is_headquarter),
+            self.codes[associated].decode() if associated >= 0 else None,
+        )
+
+    def get(self, swift_code):
+        position = self.find(swift_code)
+        return None if position is None else self.row(position)
+
+    def branches_of(self, swift_code):
+        position = self.find(swift_code)
+        if position is None:
+            return []
+        if self._branches is None:
+            associated = self.arrays["associated_headquarter"]
+            order = np.argsort(associated, kind="stable")
+            self._branches = (associated[order], order)
+        targets, order = self._branches
+        lo, hi = np.searchsorted(targets, [position, position + 1])
+        return [self.row(branch) for branch in order[lo:hi]]
+
+    def frame(self):
+        associated = self.arrays["associated_headquarter"]
+        codes = self.codes.astype("U11").astype(object)
+        is_headquarter = self.arrays["is_headquarter"]
+        row_hash = self.arrays["row_hash"]
+        country_iso2 = self.arrays["country_iso2"]
+        return pd.DataFrame({
+            "swift_code": codes,
+            "address": self._string_column("address"),
+            "bank_name": self._string_column("bank_name"),
+            "country_iso2": np.where(country_iso2 == b"", None,
+                                     country_iso2.astype("U2").astype(object)),
+            "country_name": self._string_column("country_name"),
+            "is_headquarter": np.where(is_headquarter < 0, None,
+                                       is_headquarter.astype(bool).astype(object)),
+            "associated_headquarter": np.where(associated < 0, None, codes[associated]),
+            "row_hash": np.where(row_hash == MISSING_HASH, None,
+                                 row_hash.astype(object)),
+        }, columns=FILE_FIELDS)
+
+    def records(self):
+        return self.frame()[FILE_FIELDS[:-1]].itertuples(index=False, name=None)
+
+
+def dump_snapshot_file(path):
+    version, updated_at = read_dataset_version()
+    columns = [getattr(Bank, name) for name in FILE_FIELDS]
+    rows = db.session.execute(select(*columns).order_by(Bank.swift_code)).all()
+    frame = pd.DataFrame(rows, columns=FILE_FIELDS)
+    count = write_snapshot_file(path, frame, version, updated_at)
+    logger.info(f"Wrote {count} SWIFT codes at dataset version {version} to {path}.")
+    return count
@@ -0,0 +1,159 @@
+from collections import defaultdict
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models.bank import Bank
+from app.models.stats import CountryStats, HeadquarterStats
+from app.queries import any_of
+
+
+def refresh_stats(source=None):
+    # `source` is a table shaped like banks, such as the shadow table of a
+    # reload that is about to be swapped in.
+    bank = (source if source is not None else Bank.__table__).alias("bank")
+    branch = bank.alias("branch")
+    db.session.execute(delete(CountryStats))
+    db.session.execute(insert(CountryStats).from_select(
+        ["country_iso2", "country_name", "codes", "headquarters", "branches"],
+        select(
+            bank.c.country_iso2,
+            func.max(bank.c.country_name),
+            func.count(),
+            func.count().filter(bank.c.is_headquarter.is_(True)),
+            func.count().filter(bank.c.is_headquarter.is_(False)),
+        ).group_by(bank.c.country_iso2)
+    ))
+
+    db.session.execute(delete(HeadquarterStats))
+    db.session.execute(insert(HeadquarterStats).from_select(
+        ["swift_code", "country_iso2", "branches"],
+        select(bank.c.swift_code, bank.c.country_iso2, func.count(branch.c.swift_code))
+        .outerjoin(branch, branch.c.associated_headquarter == bank.c.swift_code)
+        .where(bank.c.is_headquarter.is_(True))
+        .group_by(bank.c.swift_code, bank.c.country_iso2)
+    ))
+
+
+def stats_missing():
+    query = select(CountryStats.country_iso2).limit(1)
+    return db.session.execute(query).first() is None
+
+
+def stats_statements(banks, sign):
+    countries = {}
+    linked = defaultdict(int)
+    headquarters = []
+    for bank in banks:
+        entry = countries.setdefault(bank.country_iso2, {
+            "country_iso2": bank.country_iso2, "country_name": bank.country_name,
+            "codes": 0, "headquarters": 0, "branches": 0,
+        })
+        entry["codes"] += sign
+        if bank.is_headquarter:
+            entry["headquarters"] += sign
+            headquarters.append(bank.swift_code)
+        else:
+            entry["branches"] += sign
+        if bank.associated_headquarter:
+            linked[bank.associated_headquarter] += sign
+
+    if not countries:
+        return []
+
+    stmt = insert(CountryStats).values(list(countries.values()))
+    statements = [stmt.on_conflict_do_update(
+        index_elements=[CountryStats.country_iso2],
+        set_={
+            "country_name": func.coalesce(stmt.excluded.country_name,
+                                          CountryStats.country_name),
+            "codes": CountryStats.codes + stmt.excluded.codes,
+            "headquarters": CountryStats.headquarters + stmt.excluded.headquarters,
+            "branches": CountryStats.branches + stmt.excluded.branches,
+        },
+    )]
+
+    if headquarters and sign > 0:
+        branch = aliased(Bank)
+        branch_count = (select(func.count())
+                        .where(branch.associated_headquarter == Bank.swift_code)
+                        .scalar_subquery())
+        statements.append(insert(HeadquarterStats).from_select(
+            ["swift_code", "country_iso2", "branches"],
+            select(Bank.swift_code, Bank.country_iso2, branch_count)
+            .where(Bank.swift_code == any_of(headquarters, "headquarters"))
+        ).on_conflict_do_nothing())
+    elif headquarters:
+        statements.append(delete(HeadquarterStats).where(
+            HeadquarterStats.swift_code == any_of(headquarters, "headquarters")
+        ))
+
+    for headquarter, delta in linked.items():
+        statements.append(update(HeadquarterStats)
+                          .where(HeadquarterStats.swift_code == headquarter)
+                          .values(branches=HeadquarterStats.branches + delta))
+    return statements
+
+
+def apply_stats(banks, sign):
+    for stmt in stats_statements(banks, sign):
+        db.session.execute(stmt)
+
+
+def country_stats_query(country_iso2=None):
+    stmt = (select(*CountryStats.__table__.c).where(CountryStats.codes > 0)
+            .order_by(CountryStats.country_iso2))
+    if country_iso2 is not None:
+        stmt = stmt.where(CountryStats.country_iso2 == country_iso2)
+    return stmt
+
+
+def headquarter_stats_query(country_iso2, limit):
+    return (select(HeadquarterStats.swift_code, HeadquarterStats.branches)
+            .where(HeadquarterStats.country_iso2 == country_iso2)
+            .order_by(HeadquarterStats.branches.desc(), HeadquarterStats.swift_code)
+            .limit(limit))
+
+
+def ratio(branches, headquarters):
+    return round(branches / headquarters, 3) if headquarters else None
+
+
+def country_summary(stats):
+    return {
+        "countryISO2": stats.country_iso2,
+        "countryName": stats.country_name,
+        "codes": stats.codes,
+        "headquarters": stats.headquarters,
+        "branches": stats.branches,
+        "branchesPerHeadquarter": ratio(stats.branches, stats.headquarters),
+    }
+
+
+def stats_payload(countries, headquarters=None):
+    codes = sum(stats.codes for stats in countries)
+    total_headquarters = sum(stats.headquarters for stats in countries)
+    branches = sum(stats.branches for stats in countries)
+    payload = {
+        "codes": codes,
+        "headquarters": total_headquarters,
+        "branches": branches,
+        "branchesPerHeadquarter": ratio(branches, total_headquarters),
+        "countries": [country_summary(stats) for stats in countries],
+    }
+    if headquarters is not None:
+        payload["headquarterBranches"] = [
+            {"swiftCode": row.swift_code, "branches": row.branches}
+            for row in headquarters
+        ]
+    return payload
+
+
+def fetch_stats(country_iso2=None, limit=100):
+    countries = db.session.execute(country_stats_query(country_iso2)).all()
+
+    headquarters = None
+    if country_iso2 is not None:
+        query = headquarter_stats_query(country_iso2, limit)
+        headquarters = db.session.execute(query).all()
+    return stats_payload(countries, headquarters)
@@ -0,0 +1,156 @@
+import re
+import logging
+from sqlalchemy import and_, column, exists, func, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
+from app.extensions import db
+from app.models.bank import Bank
+from app.versioning import read_dataset_version
+
+
+logger = logging.getLogger(__name__)
+
+LIVE_TABLE = Bank.__tablename__
+SHADOW_TABLE = f"{LIVE_TABLE}_shadow"
+RETIRED_TABLE = f"{LIVE_TABLE}_retired"
+SHADOW_SUFFIX = "_shadow"
+
+# Readers of the live table are only blocked for the rename itself; the
+# rename waits at most this long for them before backing off and retrying.
+SWAP_LOCK_TIMEOUT_MS = 2000
+SWAP_ATTEMPTS = 5
+LOCK_NOT_AVAILABLE = "55P03"
+
+INDEX_DEFINITION = re.compile(r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ ")
+
+
+class ShadowTableError(ValueError):
+    pass
+
+
+def shadow_table():
+    return table(SHADOW_TABLE, *(column(c.name) for c in Bank.__table__.columns))
+
+
+def execute_ddl(statement):
+    # Index definitions come back from the catalog with `::` casts and must
+    # reach the server as they are.
+    db.session.connection().exec_driver_sql(statement)
+
+
+def index_definitions():
+    # The live table's indexes, including those created outside the model
+    # such as the trigram index, plus model indexes it does not have yet.
+    rows = db.session.execute(text(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary "
+        "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = CAST(:name AS regclass)"
+    ), {"name": LIVE_TABLE}).all()
+    definitions = {name: (definition, primary) for name, definition, primary in rows}
+    for index in Bank.__table__.indexes:
+        if index.name not in definitions:
+            definition = str(CreateIndex(index).compile(dialect=db.engine.dialect))
+            definitions[index.name] = (definition, False)
+    return definitions
+
+
+def create_shadow_table():
+    execute_ddl(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+    execute_ddl(f"CREATE TABLE {SHADOW_TABLE} (LIKE {LIVE_TABLE} INCLUDING DEFAULTS)")
+    return shadow_table()
+
+
+def build_shadow_indexes(definitions):
+    # Built once over the loaded rows, which is much cheaper than keeping
+    # them up to date row by row during the load.
+    for name, (definition, primary) in definitions.items():
+        shadow_name = f"{name}{SHADOW_SUFFIX}"
+        execute_ddl(INDEX_DEFINITION.sub(rf"\1 {shadow_name} ON {SHADOW_TABLE} ",
+                                         definition))
+        if primary:
+            execute_ddl(f"ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT {shadow_name} "
+                        f"PRIMARY KEY USING INDEX {shadow_name}")
+    execute_ddl(f"ANALYZE {SHADOW_TABLE}")
+
+
+def validate_shadow(expected_rows):
+    if not expected_rows:
+        raise ShadowTableError("No valid rows to load, refusing to empty the dataset")
+    shadow = shadow_table()
+    rows = db.session.scalar(select(func.count()).select_from(shadow))
+    if rows != expected_rows:
+        raise ShadowTableError(f"Shadow table holds {rows} rows, expected "
+                               f"{expected_rows}")
+
+    headquarter = shadow.alias("headquarter")
+    orphaned = db.session.scalar(select(func.count()).select_from(shadow).where(
+        shadow.c.associated_headquarter.isnot(None),
+        ~exists().where(headquarter.c.swift_code == shadow.c.associated_headquarter)
+    ))
+    unlinked = db.session.scalar(select(func.count()).select_from(shadow).where(
+        shadow.c.is_headquarter.is_(False),
+        shadow.c.associated_headquarter.is_(None),
+        exists().where(headquarter.c.swift_code
+                       == func.concat(func.left(shadow.c.swift_code, 8), "XXX"))
+    ))
+    if orphaned or unlinked:
+        raise ShadowTableError(f"Shadow table has {orphaned} branches pointing to a "
+                               f"missing headquarter and {unlinked} branches not "
+                               f"linked to theirs")
+    return rows
+
+
+def compare_with_live(fields):
+    # Returns (inserted, updated, deleted) for swapping the shadow table in.
+    shadow = shadow_table()
+    live = Bank.__table__
+    both = and_(live.c.swift_code.isnot(None), shadow.c.swift_code.isnot(None))
+    changed = or_(*(live.c[name].is_distinct_from(shadow.c[name]) for name in fields))
+    return db.session.execute(select(
+        func.count().filter(live.c.swift_code.is_(None)),
+        func.count().filter(both, changed),
+        func.count().filter(shadow.c.swift_code.is_(None)),
+    ).select_from(shadow.join(live, live.c.swift_code == shadow.c.swift_code,
+                              full=True))).one()
+
+
+def lock_live_table(mode):
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(text(f"SET LOCAL lock_timeout = "
+                                        f"{SWAP_LOCK_TIMEOUT_MS}"))
+                db.session.execute(text(f"LOCK TABLE {LIVE_TABLE} IN {mode} MODE"))
+                db.session.execute(text("SET LOCAL lock_timeout = DEFAULT"))
+            return
+        except OperationalError as e:
+            if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE:
+                raise
+            logger.warning(f"Could not lock {LIVE_TABLE} in {mode} mode within "
+                           f"{SWAP_LOCK_TIMEOUT_MS} ms, attempt {attempt} of "
+                           f"{SWAP_ATTEMPTS}.")
+    raise ShadowTableError(f"Could not lock {LIVE_TABLE} for the swap, readers or "
+                           f"writers kept it busy")
+
+
+def hold_writes(expected_version):
+    # From here on API writes wait for the swap; a write that got in while
+    # the shadow table was loading would be lost, so the reload gives up.
+    lock_live_table("SHARE")
+    version, _ = read_dataset_version()
+    if version != expected_version:
+        raise ShadowTableError(f"Dataset changed from version {expected_version} to "
+                               f"{version} during the reload, run it again")
+
+
+def swap_shadow_table(definitions):
+    lock_live_table("ACCESS EXCLUSIVE")
+    execute_ddl(f"ALTER TABLE {LIVE_TABLE} RENAME TO {RETIRED_TABLE}")
+    execute_ddl(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {LIVE_TABLE}")
+    execute_ddl(f"DROP TABLE {RETIRED_TABLE}")
+    for name in definitions:
+        execute_ddl(f"ALTER INDEX {name}{SHADOW_SUFFIX} RENAME TO {name}")
+
+
+def drop_shadow_table():
+    execute_ddl(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
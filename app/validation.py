@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+# ISO 9362 layout: bank code (4 letters), country code (2 letters),
+# location code (2 letters or digits) and an optional branch code
+# (3 letters or digits).
+CODE_WIDTH = 12
+
+REASONS = [
+    "SWIFT code is missing",
+    "SWIFT code must be 8 or 11 characters",
+    "SWIFT code bank code must be 4 letters",
+    "SWIFT code country code must be 2 letters",
+    "SWIFT code location code must be 2 letters or digits",
+    "SWIFT code branch code must be 3 letters or digits",
+    "SWIFT code country does not match countryISO2",
+    "countryISO2 must be 2 letters",
+]
+
+
+def char_matrix(values, width):
+    # Values longer than `width` are blanked rather than truncated, which
+    # would let "PLX" pass as "PL"; `fits` tells them apart from short ones.
+    # Lengths are taken before numpy's fixed-width strings drop trailing
+    # NULs, which would let "DEUTDEFF\x00" pass as "DEUTDEFF".
+    values = np.asarray(values, dtype=object)
+    present = pd.notna(values)
+    strings = pd.Series(np.where(present, values, ""), dtype=object).astype(str)
+    lengths = strings.str.len().to_numpy()
+    text = strings.to_numpy(dtype=str)
+    fits = (lengths <= width) & (np.char.str_len(text) == lengths)
+    text = np.where(fits, text, "").astype(f"U{width}")
+    return present, fits, text.view(np.uint32).reshape(len(text), width)
+
+
+def swift_code_checks(codes, countries=None):
+    # Returns one reason number per code: 0 for a valid code, otherwise the
+    # 1-based index of the first failed check in REASONS.
+    present, fits, chars = char_matrix(codes, CODE_WIDTH)
+    upper = (chars >= ord("A")) & (chars <= ord("Z"))
+    alnum = upper | ((chars >= ord("0")) & (chars <= ord("9")))
+    short = (chars[:, 7] != 0) & (chars[:, 8] == 0)
+    full = (chars[:, 10] != 0) & (chars[:, 11] == 0)
+
+    failures = [
+        ~present,
+        ~fits | ~(short | full),
+        ~upper[:, 0:4].all(axis=1),
+        ~upper[:, 4:6].all(axis=1),
+        ~alnum[:, 6:8].all(axis=1),
+        full & ~alnum[:, 8:11].all(axis=1),
+    ]
+    reasons = list(range(1, len(failures) + 1))
+    if countries is not None:
+        _, country_fits, country_chars = char_matrix(countries, 2)
+        failures.append(~country_fits | (country_chars[:, 1] == 0))
+        failures.append((chars[:, 4:6] != country_chars).any(axis=1))
+        reasons += [REASONS.index("countryISO2 must be 2 letters") + 1,
+                    REASONS.index("SWIFT code country does not match countryISO2") + 1]
+
+    return np.select(failures, np.array(reasons, dtype=np.int8), default=0)
+
+
+def reason_text(reason):
+    return REASONS[reason - 1] if reason else None
+
+
+def swift_code_error(code, country_iso2=None):
+    if not isinstance(code, str):
+        return REASONS[0]
+    countries = None if country_iso2 is None else [country_iso2]
+    return reason_text(swift_code_checks([code], countries)[0])
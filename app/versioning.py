@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from flask import request, Response
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from app.models.dataset_version import DatasetVersion
+from app.extensions import db
+
+
+logger = logging.getLogger(__name__)
+
+DATASET_ROW_ID = 1
+CONTENT_ENCODINGS = ("br", "gzip")
+
+
+def dataset_version_query():
+    return (select(DatasetVersion.version, DatasetVersion.updated_at)
+            .where(DatasetVersion.id == DATASET_ROW_ID))
+
+
+def version_state(row):
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def read_dataset_version():
+    return version_state(db.session.execute(dataset_version_query()).first())
+
+
+def bump_version_query():
+    stmt = insert(DatasetVersion).values(id=DATASET_ROW_ID, version=1,
+                                         updated_at=func.now())
+    return stmt.on_conflict_do_update(
+        index_elements=[DatasetVersion.id],
+        set_={"version": DatasetVersion.version + 1, "updated_at": func.now()},
+    ).returning(DatasetVersion.version, DatasetVersion.updated_at)
+
+
+def bump_dataset_version():
+    return db.session.execute(bump_version_query()).one()
+
+
+class VersionTracker:
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self.version = 0
+        self.updated_at = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("SWIFT_VERSION_TTL", self.ttl)
+        self.version = 0
+        self.updated_at = None
+        self._checked_at = None
+
+    def current(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.ttl:
+            return self.version, self.updated_at
+
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.ttl:
+                try:
+                    self.version, self.updated_at = read_dataset_version()
+                except Exception as e:
+                    logger.error(f"Error while reading dataset version: {e}")
+                    db.session.rollback()
+                self._checked_at = now
+        return self.version, self.updated_at
+
+    def update(self, bumped):
+        with self._lock:
+            if bumped.version >= self.version:
+                self.version, self.updated_at = bumped.version, bumped.updated_at
+                self._checked_at = time.monotonic()
+
+
+version_tracker = VersionTracker()
+
+
+def make_etag(version):
+    return f"v{version}"
+
+
+def encoded_etag(etag, encoding):
+    # Compressed bodies are different representations and need their own tag.
+    return f"{etag}-{encoding}"
+
+
+def not_modified(etag, updated_at, max_age, req=None):
+    if req is None:
+        req = request
+    matched = None
+    if req.if_none_match:
+        tags = [etag] + [encoded_etag(etag, encoding) for encoding in CONTENT_ENCODINGS]
+        matched = next((tag for tag in tags if req.if_none_match.contains(tag)), None)
+    elif req.if_modified_since and updated_at is not None:
+        if updated_at.replace(microsecond=0) <= req.if_modified_since:
+            matched = etag
+
+    if matched is None:
+        return None
+    response = set_cache_headers(Response(status=304), matched, updated_at, max_age)
+    if matched != etag:
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def conditional_response(response, etag, updated_at, max_age, req=None):
+    # Only called once the resource is known to exist: the tag covers the
+    # whole dataset, so checking earlier would turn a 404 into a 304.
+    unchanged = not_modified(etag, updated_at, max_age, req)
+    if unchanged is not None:
+        response.close()
+        return unchanged
+    return set_cache_headers(response, etag, updated_at, max_age)
+
+
+def set_cache_headers(response, etag, updated_at, max_age):
+    response.set_etag(etag)
+    if updated_at is not None:
+        response.last_modified = updated_at
+    response.headers["Cache-Control"] = f"public, max-age={max_age}, must-revalidate"
+    return response
@@ -0,0 +1,117 @@
+import argparse
+import csv
+import json
+import os
+import random
+import string
+
+
+CSV_HEADER = ["COUNTRY ISO2 CODE", "SWIFT CODE", "CODE TYPE", "NAME", "ADDRESS",
+              "TOWN NAME", "COUNTRY NAME", "TIME ZONE"]
+
+COUNTRIES = [
+    ("PL", "POLAND", "WARSZAWA", "Europe/Warsaw", 30),
+    ("DE", "GERMANY", "FRANKFURT", "Europe/Berlin", 20),
+    ("BG", "BULGARIA", "SOFIA", "Europe/Sofia", 8),
+    ("MT", "MALTA", "VALLETTA", "Europe/Malta", 8),
+    ("CL", "CHILE", "SANTIAGO", "America/Santiago", 8),
+    ("LV", "LATVIA", "RIGA", "Europe/Riga", 5),
+    ("MC", "MONACO", "MONACO", "Europe/Monaco", 5),
+    ("UY", "URUGUAY", "MONTEVIDEO", "America/Montevideo", 4),
+    ("AL", "ALBANIA", "TIRANA", "Europe/Tirane", 3),
+    ("IT", "ITALY", "MILANO", "Europe/Rome", 9),
+]
+
+# In swift_codes.csv about two thirds of the codes are headquarters; most
+# have no branches and a few large banks have dozens.
+HEADQUARTER_SHARE = 0.65
+BRANCHING_SHARE = 0.1
+
+NAME_WORDS = ["BANK", "BANCA", "CREDIT", "SAVINGS", "TRUST", "INVEST", "CAPITAL",
+              "COOPERATIVE", "NATIONAL", "COMMERCIAL", "FIRST", "UNITED", "POLSKA"]
+
+
+def random_word(rng, alphabet, length):
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def random_address(rng, street, town):
+    return f"{rng.randint(1, 250)} {street} STREET, {town}, {rng.randint(10000, 99999)}"
+
+
+def branch_count(rng, mean):
+    # Most headquarters get no branches; one in ten gets an exponentially
+    # spread count with the same overall mean.
+    if mean <= 0 or rng.random() >= BRANCHING_SHARE:
+        return 0
+    spread = max(mean / BRANCHING_SHARE - 1, 0)
+    return 1 + (round(rng.expovariate(1 / spread)) if spread else 0)
+
+
+def generate_rows(rows, seed=0, headquarter_share=HEADQUARTER_SHARE):
+    rng = random.Random(seed)
+    weights = [country[4] for country in COUNTRIES]
+    mean_branches = (1 - headquarter_share) / headquarter_share
+    alnum = string.ascii_uppercase + string.digits
+    seen = set()
+    produced = 0
+
+    while produced < rows:
+        country = rng.choices(COUNTRIES, weights)[0]
+        country_iso2, country_name, town, time_zone, _ = country
+        prefix = random_word(rng, string.ascii_uppercase, 4) + country_iso2 + \
+            random_word(rng, alnum, 2)
+        if prefix in seen:
+            continue
+        seen.add(prefix)
+
+        name = f"{rng.choice(NAME_WORDS)} {prefix[:4]} {rng.choice(NAME_WORDS)}"
+        yield [country_iso2, prefix + "XXX", "BIC11", name,
+               random_address(rng, prefix[:4], town), town, country_name, time_zone]
+        produced += 1
+
+        branches = set()
+        for _ in range(min(branch_count(rng, mean_branches), rows - produced)):
+            branch = random_word(rng, alnum, 3)
+            if branch == "XXX" or branch in branches:
+                continue
+            branches.add(branch)
+            yield [country_iso2, prefix + branch, "BIC11", name,
+                   random_address(rng, "BRANCH", town), town, country_name, time_zone]
+            produced += 1
+
+
+def write_csv(path, rows, seed=0, headquarter_share=HEADQUARTER_SHARE):
+    headquarters = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for row in generate_rows(rows, seed, headquarter_share):
+            headquarters += row[1].endswith("XXX")
+            writer.writerow(row)
+    return {"path": str(path), "rows": rows, "headquarters": headquarters, "seed": seed}
+
+
+def dataset_path(directory, rows, seed=0):
+    path = os.path.join(directory, f"swift_codes_{rows}_{seed}.csv")
+    if not os.path.exists(path):
+        write_csv(path, rows, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic SWIFT directory CSV.")
+    parser.add_argument("--rows", type=int, default=100000, help="Codes to generate.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--headquarter-share", type=float, default=HEADQUARTER_SHARE,
+                        help="Approximate share of codes that are headquarters.")
+    parser.add_argument("--out", default="swift_codes_synthetic.csv",
+                        help="Output CSV file.")
+    args = parser.parse_args()
+
+    print(json.dumps(write_csv(args.out, args.rows, args.seed, args.headquarter_share)))
+
+
+if __name__ == "__main__":
+    main()
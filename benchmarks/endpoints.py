@@ -0,0 +1,177 @@
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+from app import create_app
+from app.data_parser import parse_swift_codes
+from app.extensions import db
+from benchmarks.dataset import dataset_path
+
+
+BULK_OFFSET = 500000
+
+
+def new_bank(swift_code):
+    return {
+        "swiftCode": swift_code,
+        "address": "1 BENCHMARK STREET, 00-001",
+        "bankName": "BENCHMARK BANK",
+        "countryISO2": "ZZ",
+        "countryName": "BENCHMARK",
+        "isHeadquarter": swift_code.endswith("XXX"),
+    }
+
+
+def benchmark_code(number):
+    # ZZ is not a country in the generated data, so these never collide.
+    letters = "".join(chr(ord("A") + int(digit)) for digit in f"{number:06d}")
+    return f"{letters[:4]}ZZ{letters[4:]}XXX"
+
+
+def summarize(latencies, elapsed, errors):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requestsPerSec": round(len(latencies) / elapsed, 1),
+        "p50Ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99Ms": round(float(np.percentile(latencies, 99)), 3),
+        "maxMs": round(float(latencies.max()), 3),
+    }
+
+
+def measure(app, make_request, duration, concurrency=1, expected=(200,)):
+    latencies = []
+    errors = []
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            with lock:
+                number = next(counter)
+            sent = time.perf_counter()
+            response = make_request(client, number)
+            response.get_data()
+            took = time.perf_counter() - sent
+            with lock:
+                latencies.append(took)
+                if response.status_code not in expected:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+def scenarios(codes, headquarters, country, batch_size=100):
+    def pick(items):
+        return random.choice(items)
+
+    def batch(number):
+        start = (number * batch_size) % max(len(codes) - batch_size, 1)
+        return codes[start:start + batch_size]
+
+    def bulk_codes(number):
+        start = BULK_OFFSET + number * batch_size
+        return [benchmark_code(start + offset) for offset in range(batch_size)]
+
+    return {
+        "GET details": lambda c, n: c.get(f"/v1/swift-codes/{pick(codes)}"),
+        "GET details headquarter": lambda c, n: c.get(
+            f"/v1/swift-codes/{pick(headquarters)}"),
+        "GET country": lambda c, n: c.get(f"/v1/swift-codes/country/{country}"),
+        "GET country page": lambda c, n: c.get(
+            f"/v1/swift-codes/country/{country}?limit=100&after={pick(codes)}"),
+        "GET country stream": lambda c, n: c.get(
+            f"/v1/swift-codes/country/{country}?stream=1"),
+        "GET stats": lambda c, n: c.get("/v1/swift-codes/stats"),
+        "GET stats country": lambda c, n: c.get(
+            f"/v1/swift-codes/stats?country={country}"),
+        "GET search prefix": lambda c, n: c.get(
+            f"/v1/swift-codes/search?prefix={pick(codes)[:6]}"),
+        "GET search name": lambda c, n: c.get("/v1/swift-codes/search?q=CREDIT"),
+        "POST batch-lookup": lambda c, n: c.post(
+            "/v1/swift-codes/batch-lookup", json={"swiftCodes": batch(n)}),
+        "POST validate": lambda c, n: c.post(
+            "/v1/swift-codes/validate", json={"swiftCodes": batch(n)}),
+        "POST add": lambda c, n: c.post(
+            "/v1/swift-codes", json=new_bank(benchmark_code(n))),
+        "DELETE": lambda c, n: c.delete(f"/v1/swift-codes/{benchmark_code(n)}"),
+        "POST bulk": lambda c, n: c.post(
+            "/v1/swift-codes/bulk", json=[new_bank(code) for code in bulk_codes(n)]),
+        "DELETE bulk": lambda c, n: c.delete(
+            "/v1/swift-codes/bulk", json={"swiftCodes": bulk_codes(n)}),
+    }
+
+
+EXPECTED = {
+    "POST add": (201,),
+    "DELETE": (200, 404),
+}
+
+
+def run(sizes, directory, duration=2.0, concurrency=1, only=None):
+    results = {}
+    for rows in sizes:
+        path = dataset_path(directory, rows)
+        app = create_app("testing")
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.commit()
+            parse_swift_codes(path)
+
+            codes = pd.read_csv(path, usecols=["SWIFT CODE"])["SWIFT CODE"].tolist()
+            headquarters = [code for code in codes if code.endswith("XXX")]
+            countries = pd.read_csv(path, usecols=["COUNTRY ISO2 CODE"])
+            country = countries["COUNTRY ISO2 CODE"].mode()[0]
+
+            results[str(rows)] = {}
+            for name, make_request in scenarios(codes, headquarters, country).items():
+                if only and name not in only:
+                    continue
+                # Each delete scenario removes the codes its add scenario
+                # created, so later reads see the generated table again.
+                expected = EXPECTED.get(name, (200,))
+                results[str(rows)][name] = measure(app, make_request, duration,
+                                                   concurrency, expected)
+
+            db.session.remove()
+            db.drop_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput and latency per API route.")
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="Comma-separated synthetic dataset sizes.")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="Seconds spent on each route.")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Client threads per route.")
+    parser.add_argument("--routes", default=None,
+                        help="Comma-separated scenario names to run (default all).")
+    parser.add_argument("--data-dir", default=tempfile.gettempdir(),
+                        help="Where generated CSV files are cached.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = args.routes.split(",") if args.routes else None
+    results = run(sizes, args.data_dir, args.duration, args.concurrency, only)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
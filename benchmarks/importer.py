@@ -0,0 +1,83 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app import create_app
+from app.data_parser import parse_swift_codes
+from app.extensions import db
+from app.importer import import_files, reload_files
+from benchmarks.dataset import dataset_path
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux; for RUSAGE_CHILDREN it is the
+    # largest child.
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def import_run(path, mode, workers, batch_size):
+    # Runs in a fresh process so peak RSS belongs to this import alone.
+    app = create_app("testing")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.commit()
+        rss_before = peak_rss_mb()
+
+        started = time.perf_counter()
+        if mode == "parallel":
+            stats = import_files([path], workers, batch_size=batch_size)
+        elif mode == "swap":
+            stats = reload_files([path], workers, batch_size=batch_size)
+        else:
+            stats = parse_swift_codes(path, batch_size)
+        elapsed = time.perf_counter() - started
+
+        db.session.remove()
+        db.drop_all()
+
+    return {
+        "rows": stats.rows,
+        "seconds": round(elapsed, 3),
+        "rowsPerSec": round(stats.rows / elapsed, 1),
+        "rssBeforeMb": rss_before,
+        "peakRssMb": peak_rss_mb(),
+        "workerPeakRssMb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "error": stats.error,
+    }
+
+
+def run(sizes, directory, modes=("single",), workers=None, batch_size=5000):
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for rows in sizes:
+        path = dataset_path(directory, rows)
+        for mode in modes:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                future = pool.submit(import_run, path, mode, workers, batch_size)
+                results[f"{mode}/{rows}"] = future.result()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importer rows/sec and peak RSS.")
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="Comma-separated synthetic dataset sizes.")
+    parser.add_argument("--modes", default="single",
+                        help="Comma-separated importers: single, parallel, swap.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for the parallel importer.")
+    parser.add_argument("--data-dir", default=tempfile.gettempdir(),
+                        help="Where generated CSV files are cached.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = args.modes.split(",")
+    print(json.dumps(run(sizes, args.data_dir, modes, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
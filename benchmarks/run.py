@@ -0,0 +1,110 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import endpoints, importer
+
+
+# Metric name -> True when a larger value is better.
+METRICS = {
+    "rowsPerSec": True,
+    "peakRssMb": False,
+    "requestsPerSec": True,
+    "p50Ms": False,
+    "p99Ms": False,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}/")
+        else:
+            yield f"{prefix}{key}", key, value
+
+
+def compare(results, baseline, tolerance):
+    # A metric regresses when it is worse than the baseline by more than
+    # `tolerance` (0.2 = 20%). Metrics missing from either side are skipped.
+    current = {path: value for path, _, value in flatten(results)}
+    regressions = []
+    for path, metric, before in flatten(baseline):
+        after = current.get(path)
+        if metric not in METRICS or not isinstance(after, (int, float)) or not before:
+            continue
+        change = (after - before) / before
+        worse = -change if METRICS[metric] else change
+        if worse > tolerance:
+            regressions.append({"metric": path, "baseline": before, "current": after,
+                                "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importer and endpoint benchmarks, compared to a baseline.")
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="Comma-separated synthetic dataset sizes, "
+                             "e.g. 10000,100000,1000000.")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="Seconds spent on each route.")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Client threads per route.")
+    parser.add_argument("--import-modes", default="single",
+                        help="Comma-separated importers: single, parallel, swap.")
+    parser.add_argument("--data-dir", default=tempfile.gettempdir(),
+                        help="Where generated CSV files are cached.")
+    parser.add_argument("--out", help="Write the results JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression before failing.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "sizes": sizes,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+        },
+        "importer": importer.run(sizes, args.data_dir, args.import_modes.split(",")),
+        "endpoints": endpoints.run(sizes, args.data_dir, args.duration,
+                                   args.concurrency),
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["regressions"] = compare(
+            {key: results[key] for key in ("importer", "endpoints")},
+            {key: baseline.get(key, {}) for key in ("importer", "endpoints")},
+            args.tolerance,
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import random
+import string
+import time
+from app import serializers
+from app.serializers import bank_details, country_listing, country_listing_bytes
+from app.snapshot import BankRecord
+
+
+def random_record(country_iso2="PL", suffix=None):
+    bank = "".join(random.choice(string.ascii_uppercase) for _ in range(4))
+    location = "".join(random.choice(string.ascii_uppercase) for _ in range(2))
+    suffix = suffix or "".join(random.choice(string.ascii_uppercase) for _ in range(3))
+    return BankRecord(
+        f"{bank}{country_iso2}{location}{suffix}",
+        f"{random.randint(1, 200)} {bank} STREET, WARSZAWA, "
+        f"00-{random.randint(100, 999)}",
+        f"{bank} BANK SPOLKA AKCYJNA",
+        country_iso2,
+        "POLAND",
+        suffix == "XXX",
+    )
+
+
+def measure(render, duration):
+    calls = 0
+    size = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        size += len(render())
+        calls += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "responsesPerSec": round(calls / elapsed, 1),
+        "bytesPerSec": round(size / elapsed),
+        "responseBytes": size // calls,
+    }
+
+
+def legacy_details(bank, branches):
+    return json.dumps(bank_details(bank, branches), indent=4, sort_keys=False).encode()
+
+
+def legacy_country(banks):
+    return json.dumps(country_listing("PL", banks), sort_keys=True).encode()
+
+
+def run(rows, branches, duration):
+    headquarter = random_record(suffix="XXX")
+    branch_records = [random_record() for _ in range(branches)]
+    country = [random_record() for _ in range(rows)]
+
+    cases = {
+        "details": {
+            "before": lambda: legacy_details(headquarter, branch_records),
+            "after": lambda: serializers.dumps(
+                bank_details(headquarter, branch_records)),
+        },
+        "country": {
+            "before": lambda: legacy_country(country),
+            "after": lambda: serializers.dumps(country_listing("PL", country)),
+            "afterFragments": lambda: country_listing_bytes("PL", country),
+        },
+    }
+
+    return {
+        "backend": "orjson" if serializers.orjson is not None else "json",
+        "rows": rows,
+        "branches": branches,
+        "results": {
+            endpoint: {name: measure(render, duration)
+                       for name, render in variants.items()}
+            for endpoint, variants in cases.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serializer throughput per endpoint.")
+    parser.add_argument("--rows", type=int, default=5000,
+                        help="SWIFT codes in the country listing.")
+    parser.add_argument("--branches", type=int, default=50,
+                        help="Branches of the headquarter in the details response.")
+    parser.add_argument("--duration", type=float, default=1.0,
+                        help="Seconds spent on each variant.")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.rows, args.branches, args.duration), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import os
+
+
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+preload_app = os.getenv("GUNICORN_PRELOAD", "0").lower() in ("1", "true")
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+
+    from app.extensions import db
+    from app.db_pool import dispose_after_fork
+    from app.replicas import replica_router
+
+    flask_app = server.app.wsgi()
+    with flask_app.app_context():
+        for engine in [*db.engines.values(), *replica_router.engines]:
+            dispose_after_fork(engine)
@@ -5,8 +5,48 @@ CREATE TABLE IF NOT EXISTS banks (
     country_iso2 CHAR(2),
     country_name TEXT,
     is_headquarter BOOLEAN,
-    associated_headquarter VARCHAR(11)
+    associated_headquarter VARCHAR(11),
+    row_hash BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS imported_files (
+    source VARCHAR(1024) PRIMARY KEY,
+    digest VARCHAR(64) NOT NULL,
+    row_count INTEGER,
+    imported_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS imported_codes (
+    swift_code VARCHAR(11) PRIMARY KEY,
+    source VARCHAR(1024) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_imported_codes_source ON imported_codes(source);
+
+CREATE TABLE IF NOT EXISTS dataset_version (
+    id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT now()
 );
 
 CREATE INDEX IF NOT EXISTS idx_swift_code ON banks(swift_code);
-CREATE INDEX IF NOT EXISTS idx_country_iso2 ON banks(country_iso2);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_country_iso2 ON banks(country_iso2);
+CREATE INDEX IF NOT EXISTS idx_associated_headquarter ON banks(associated_headquarter);
+CREATE INDEX IF NOT EXISTS idx_swift_code_pattern ON banks(swift_code varchar_pattern_ops);
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_bank_name_trgm ON banks USING gin (upper(bank_name) gin_trgm_ops);
+CREATE TABLE IF NOT EXISTS country_stats (
+    country_iso2 VARCHAR(2) PRIMARY KEY,
+    country_name VARCHAR(255),
+    codes INTEGER NOT NULL DEFAULT 0,
+    headquarters INTEGER NOT NULL DEFAULT 0,
+    branches INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS headquarter_stats (
+    swift_code VARCHAR(11) PRIMARY KEY,
+    country_iso2 VARCHAR(2),
+    branches INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_headquarter_stats_country ON headquarter_stats(country_iso2, branches);
@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+from app import create_app
+from app.coalescing import coalesced_requests
+from app.extensions import response_cache
+
+pytest.importorskip("asyncpg")
+
+from app.asgi import AsyncVersionTracker, create_asgi_app  # noqa: E402
+from tests import test_conftest as route_tests  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    yield from route_tests.asgi_client()
+
+
+def test_unknown_route_returns_json_404(client):
+    response = client.get("/v1/unknown")
+    assert response.status_code == 404
+    assert "message" in response.get_json()
+
+
+async def get_status(app, path, query_string=b"", remote_addr="127.0.0.1",
+                     headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": "GET", "query_string": query_string,
+               "path": path, "headers": list(headers),
+               "client": (remote_addr, 50000)},
+              receive, send)
+    return messages[0]["status"]
+
+
+def test_concurrent_lookups_share_one_event_loop(client):
+    route_tests.test_get_swift_code_details(client)
+
+    async def burst():
+        return await asyncio.gather(*(
+            get_status(client.app, "/v1/swift-codes/AVJCBGS1XXX", b"pretty=1")
+            for _ in range(50)))
+
+    assert set(client.loop.run_until_complete(burst())) == {200}
+
+
+def test_concurrent_cold_lookups_are_coalesced(client):
+    route_tests.test_get_swift_codes_by_country(client)
+    response_cache.clear()
+    paths = ["/v1/swift-codes/AVJCBGS1XXX", "/v1/swift-codes/country/BG"]
+
+    async def burst():
+        return await asyncio.gather(*(get_status(client.app, path)
+                                      for path in paths for _ in range(20)))
+
+    assert set(client.loop.run_until_complete(burst())) == {200}
+    coalesced = {labels["route"]: value
+                 for _, labels, value in coalesced_requests.samples()}
+    assert coalesced == {"details": 19, "country": 19}
+
+
+def test_rate_limit_uses_client_address(monkeypatch):
+    monkeypatch.setenv("SWIFT_RATE_LIMIT", "0.1")
+    monkeypatch.setenv("SWIFT_RATE_LIMIT_BURST", "2")
+    app = create_asgi_app("testing")
+    loop = asyncio.new_event_loop()
+
+    async def requests():
+        return [await get_status(app, "/v1/unknown", remote_addr=remote_addr)
+                for remote_addr in ["10.0.0.1"] * 3 + ["10.0.0.2"]]
+
+    try:
+        assert loop.run_until_complete(requests()) == [404, 404, 429, 404]
+    finally:
+        loop.run_until_complete(app.engine.dispose())
+        loop.close()
+        monkeypatch.delenv("SWIFT_RATE_LIMIT")
+        create_app("testing")
+
+
+@pytest.mark.parametrize("name, value", [
+    ("SWIFT_SNAPSHOT", "1"),
+    ("DB_REPLICA_URIS", "postgresql://replica/swift"),
+])
+def test_refuses_options_served_only_by_wsgi(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    try:
+        with pytest.raises(RuntimeError, match=f"{name} not supported in async mode"):
+            create_asgi_app("testing")
+    finally:
+        monkeypatch.delenv(name)
+        create_app("testing")
+
+
+def test_rate_limit_uses_forwarded_address_behind_trusted_proxy(monkeypatch):
+    monkeypatch.setenv("SWIFT_RATE_LIMIT", "0.1")
+    monkeypatch.setenv("SWIFT_RATE_LIMIT_BURST", "1")
+    monkeypatch.setenv("SWIFT_TRUSTED_PROXIES", "1")
+    app = create_asgi_app("testing")
+    loop = asyncio.new_event_loop()
+
+    async def requests():
+        return [await get_status(app, "/v1/unknown", remote_addr="10.0.0.1",
+                                 headers=[(b"x-forwarded-for", forwarded)])
+                for forwarded in [b"203.0.113.1", b"203.0.113.1", b"203.0.113.2"]]
+
+    try:
+        assert loop.run_until_complete(requests()) == [404, 429, 404]
+    finally:
+        loop.run_until_complete(app.engine.dispose())
+        loop.close()
+        monkeypatch.delenv("SWIFT_RATE_LIMIT")
+        monkeypatch.delenv("SWIFT_TRUSTED_PROXIES")
+        create_app("testing")
+
+
+def test_version_tracker_lock_follows_running_loop(client):
+    tracker = AsyncVersionTracker(client.app.engine, ttl=0)
+
+    async def contend():
+        await asyncio.gather(*(tracker.current() for _ in range(5)))
+        await client.app.engine.dispose()
+
+    # Each loop gets its own lock, as when the app is built before the
+    # server starts its loop.
+    for _ in range(2):
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(contend())
+        loop.close()
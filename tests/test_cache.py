@@ -0,0 +1,36 @@
+from unittest.mock import patch
+from app.cache import ResponseCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(maxsize=2, ttl=60)
+    cache.set("A", b"a")
+    cache.set("B", b"b")
+    cache.get("A")
+    cache.set("C", b"c")
+
+    assert cache.get("B") is None
+    assert cache.get("A") == b"a"
+    assert cache.get("C") == b"c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_expires_entries_after_ttl():
+    cache = ResponseCache(maxsize=10, ttl=5)
+    with patch("app.cache.time.monotonic", return_value=100.0):
+        cache.set("A", b"a")
+    with patch("app.cache.time.monotonic", return_value=106.0):
+        assert cache.get("A") is None
+
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_invalidate_and_disabled():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    cache.set("A", b"a")
+    cache.invalidate("A", "B")
+    assert cache.get("A") is None
+
+    disabled = ResponseCache(maxsize=0)
+    disabled.set("A", b"a")
+    assert disabled.get("A") is None
@@ -0,0 +1,164 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import inspect, text
+from app import create_app
+from app.cli import IMPORT_LOCK_KEY
+from app.data_parser import ImportStats
+from app.extensions import db
+from app.snapshot_file import SnapshotFile
+
+
+@pytest.fixture
+def app():
+    app = create_app("testing")
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "swift_codes.csv"
+    path.write_text(
+        "COUNTRY ISO2 CODE,SWIFT CODE,CODE TYPE,NAME,ADDRESS,TOWN NAME,COUNTRY NAME,"
+        "TIME ZONE\n"
+        "PL,BPKOPLPWXXX,BIC11,PKO BANK POLSKI,PULAWSKA 15,WARSZAWA,POLAND,"
+        "Europe/Warsaw\n"
+        "PL,BPKOPLPWWAW,BIC11,PKO BANK POLSKI,PULAWSKA 15,WARSZAWA,POLAND,"
+        "Europe/Warsaw\n"
+    )
+    return str(path)
+
+
+def test_import_swift_codes_command(app, csv_file):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["import-swift-codes", "--file", csv_file])
+
+    assert result.exit_code == 0
+    assert '"inserted": 2' in result.output
+
+    result = runner.invoke(args=["import-swift-codes", "--file", csv_file])
+
+    assert result.exit_code == 0
+    assert '"skipped": true' in result.output
+
+    stats = app.test_client().get("/v1/swift-codes/stats?country=PL").get_json()
+    assert (stats["codes"], stats["headquarters"], stats["branches"]) == (2, 1, 1)
+    assert stats["headquarterBranches"] == [{"swiftCode": "BPKOPLPWXXX", "branches": 1}]
+
+
+def test_import_swift_codes_dry_run(app, csv_file):
+    runner = app.test_cli_runner()
+    with app.app_context():
+        db.create_all()
+
+    result = runner.invoke(args=["import-swift-codes", "--file", csv_file, "--dry-run"])
+
+    assert result.exit_code == 0
+    assert '"inserted": 2' in result.output
+    with app.app_context():
+        assert db.session.execute(text("SELECT count(*) FROM banks")).scalar() == 0
+
+
+def test_import_swift_codes_refuses_concurrent_import(app, csv_file):
+    runner = app.test_cli_runner()
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"),
+                               {"key": IMPORT_LOCK_KEY})
+            with patch("app.cli.parse_swift_codes") as mock_parse:
+                result = runner.invoke(args=["import-swift-codes", "--file", csv_file])
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"),
+                               {"key": IMPORT_LOCK_KEY})
+
+    assert result.exit_code == 1
+    assert "already running" in result.output
+    mock_parse.assert_not_called()
+    with app.app_context():
+        assert not inspect(db.engine).has_table("banks")
+
+
+def test_import_swift_codes_reports_failure(app, csv_file):
+    runner = app.test_cli_runner()
+    stats = ImportStats()
+    stats.error = "DB down"
+
+    with patch("app.cli.parse_swift_codes", return_value=stats):
+        result = runner.invoke(args=["import-swift-codes", "--file", csv_file])
+
+    assert result.exit_code == 1
+    assert "Import failed: DB down" in result.output
+
+
+def test_import_swift_codes_several_files(app, csv_file, tmp_path):
+    delta = tmp_path / "delta.csv"
+    delta.write_text(
+        "COUNTRY ISO2 CODE,SWIFT CODE,CODE TYPE,NAME,ADDRESS,TOWN NAME,COUNTRY NAME,"
+        "TIME ZONE\n"
+        "PL,BPKOPLPWKRK,BIC11,PKO BANK POLSKI,RYNEK 1,KRAKOW,POLAND,Europe/Warsaw\n"
+    )
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["import-swift-codes", "--file", csv_file,
+                                 "--file", str(delta), "--workers", "2",
+                                 "--writers", "2"])
+
+    assert result.exit_code == 0
+    assert '"inserted": 3' in result.output
+    assert str(delta) in result.output
+
+    stats = app.test_client().get("/v1/swift-codes/stats?country=PL").get_json()
+    assert stats["headquarterBranches"] == [{"swiftCode": "BPKOPLPWXXX", "branches": 2}]
+
+
+def test_import_swift_codes_writes_snapshot(app, csv_file, tmp_path):
+    path = tmp_path / "swift.snap"
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["import-swift-codes", "--file", csv_file,
+                                 "--snapshot-out", str(path)])
+
+    assert result.exit_code == 0
+    with SnapshotFile(path) as snapshot_file:
+        assert len(snapshot_file) == 2
+        assert snapshot_file.get("BPKOPLPWWAW")[6] == "BPKOPLPWXXX"
+
+
+def test_import_swift_codes_writes_metrics_file(app, csv_file, tmp_path):
+    path = tmp_path / "import.prom"
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["import-swift-codes", "--file", csv_file,
+                                 "--metrics-file", str(path)])
+
+    assert result.exit_code == 0
+    assert '"phases": {"headquarters"' in result.output
+    metrics = path.read_text()
+    assert 'swift_imports_total{outcome="ok"} 1' in metrics
+    assert 'swift_import_rows_total{result="inserted"} 2' in metrics
+    for phase in ("read", "clean", "headquarters", "write", "finish"):
+        assert f'swift_import_last_phase_seconds{{phase="{phase}"}}' in metrics
+    assert "swift_http_request" not in metrics
+
+
+def test_import_swift_codes_swap(app, csv_file, tmp_path):
+    runner = app.test_cli_runner()
+    runner.invoke(args=["import-swift-codes", "--file", csv_file])
+    replacement = tmp_path / "replacement.csv"
+    replacement.write_text(
+        "COUNTRY ISO2 CODE,SWIFT CODE,CODE TYPE,NAME,ADDRESS,TOWN NAME,COUNTRY NAME,"
+        "TIME ZONE\n"
+        "PL,BPKOPLPWXXX,BIC11,PKO BANK POLSKI,PULAWSKA 15,WARSZAWA,POLAND,"
+        "Europe/Warsaw\n"
+    )
+
+    result = runner.invoke(args=["import-swift-codes", "--file", str(replacement),
+                                 "--swap"])
+
+    assert result.exit_code == 0
+    assert '"deleted": 1' in result.output
+    stats = app.test_client().get("/v1/swift-codes/stats?country=PL").get_json()
+    assert (stats["codes"], stats["headquarters"], stats["branches"]) == (1, 1, 0)
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+from app.coalescing import AsyncSingleFlight, SingleFlight, coalesced_requests
+
+
+def coalesced(route):
+    return sum(value for _, labels, value in coalesced_requests.samples()
+               if labels["route"] == route)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test-share")
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "body"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", load)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while coalesced("test-share") < 7:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["body"] * 8
+    assert len(calls) == 1
+    assert flight.do("k", lambda: "fresh") == "fresh"
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight("test-error")
+    release = threading.Event()
+
+    def load():
+        release.wait(5)
+        raise LookupError("not found")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", load)
+        except LookupError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while coalesced("test-error") < 2:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    assert not flight._flights
+
+
+def test_async_callers_share_one_call():
+    flight = AsyncSingleFlight("test-async")
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "body"
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("k", load) for _ in range(10)))
+
+    assert asyncio.run(burst()) == ["body"] * 10
+    assert len(calls) == 1
+    assert not flight._flights
+
+
+def test_async_error_reaches_every_caller():
+    flight = AsyncSingleFlight("test-async-error")
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise LookupError("not found")
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("k", load) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert all(isinstance(result, LookupError) for result in results)
+    with pytest.raises(LookupError):
+        asyncio.run(flight.do("k", load))
@@ -0,0 +1,67 @@
+import gzip
+from unittest.mock import patch
+from flask import Response
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+from app.compression import ResponseCompressor, negotiate_encoding
+from app.versioning import not_modified
+
+
+def make_request(headers=None):
+    return Request(EnvironBuilder(headers=headers or {}).get_environ())
+
+
+def json_body(size):
+    return b'{"data":"' + b"A" * size + b'"}'
+
+
+def test_negotiate_encoding_honours_quality_values():
+    with patch("app.compression.brotli", object()):
+        assert negotiate_encoding(make_request({"Accept-Encoding": "gzip, br"})) == "br"
+        assert negotiate_encoding(
+            make_request({"Accept-Encoding": "br;q=0.5, gzip"})) == "gzip"
+    with patch("app.compression.brotli", None):
+        assert negotiate_encoding(make_request({"Accept-Encoding": "br, *"})) == "gzip"
+    assert negotiate_encoding(make_request({"Accept-Encoding": "identity"})) is None
+    assert negotiate_encoding(make_request()) is None
+
+
+def test_compressor_respects_threshold_and_mimetype():
+    compressor = ResponseCompressor(min_size=100)
+    req = make_request({"Accept-Encoding": "gzip"})
+
+    small = compressor.compress_response(
+        Response(json_body(10), mimetype="application/json"), req)
+    assert "Content-Encoding" not in small.headers
+    assert "Vary" not in small.headers
+
+    text = compressor.compress_response(
+        Response(b"A" * 500, mimetype="text/plain"), req)
+    assert "Content-Encoding" not in text.headers
+
+    large = Response(json_body(500), mimetype="application/json")
+    large.set_etag("v3")
+    large = compressor.compress_response(large, req)
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert large.headers["Vary"] == "Accept-Encoding"
+    assert large.get_etag() == ("v3-gzip", False)
+    assert gzip.decompress(large.get_data()) == json_body(500)
+
+
+def test_uncompressed_large_response_still_varies():
+    compressor = ResponseCompressor(min_size=100)
+    response = compressor.compress_response(
+        Response(json_body(500), mimetype="application/json"), make_request())
+
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_not_modified_accepts_encoded_etags():
+    req = make_request({"If-None-Match": '"v3-gzip"'})
+    response = not_modified("v3", None, 0, req)
+
+    assert response.status_code == 304
+    assert response.get_etag() == ("v3-gzip", False)
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert not_modified("v4", None, 0, req) is None
@@ -1,16 +1,64 @@
+import asyncio
+import os
 import pytest
 import logging
-from app.extensions import db
+from app.extensions import db, response_cache
 from app import create_app
 from app.models.bank import Bank
 from flask import json
+from werkzeug.wrappers import Response
 from unittest.mock import patch
+from sqlalchemy import event
+import gzip
+from app.compression import compress
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 logger.debug("Logger initialized, this should print to console!")
-@pytest.fixture
-def client():
+class AsgiTestClient:
+    def __init__(self, app, loop):
+        self.app = app
+        self.application = app.flask_app
+        self.loop = loop
+
+    def open(self, path, method="GET", data=None, content_type=None, headers=None):
+        path, _, query = path.partition("?")
+        body = data.encode() if isinstance(data, str) else data or b""
+        raw_headers = [(name.lower().encode(), value.encode())
+                       for name, value in (headers or {}).items()]
+        if content_type:
+            raw_headers.append((b"content-type", content_type.encode()))
+
+        scope = {
+            "type": "http", "method": method, "path": path,
+            "query_string": query.encode(), "headers": raw_headers,
+            "http_version": "1.1", "scheme": "http", "server": ("localhost", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.loop.run_until_complete(self.app(scope, receive, send))
+        start = messages[0]
+        return Response(b"".join(m.get("body", b"") for m in messages[1:]),
+                        status=start["status"],
+                        headers=[(k.decode(), v.decode()) for k, v in start["headers"]])
+
+    def get(self, path, **kwargs):
+        return self.open(path, "GET", **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, "POST", **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, "DELETE", **kwargs)
+
+
+def wsgi_client():
     app = create_app("testing")
     sql_uri = app.config['SQLALCHEMY_DATABASE_URI']
 
@@ -24,6 +72,45 @@ def client():
             db.drop_all()
     logger.debug(f"SQLALCHEMY_DATABASE_URI after test: {sql_uri}")
 
+
+def asgi_client():
+    pytest.importorskip("asyncpg")
+    from app.asgi import create_asgi_app
+
+    app = create_asgi_app("testing")
+    loop = asyncio.new_event_loop()
+    with app.flask_app.app_context():
+        db.create_all()
+
+    yield AsgiTestClient(app, loop)
+
+    loop.run_until_complete(app.engine.dispose())
+    loop.close()
+    with app.flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+# Every route test runs against both the Flask app and the ASGI app; tests
+# that patch Flask internals pin themselves to "wsgi".
+def app_client(kind):
+    return asgi_client() if kind == "asgi" else wsgi_client()
+
+
+@pytest.fixture(params=["wsgi", "asgi"])
+def client(request):
+    yield from app_client(request.param)
+
+
+@pytest.fixture(params=["wsgi", "asgi"])
+def metrics_client(request):
+    with patch.dict(os.environ, {"SWIFT_METRICS": "1"}):
+        yield from app_client(request.param)
+
+
+wsgi_only = pytest.mark.parametrize("client", ["wsgi"], indirect=True)
+
+
 def test_get_swift_code_details(client):
     bank = Bank(
         swift_code="AVJCBGS1XXX",
@@ -98,7 +185,7 @@ def test_get_swift_codes_by_country_not_found(client):
 
 def test_add_swift_code_success(client):
     bank = {
-        "swiftCode": "EXAMPLEXXX",
+        "swiftCode": "EXAMPLPLXXX",
         "address": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         "bankName": "BANK POLSKA",
         "countryISO2": "PL",
@@ -112,12 +199,12 @@ def test_add_swift_code_success(client):
 
     assert response.status_code == 201
     data = json.loads(response.data)
-    assert "SWIFT code, with value EXAMPLEXXX added successfully" in data["message"]
+    assert "SWIFT code, with value EXAMPLPLXXX added successfully" in data["message"]
 
 
 def test_add_swift_code_missing_field(client):
     bank = {
-        "swiftCode": "EXAMPLEXXX",
+        "swiftCode": "EXAMPLPLXXX",
         "address": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         "bankName": "BANK POLSKA",
         "countryISO2": "PL",
@@ -134,9 +221,98 @@ def test_add_swift_code_missing_field(client):
     assert "Missing field: countryName" in data["message"]
 
 
+def test_add_swift_code_invalid_format(client):
+    bank = {
+        "swiftCode": "EXAMDEPLXXX",
+        "address": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
+        "bankName": "BANK POLSKA",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True,
+    }
+
+    response = client.post(
+        "/v1/swift-codes", data=json.dumps(bank), content_type="application/json"
+    )
+
+    assert response.status_code == 400
+    data = json.loads(response.data)
+    assert data["message"] == "SWIFT code country does not match countryISO2"
+
+
+def test_add_swift_code_with_trailing_nul(client):
+    bank = {
+        "swiftCode": "DEUTDEFF",
+        "address": "TAUNUSANLAGE 12",
+        "bankName": "DEUTSCHE BANK",
+        "countryISO2": "DE",
+        "countryName": "GERMANY",
+        "isHeadquarter": False,
+    }
+
+    for field in ("swiftCode", "bankName"):
+        response = client.post("/v1/swift-codes",
+                               data=json.dumps({**bank, field: bank[field] + "\u0000"}),
+                               content_type="application/json")
+
+        assert response.status_code == 400
+        assert response.get_json()["message"] == \
+            f"Field {field} must not contain NUL characters"
+
+
+def test_add_swift_code_overlong_fields(client):
+    bank = {
+        "swiftCode": "BPKOPLPWXXX",
+        "address": "PULAWSKA 15",
+        "bankName": "PKO BANK POLSKI",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True,
+    }
+    cases = [
+        ({"countryISO2": "PLX"}, "Field countryISO2 must be at most 2 characters"),
+        ({"bankName": "B" * 256}, "Field bankName must be at most 255 characters"),
+        ({"countryName": "P" * 256},
+         "Field countryName must be at most 255 characters"),
+        ({"swiftCode": "BPKOPLPWXXXXX"},
+         "Field swiftCode must be at most 11 characters"),
+    ]
+    for change, message in cases:
+        response = client.post("/v1/swift-codes", data=json.dumps({**bank, **change}),
+                               content_type="application/json")
+        assert response.status_code == 400
+        assert response.get_json()["message"] == message
+
+    response = client.post(
+        "/v1/swift-codes/bulk", content_type="application/json",
+        data=json.dumps([{**bank, "countryISO2": "PLX"},
+                         {**bank, "swiftCode": "BREXPLPWXXX"}]))
+    assert response.status_code == 200
+    assert [r["status"] for r in response.get_json()["results"]] == [
+        "invalid", "created"]
+
+
+def test_validate_swift_codes(client):
+    response = client.post(
+        "/v1/swift-codes/validate",
+        data=json.dumps({"swiftCodes": ["examplplxxx", "EXAMPLPL", "EXAMPL",
+                                        "1XAMPLPLXXX"]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["valid"] == 2
+    assert data["invalid"] == 2
+    assert data["results"][0] == {"swiftCode": "EXAMPLPLXXX", "valid": True}
+    assert data["results"][1]["valid"] is True
+    assert data["results"][2]["reason"] == "SWIFT code must be 8 or 11 characters"
+    assert data["results"][3]["reason"] == "SWIFT code bank code must be 4 letters"
+
+
 def test_add_swift_code_duplicate(client):
     bank = Bank(
-        swift_code="EXAMPLEXXX",
+        swift_code="EXAMPLPLXXX",
         address="TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         bank_name="BANK POLSKA",
         country_iso2="PL",
@@ -148,7 +324,7 @@ def test_add_swift_code_duplicate(client):
         db.session.commit()
 
     bank2 = {
-        "swiftCode": "EXAMPLEXXX",
+        "swiftCode": "EXAMPLPLXXX",
         "address": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         "bankName": "BANK POLSKA",
         "countryISO2": "PL",
@@ -166,10 +342,11 @@ def test_add_swift_code_duplicate(client):
     assert "SWIFT code already exists" in data["message"]
 
 
+@wsgi_only
 @patch("app.routes.db.session.commit", side_effect=Exception("DB Error"))
 def test_add_swift_code_db_error(mock_commit, client):
     bank = {
-        "swiftCode": "EXAMPLEXXX",
+        "swiftCode": "EXAMPLPLXXX",
         "address": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         "bankName": "BANK POLSKA",
         "countryISO2": "PL",
@@ -188,7 +365,7 @@ def test_add_swift_code_db_error(mock_commit, client):
 
 def test_delete_swift_code_success(client):
     bank = Bank(
-        swift_code="EXAMPLEXXX",
+        swift_code="EXAMPLPLXXX",
         address="TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         bank_name="BANK POLSKA",
         country_iso2="PL",
@@ -199,14 +376,14 @@ def test_delete_swift_code_success(client):
         db.session.add(bank)
         db.session.commit()
 
-    response = client.delete("/v1/swift-codes/EXAMPLEXXX")
+    response = client.delete("/v1/swift-codes/EXAMPLPLXXX")
 
     assert response.status_code == 200
     data = json.loads(response.data)
-    assert "SWIFT code, with value EXAMPLEXXX deleted successfully" in data["message"]
+    assert "SWIFT code, with value EXAMPLPLXXX deleted successfully" in data["message"]
 
     with client.application.app_context():
-        assert Bank.query.filter_by(swift_code="EXAMPLEXXX").first() is None
+        assert Bank.query.filter_by(swift_code="EXAMPLPLXXX").first() is None
 
 
 def test_delete_swift_code_not_found(client):
@@ -217,10 +394,11 @@ def test_delete_swift_code_not_found(client):
     assert "SWIFT code not found" in data["message"]
 
 
+@wsgi_only
 @patch("app.routes.db.session.delete", side_effect=Exception("Simulated failure"))
 def test_delete_swift_code_internal_error(mock_delete, client):
     bank = Bank(
-        swift_code="EXAMPLEXXX",
+        swift_code="EXAMPLPLXXX",
         address="TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
         bank_name="BANK POLSKA",
         country_iso2="PL",
@@ -231,8 +409,461 @@ def test_delete_swift_code_internal_error(mock_delete, client):
         db.session.add(bank)
         db.session.commit()
 
-    response = client.delete("/v1/swift-codes/EXAMPLEXXX")
+    response = client.delete("/v1/swift-codes/EXAMPLPLXXX")
 
     assert response.status_code == 500
     data = json.loads(response.data)
     assert "Internal Server Error" in data["message"]
+
+
+def test_get_swift_code_details_served_from_cache(client):
+    bank = Bank(
+        swift_code="AVJCBGS1XXX",
+        address="TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
+        bank_name="AVAL IN JSC",
+        country_iso2="BG",
+        country_name="BULGARIA",
+        is_headquarter=True,
+    )
+    with client.application.app_context():
+        db.session.add(bank)
+        db.session.commit()
+
+    first = client.get("/v1/swift-codes/AVJCBGS1XXX")
+    with patch("app.routes.Bank") as mock_bank:
+        second = client.get("/v1/swift-codes/avjcbgs1xxx")
+        mock_bank.query.filter_by.assert_not_called()
+
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert response_cache.stats()["hits"] == 1
+
+
+def test_delete_swift_code_invalidates_cache(client):
+    bank = Bank(
+        swift_code="AVJCBGS1XXX",
+        address="TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
+        bank_name="AVAL IN JSC",
+        country_iso2="BG",
+        country_name="BULGARIA",
+        is_headquarter=True,
+    )
+    with client.application.app_context():
+        db.session.add(bank)
+        db.session.commit()
+
+    assert client.get("/v1/swift-codes/AVJCBGS1XXX").status_code == 200
+    assert client.delete("/v1/swift-codes/AVJCBGS1XXX").status_code == 200
+    assert client.get("/v1/swift-codes/AVJCBGS1XXX").status_code == 404
+
+
+def add_headquarter_with_branch(client):
+    with client.application.app_context():
+        db.session.add_all([
+            Bank(swift_code="BPKOPLPWXXX", address="PULAWSKA 15",
+                 bank_name="PKO BANK POLSKI", country_iso2="PL",
+                 country_name="POLAND", is_headquarter=True),
+            Bank(swift_code="BPKOPLPWWAW", address="PULAWSKA 15",
+                 bank_name="PKO BANK POLSKI", country_iso2="PL",
+                 country_name="POLAND", is_headquarter=False,
+                 associated_headquarter="BPKOPLPWXXX"),
+        ])
+        db.session.commit()
+
+
+def test_batch_lookup_swift_codes(client):
+    add_headquarter_with_branch(client)
+
+    response = client.post(
+        "/v1/swift-codes/batch-lookup",
+        data=json.dumps({"swiftCodes": ["bpkoplpwwaw", "MISSINGXXXX", "BPKOPLPWXXX"],
+                         "includeBranches": True}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [r["swiftCode"] for r in results] == \
+        ["BPKOPLPWWAW", "MISSINGXXXX", "BPKOPLPWXXX"]
+    assert [r["found"] for r in results] == [True, False, True]
+    assert "branches" not in results[0]
+    assert [b["swiftCode"] for b in results[2]["branches"]] == ["BPKOPLPWWAW"]
+
+
+def test_batch_lookup_swift_codes_ndjson(client):
+    add_headquarter_with_branch(client)
+
+    response = client.post(
+        "/v1/swift-codes/batch-lookup?format=ndjson",
+        data=json.dumps({"swiftCodes": ["BPKOPLPWXXX", "MISSINGXXXX"]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line["found"] for line in lines] == [True, False]
+    assert "branches" not in lines[0]
+
+
+def test_batch_lookup_swift_codes_invalid_body(client):
+    response = client.post(
+        "/v1/swift-codes/batch-lookup",
+        data=json.dumps({"swiftCodes": "BPKOPLPWXXX"}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 400
+    assert "swiftCodes must be a list of strings" in response.get_json()["message"]
+
+
+def test_bulk_add_swift_codes(client):
+    add_headquarter_with_branch(client)
+    banks = [
+        {
+            "swiftCode": "breXPLPWXXX",
+            "address": "PROSTA 18",
+            "bankName": "MBANK",
+            "countryISO2": "pl",
+            "countryName": "poland",
+            "isHeadquarter": True,
+        },
+        {
+            "swiftCode": "BPKOPLPWXXX",
+            "address": "PULAWSKA 15",
+            "bankName": "PKO BANK POLSKI",
+            "countryISO2": "PL",
+            "countryName": "POLAND",
+            "isHeadquarter": True,
+        },
+        {"swiftCode": "INGBPLPWXXX", "address": "PUŁAWSKA 2"},
+    ]
+
+    response = client.post(
+        "/v1/swift-codes/bulk", data=json.dumps(banks), content_type="application/json"
+    )
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [r["status"] for r in data["results"]] == ["created", "conflict", "invalid"]
+    assert data["results"][2]["message"] == "Missing field: bankName"
+    assert (data["created"], data["conflict"], data["invalid"]) == (1, 1, 1)
+
+    details = client.get("/v1/swift-codes/BREXPLPWXXX").get_json()
+    assert details["countryISO2"] == "PL"
+    assert details["countryName"] == "POLAND"
+
+
+def test_bulk_add_swift_codes_ndjson(client):
+    lines = [
+        json.dumps({
+            "swiftCode": code,
+            "address": "PROSTA 18",
+            "bankName": "MBANK",
+            "countryISO2": "PL",
+            "countryName": "POLAND",
+            "isHeadquarter": False,
+        })
+        for code in ("BREXPLPWWAW", "BREXPLPWWAW")
+    ] + ["not json"]
+
+    response = client.post(
+        "/v1/swift-codes/bulk", data="\n".join(lines),
+        content_type="application/x-ndjson"
+    )
+
+    assert response.status_code == 200
+    statuses = [r["status"] for r in response.get_json()["results"]]
+    assert statuses == ["created", "conflict", "invalid"]
+
+
+def test_bulk_delete_swift_codes(client):
+    add_headquarter_with_branch(client)
+
+    response = client.delete(
+        "/v1/swift-codes/bulk",
+        data=json.dumps({"swiftCodes": ["bpkoplpwwaw", "MISSINGXXXX"]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [r["status"] for r in data["results"]] == ["deleted", "not_found"]
+    assert (data["deleted"], data["notFound"]) == (1, 1)
+    assert client.get("/v1/swift-codes/BPKOPLPWWAW").status_code == 404
+
+
+def test_get_swift_codes_by_country_paginated(client):
+    add_headquarter_with_branch(client)
+
+    first = client.get("/v1/swift-codes/country/PL?limit=1").get_json()
+    assert [b["swiftCode"] for b in first["swiftCodes"]] == ["BPKOPLPWWAW"]
+    assert first["nextAfter"] == "BPKOPLPWWAW"
+
+    second = client.get(
+        f"/v1/swift-codes/country/PL?limit=1&after={first['nextAfter']}")
+    data = second.get_json()
+    assert [b["swiftCode"] for b in data["swiftCodes"]] == ["BPKOPLPWXXX"]
+    assert data["nextAfter"] is None
+    assert data["countryName"] == "POLAND"
+
+
+def test_get_swift_codes_by_country_invalid_limit(client):
+    response = client.get("/v1/swift-codes/country/PL?limit=0")
+    assert response.status_code == 400
+    assert "limit must be an integer" in response.get_json()["message"]
+
+
+def test_get_swift_codes_by_country_streamed(client):
+    add_headquarter_with_branch(client)
+
+    response = client.get("/v1/swift-codes/country/pl?stream=1")
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["countryISO2"] == "PL"
+    assert data["countryName"] == "POLAND"
+    assert sorted(b["swiftCode"] for b in data["swiftCodes"]) == [
+        "BPKOPLPWWAW", "BPKOPLPWXXX"
+    ]
+    assert client.get("/v1/swift-codes/country/ZZ?stream=1").status_code == 404
+
+
+@wsgi_only
+def test_get_headquarter_details_uses_single_query(client):
+    add_headquarter_with_branch(client)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/v1/swift-codes/BPKOPLPWXXX")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert [b["swiftCode"] for b in response.get_json()["branches"]] == ["BPKOPLPWWAW"]
+    assert len([s for s in statements if "FROM banks" in s]) == 1
+
+
+def test_get_swift_code_details_pretty(client):
+    add_headquarter_with_branch(client)
+
+    compact = client.get("/v1/swift-codes/BPKOPLPWWAW")
+    pretty = client.get("/v1/swift-codes/BPKOPLPWWAW?pretty=1")
+
+    assert b"\n" not in compact.data
+    assert b"\n" in pretty.data
+    assert pretty.get_json() == compact.get_json()
+
+
+def test_get_swift_code_details_conditional_request(client):
+    add_headquarter_with_branch(client)
+
+    response = client.get("/v1/swift-codes/BPKOPLPWXXX")
+    etag = response.headers["ETag"]
+    assert "must-revalidate" in response.headers["Cache-Control"]
+
+    with patch("app.routes.fetch_details") as mock_fetch:
+        cached = client.get("/v1/swift-codes/BPKOPLPWXXX",
+                            headers={"If-None-Match": etag})
+        mock_fetch.assert_not_called()
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    client.delete("/v1/swift-codes/BPKOPLPWWAW")
+
+    changed = client.get("/v1/swift-codes/BPKOPLPWXXX", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.get_json()["branches"] == []
+
+
+def test_get_swift_codes_by_country_conditional_request(client):
+    bank = {
+        "swiftCode": "BREXPLPWXXX",
+        "address": "PROSTA 18",
+        "bankName": "MBANK",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True,
+    }
+    client.post("/v1/swift-codes", data=json.dumps(bank),
+                content_type="application/json")
+
+    response = client.get("/v1/swift-codes/country/PL")
+    assert response.headers["ETag"]
+
+    with patch("app.routes.fetch_country") as mock_fetch:
+        last_modified = response.headers["Last-Modified"]
+        cached = client.get("/v1/swift-codes/country/PL",
+                            headers={"If-Modified-Since": last_modified})
+        mock_fetch.assert_not_called()
+    assert cached.status_code == 304
+
+
+def test_conditional_request_for_missing_resource(client):
+    bank = {
+        "swiftCode": "BREXPLPWXXX",
+        "address": "PROSTA 18",
+        "bankName": "MBANK",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True,
+    }
+    client.post("/v1/swift-codes", data=json.dumps(bank),
+                content_type="application/json")
+    response = client.get("/v1/swift-codes/BREXPLPWXXX")
+
+    for headers in ({"If-None-Match": response.headers["ETag"]},
+                    {"If-Modified-Since": response.headers["Last-Modified"]}):
+        missing = client.get("/v1/swift-codes/NOPENOPE", headers=headers)
+        assert missing.status_code == 404
+        assert missing.get_json()["message"] == "SWIFT code not found"
+        for query in ("", "?stream=1", "?limit=10"):
+            missing = client.get(f"/v1/swift-codes/country/ZZ{query}",
+                                 headers=headers)
+            assert missing.status_code == 404
+        assert client.get("/v1/swift-codes/stats?country=ZZ",
+                          headers=headers).status_code == 404
+
+
+def test_search_swift_codes(client):
+    add_headquarter_with_branch(client)
+
+    by_prefix = client.get("/v1/swift-codes/search?prefix=bpkoplpw&limit=1").get_json()
+    assert by_prefix["count"] == 1
+    assert by_prefix["results"][0]["swiftCode"] == "BPKOPLPWWAW"
+
+    by_name = client.get("/v1/swift-codes/search?q=bank pol&country=pl").get_json()
+    assert [r["swiftCode"] for r in by_name["results"]] == \
+        ["BPKOPLPWWAW", "BPKOPLPWXXX"]
+
+    assert client.get("/v1/swift-codes/search?q=%25").status_code == 400
+    assert client.get("/v1/swift-codes/search?q=___").get_json()["count"] == 0
+    assert client.get("/v1/swift-codes/search").status_code == 400
+
+
+def test_get_swift_code_stats_follow_writes(client):
+    banks = [
+        {"swiftCode": "BPKOPLPWXXX", "address": "PULAWSKA 15",
+         "bankName": "PKO BANK POLSKI", "countryISO2": "PL", "countryName": "POLAND",
+         "isHeadquarter": True},
+        {"swiftCode": "BPKOPLPWWAW", "address": "PULAWSKA 15",
+         "bankName": "PKO BANK POLSKI", "countryISO2": "PL", "countryName": "POLAND",
+         "isHeadquarter": False},
+        {"swiftCode": "AVJCBGS1XXX", "address": "SOFIA", "bankName": "AVAL IN JSC",
+         "countryISO2": "BG", "countryName": "BULGARIA", "isHeadquarter": True},
+    ]
+    client.post("/v1/swift-codes/bulk", data=json.dumps(banks),
+                content_type="application/json")
+
+    stats = client.get("/v1/swift-codes/stats").get_json()
+    assert (stats["codes"], stats["headquarters"], stats["branches"]) == (3, 2, 1)
+    assert [c["countryISO2"] for c in stats["countries"]] == ["BG", "PL"]
+    assert stats["countries"][1]["branchesPerHeadquarter"] == 1.0
+
+    client.delete("/v1/swift-codes/BPKOPLPWWAW")
+    client.delete("/v1/swift-codes/AVJCBGS1XXX")
+
+    poland = client.get("/v1/swift-codes/stats?country=pl").get_json()
+    assert poland["codes"] == 1
+    assert poland["headquarterBranches"] == \
+        [{"swiftCode": "BPKOPLPWXXX", "branches": 0}]
+    assert client.get("/v1/swift-codes/stats?country=BG").status_code == 404
+
+
+def sample_value(text, name, **labels):
+    for line in text.splitlines():
+        sample, _, value = line.rpartition(" ")
+        if sample.startswith(name + "{") or sample == name:
+            if all(f'{key}="' in sample and f'{key}="{label}"' in sample
+                   for key, label in labels.items()):
+                return float(value)
+    return None
+
+
+def test_metrics_endpoint(metrics_client):
+    bank = {"swiftCode": "BPKOPLPWXXX", "address": "PULAWSKA 15",
+            "bankName": "PKO BANK POLSKI", "countryISO2": "PL",
+            "countryName": "POLAND", "isHeadquarter": True}
+    metrics_client.post("/v1/swift-codes", data=json.dumps(bank),
+                        content_type="application/json")
+    metrics_client.get("/v1/swift-codes/BPKOPLPWXXX")
+    metrics_client.get("/v1/swift-codes/MISSINGXXXX")
+
+    response = metrics_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    assert "# TYPE swift_http_request_duration_seconds histogram" in text
+    assert sample_value(text, "swift_http_request_duration_seconds_count",
+                        method="POST", route="/v1/swift-codes", status="201") == 1
+    assert sample_value(text, "swift_http_request_duration_seconds_count",
+                        method="GET", status="404") == 1
+    assert sample_value(text, "swift_http_request_db_queries_sum",
+                        method="POST", route="/v1/swift-codes") >= 1
+    assert sample_value(text, "swift_db_query_duration_seconds_count") >= 1
+    assert sample_value(text, "swift_response_cache_misses_total") >= 1
+
+
+def add_polish_banks(client, count=20):
+    banks = [{"swiftCode": f"BANKPL{index:02d}XXX", "address": f"STREET {index}",
+              "bankName": f"BANK NUMBER {index}", "countryISO2": "PL",
+              "countryName": "POLAND", "isHeadquarter": True}
+             for index in range(count)]
+    client.post("/v1/swift-codes/bulk", data=json.dumps(banks),
+                content_type="application/json")
+
+
+def test_get_swift_codes_by_country_compressed(client):
+    add_polish_banks(client)
+    plain = client.get("/v1/swift-codes/country/PL")
+    assert "Content-Encoding" not in plain.headers
+
+    with patch("app.compression.compress", side_effect=compress) as mock_compress:
+        first = client.get("/v1/swift-codes/country/PL",
+                           headers={"Accept-Encoding": "gzip"})
+        second = client.get("/v1/swift-codes/country/PL",
+                            headers={"Accept-Encoding": "gzip"})
+        assert mock_compress.call_count == 1
+
+    assert first.status_code == 200
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in first.headers["Vary"]
+    assert first.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert gzip.decompress(first.get_data()) == plain.get_data()
+    assert second.get_data() == first.get_data()
+
+    cached = client.get("/v1/swift-codes/country/PL",
+                        headers={"Accept-Encoding": "gzip",
+                                 "If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == first.headers["ETag"]
+
+
+def test_get_swift_codes_by_country_columnar(client):
+    add_polish_banks(client, 3)
+
+    response = client.get("/v1/swift-codes/country/PL?shape=columnar")
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["countryName"] == "POLAND"
+    assert data["swiftCodes"]["swiftCode"] == ["BANKPL00XXX", "BANKPL01XXX",
+                                               "BANKPL02XXX"]
+    assert data["swiftCodes"]["isHeadquarter"] == [True, True, True]
+
+    page = client.get("/v1/swift-codes/country/PL?shape=columnar&limit=2").get_json()
+    assert page["swiftCodes"]["bankName"] == ["BANK NUMBER 0", "BANK NUMBER 1"]
+    assert page["nextAfter"] == "BANKPL01XXX"
+
+    search = client.get("/v1/swift-codes/search?prefix=BANKPL0&shape=columnar")
+    assert search.get_json()["results"]["address"] == ["STREET 0", "STREET 1",
+                                                       "STREET 2"]
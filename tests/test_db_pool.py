@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import NullPool
+from app.db_pool import InstrumentedQueuePool, engine_options, pool_metrics
+
+
+def test_engine_options_read_environment(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "8")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "2")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT", "500")
+
+    options = engine_options()
+
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 8
+    assert options["max_overflow"] == 2
+    assert options["connect_args"]["options"] == "-c statement_timeout=500"
+
+
+def test_external_pooler_mode_has_no_session_state(monkeypatch):
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT", "500")
+
+    options = engine_options("external")
+
+    assert options["poolclass"] is NullPool
+    assert "options" not in options["connect_args"]
+    assert "pool_size" not in options
+
+
+def test_engine_options_reject_unknown_mode():
+    with pytest.raises(ValueError):
+        engine_options("session")
+
+
+def test_pool_metrics_track_checkouts_and_timeouts():
+    engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.01)
+    conn = engine.connect()
+
+    metrics = pool_metrics(engine)
+    assert metrics["checkedOut"] == 1
+    assert metrics["checkouts"] == 1
+
+    with pytest.raises(TimeoutError):
+        engine.connect()
+    conn.close()
+
+    metrics = pool_metrics(engine)
+    assert metrics["checkedOut"] == 0
+    assert metrics["timeouts"] == 1
+    assert metrics["waitMax"] >= 0.01
+    engine.dispose()
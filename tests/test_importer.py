@@ -0,0 +1,258 @@
+import queue
+import threading
+import pytest
+from unittest.mock import patch
+from sqlalchemy import select, text
+from app import create_app
+from app.data_parser import parse_swift_codes
+from app.extensions import db
+from app.importer import (csv_files, import_files, reload_files, parse_file,
+                          SessionWriter)
+from app.models.bank import Bank
+from app.models.import_file import ImportedFile, ImportedCode
+from app.table_swap import ShadowTableError, lock_live_table
+from app.versioning import read_dataset_version
+
+
+HEADER = ("COUNTRY ISO2 CODE,SWIFT CODE,CODE TYPE,NAME,ADDRESS,TOWN NAME,COUNTRY NAME,"
+          "TIME ZONE\n")
+
+
+def csv_row(country_iso2, swift_code, name="PKO BANK POLSKI", country_name="POLAND"):
+    return (f"{country_iso2},{swift_code},BIC11,{name},PULAWSKA 15,WARSZAWA,"
+            f"{country_name},Europe/Warsaw\n")
+
+
+@pytest.fixture
+def app():
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def regions(tmp_path):
+    directory = tmp_path / "regions"
+    directory.mkdir()
+    (directory / "pl.csv").write_text(
+        HEADER + csv_row("PL", "BPKOPLPWXXX") + csv_row("PL", "BPKOPLPWWAW") +
+        csv_row("PL", "BREXPLPWKRK")
+    )
+    (directory / "bg.csv").write_text(
+        HEADER + csv_row("BG", "BGUSBGSFXXX", "BULGARIAN BANK", "BULGARIA") +
+        csv_row("PL", "BPKOPLPWGDA") +
+        csv_row("BG", "BGUSBG", "BULGARIAN BANK", "BULGARIA")
+    )
+    (directory / "notes.txt").write_text("not a csv")
+    return directory
+
+
+def associated(swift_code):
+    return db.session.scalar(select(Bank.associated_headquarter)
+                             .where(Bank.swift_code == swift_code))
+
+
+def test_csv_files_expands_directories(regions, tmp_path):
+    extra = tmp_path / "delta.csv"
+
+    assert csv_files([str(regions), str(extra)]) == [
+        str(regions / "bg.csv"), str(regions / "pl.csv"), str(extra)
+    ]
+
+
+def test_parse_file_hands_over_one_batch_at_a_time(regions):
+    batches = queue.Queue(maxsize=1)
+    worker = threading.Thread(target=parse_file,
+                              args=(str(regions / "pl.csv"), set(), batches, 1))
+    worker.start()
+
+    worker.join(timeout=0.5)
+    assert worker.is_alive() and batches.qsize() == 1
+    received = list(iter(batches.get, None))
+    worker.join()
+    assert [[r["swift_code"] for r in records] for records, _ in received] == [
+        ["BPKOPLPWXXX"], ["BPKOPLPWWAW"], ["BREXPLPWKRK"]]
+
+
+@pytest.mark.parametrize("writers", [1, 2])
+def test_import_files(app, regions, tmp_path, writers):
+    (tmp_path / "mbank.csv").write_text(HEADER + csv_row("PL", "BREXPLPWXXX"))
+    parse_swift_codes(str(tmp_path / "mbank.csv"))
+
+    stats = import_files([str(regions)], workers=2, writers=writers, incremental=True,
+                         reject_file=tmp_path / "rejects.csv")
+
+    assert stats.error is None
+    assert (stats.rows, stats.inserted, stats.rejected) == (5, 5, 1)
+    assert [entry["file"] for entry in stats.files] == [
+        str(regions / "bg.csv"), str(regions / "pl.csv")
+    ]
+    assert [entry["rows"] for entry in stats.files] == [2, 3]
+    assert [entry["inserted"] for entry in stats.files] == [2, 3]
+    assert all(entry["parseTime"] >= 0 and entry["worker"] for entry in stats.files)
+
+    # Headquarters from another file and from an earlier import are linked.
+    assert associated("BPKOPLPWGDA") == "BPKOPLPWXXX"
+    assert associated("BREXPLPWKRK") == "BREXPLPWXXX"
+    assert stats.linked == 1
+    assert "BGUSBG" in (tmp_path / "rejects.csv").read_text()
+
+    stats = import_files([str(regions)], workers=2, writers=writers, incremental=True)
+
+    assert stats.skipped
+    assert all(entry["skipped"] for entry in stats.files)
+
+
+def test_incremental_import_only_deletes_codes_from_the_same_file(app, tmp_path):
+    pko, mbank = tmp_path / "pko.csv", tmp_path / "mbank.csv"
+    pko.write_text(HEADER + csv_row("PL", "BPKOPLPWXXX") + csv_row("PL", "BPKOPLPWWAW"))
+    mbank.write_text(HEADER + csv_row("PL", "BREXPLPWXXX"))
+    parse_swift_codes(str(pko), incremental=True)
+    parse_swift_codes(str(mbank), incremental=True)
+
+    pko.write_text(HEADER + csv_row("PL", "BPKOPLPWXXX"))
+    stats = parse_swift_codes(str(pko), incremental=True)
+
+    assert stats.error is None
+    assert stats.deleted == 1
+    assert bank_codes() == {"BPKOPLPWXXX", "BREXPLPWXXX"}
+
+
+def test_incremental_import_files_applies_removals(app, regions):
+    import_files([str(regions)], workers=2, incremental=True)
+
+    # BPKOPLPWGDA moves from bg.csv to pl.csv and BREXPLPWKRK is dropped.
+    (regions / "bg.csv").write_text(
+        HEADER + csv_row("BG", "BGUSBGSFXXX", "BULGARIAN BANK", "BULGARIA"))
+    (regions / "pl.csv").write_text(
+        HEADER + csv_row("PL", "BPKOPLPWXXX") + csv_row("PL", "BPKOPLPWWAW") +
+        csv_row("PL", "BPKOPLPWGDA"))
+    stats = import_files([str(regions)], workers=2, incremental=True)
+
+    assert stats.error is None
+    assert stats.deleted == 1
+    assert bank_codes() == {"BGUSBGSFXXX", "BPKOPLPWXXX", "BPKOPLPWWAW",
+                            "BPKOPLPWGDA"}
+
+
+def test_import_files_dry_run(app, regions):
+    stats = import_files([str(regions)], workers=2, writers=2, dry_run=True)
+
+    assert stats.inserted == 5
+    assert db.session.scalar(select(db.func.count()).select_from(Bank)) == 0
+    assert db.session.scalar(text("SELECT to_regclass('banks_import_staging')")) is None
+
+
+def test_partitioned_import_writes_nothing_when_it_fails(app, regions):
+    with patch("app.importer.finish_import", side_effect=RuntimeError("boom")):
+        stats = import_files([str(regions)], workers=2, writers=2, incremental=True)
+
+    assert stats.error == "boom"
+    assert bank_codes() == set()
+    assert db.session.scalar(select(db.func.count()).select_from(ImportedFile)) == 0
+    assert db.session.scalar(text("SELECT to_regclass('banks_import_staging')")) is None
+
+
+def test_import_files_stops_workers_when_a_write_fails(app, regions):
+    with patch.object(SessionWriter, "write", side_effect=RuntimeError("boom")):
+        stats = import_files([str(regions)], workers=2, batch_size=1)
+
+    assert stats.error == "boom"
+    assert bank_codes() == set()
+
+
+def test_import_files_no_files(app, tmp_path):
+    stats = import_files([str(tmp_path)])
+
+    assert stats.error == "No CSV files to import"
+
+
+def bank_indexes():
+    return set(db.session.scalars(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'banks'")))
+
+
+def bank_codes():
+    return set(db.session.scalars(select(Bank.swift_code)))
+
+
+def test_reload_files_swaps_in_shadow_table(app, regions, tmp_path):
+    (tmp_path / "mbank.csv").write_text(HEADER + csv_row("PL", "BREXPLPWXXX")
+                                        + csv_row("PL", "BPKOPLPWWAW", "OLD NAME"))
+    parse_swift_codes(str(tmp_path / "mbank.csv"))
+    # An index the model defines but the live table lacks is built as well.
+    db.session.execute(text("DROP INDEX idx_country_iso2"))
+    indexes = bank_indexes()
+    version, _ = read_dataset_version()
+
+    stats = reload_files([str(regions)], workers=2)
+
+    assert stats.error is None
+    assert (stats.rows, stats.inserted, stats.updated, stats.unchanged,
+            stats.deleted, stats.rejected) == (5, 4, 1, 0, 1, 1)
+    assert bank_codes() == {"BGUSBGSFXXX", "BPKOPLPWGDA", "BPKOPLPWXXX",
+                            "BPKOPLPWWAW", "BREXPLPWKRK"}
+    assert associated("BPKOPLPWGDA") == "BPKOPLPWXXX"
+    assert associated("BREXPLPWKRK") is None
+    assert bank_indexes() == indexes | {"idx_country_iso2"}
+    assert db.session.scalar(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = 'banks'::regclass "
+        "AND contype = 'p'")) == "banks_pkey"
+    assert db.session.scalar(text("SELECT to_regclass('banks_shadow')")) is None
+    assert read_dataset_version()[0] == version + 1
+    assert {entry["file"] for entry in stats.files} == {
+        str(regions / "bg.csv"), str(regions / "pl.csv")}
+    assert len(db.session.scalars(select(ImportedFile)).all()) == 2
+    assert db.session.get(ImportedCode, "BPKOPLPWGDA").source == str(regions / "bg.csv")
+    assert set(stats.phases) >= {"headquarters", "write", "index", "validate", "swap"}
+
+    stats = reload_files([str(regions)], workers=2)
+
+    assert stats.error is None
+    assert (stats.inserted, stats.updated, stats.deleted) == (0, 0, 0)
+    assert stats.unchanged == 5
+    assert "swap" not in stats.phases
+    assert read_dataset_version()[0] == version + 1
+
+
+def test_reload_files_dry_run(app, regions):
+    stats = reload_files([str(regions)], workers=2, dry_run=True)
+
+    assert stats.error is None
+    assert stats.inserted == 5
+    assert bank_codes() == set()
+
+
+def test_reload_files_keeps_live_table_when_validation_fails(app, regions, tmp_path):
+    (tmp_path / "invalid.csv").write_text(HEADER + csv_row("PL", "BPKO"))
+    parse_swift_codes(str(regions / "pl.csv"))
+
+    stats = reload_files([str(tmp_path / "invalid.csv")], workers=1)
+
+    assert stats.error == "No valid rows to load, refusing to empty the dataset"
+    assert bank_codes() == {"BPKOPLPWXXX", "BPKOPLPWWAW", "BREXPLPWKRK"}
+    assert db.session.scalar(text("SELECT to_regclass('banks_shadow')")) is None
+
+
+def test_reload_files_gives_up_when_dataset_changes(app, regions):
+    parse_swift_codes(str(regions / "pl.csv"))
+
+    with patch("app.importer.read_dataset_version", return_value=(-1, None)):
+        stats = reload_files([str(regions)], workers=1)
+
+    assert "during the reload" in stats.error
+    assert bank_codes() == {"BPKOPLPWXXX", "BPKOPLPWWAW", "BREXPLPWKRK"}
+
+
+def test_swap_lock_gives_up_while_table_is_busy(app):
+    with db.engine.connect() as reader:
+        reader.execute(text("LOCK TABLE banks IN ACCESS SHARE MODE"))
+        with patch("app.table_swap.SWAP_ATTEMPTS", 2), \
+                patch("app.table_swap.SWAP_LOCK_TIMEOUT_MS", 50):
+            with pytest.raises(ShadowTableError, match="Could not lock"):
+                lock_live_table("ACCESS EXCLUSIVE")
+        reader.rollback()
+    db.session.rollback()
@@ -0,0 +1,84 @@
+import logging
+import pytest
+from flask import json
+from app import create_app
+from app.extensions import db
+from app.metrics import Counter, Histogram, MetricsRegistry, format_sample
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    apps = []
+
+    def make(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        app = create_app("testing")
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app.test_client()
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram("latency", "Latency.", ["route"], buckets=(0.1, 1.0))
+    histogram.observe(0.1, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(3.0, "/a")
+
+    samples = [format_sample(*sample) for sample in histogram.samples()]
+
+    assert samples == [
+        'latency_bucket{route="/a",le="0.1"} 1',
+        'latency_bucket{route="/a",le="1.0"} 2',
+        'latency_bucket{route="/a",le="+Inf"} 3',
+        'latency_sum{route="/a"} 3.6',
+        'latency_count{route="/a"} 3',
+    ]
+
+
+def test_registry_renders_text_format_and_skips_empty_metrics():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests.", ["path"])
+    registry.counter("unused_total", "Never incremented.")
+    counter.inc('say "hi"\n', amount=2)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="say \\"hi\\"\\n"} 2\n'
+    )
+
+
+def test_registry_survives_failing_collector():
+    registry = MetricsRegistry()
+    registry.add_collector(lambda: [1 / 0])
+    registry.add_collector(lambda: [Counter("ok_total", "Fine.")])
+
+    assert registry.render() == ""
+
+
+def test_slow_request_log_includes_sql(make_client, caplog):
+    client = make_client(SWIFT_METRICS="1", SWIFT_SLOW_REQUEST_MS="0.001")
+
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        client.get("/v1/swift-codes/BPKOPLPWXXX")
+
+    message = caplog.records[-1].getMessage()
+    assert message.startswith("Slow request GET /v1/swift-codes/BPKOPLPWXXX")
+    assert "FROM banks" in message
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "swift_http_slow_requests_total" in text
+
+
+def test_metrics_disabled_by_default(make_client):
+    client = make_client()
+    client.post("/v1/swift-codes", content_type="application/json", data=json.dumps({}))
+
+    assert client.get("/metrics").status_code == 404
@@ -1,19 +1,26 @@
 import pytest
+import os
 import pandas as pd
 from unittest.mock import patch, MagicMock
-from app.data_parser import parse_swift_codes
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app.data_parser import parse_swift_codes, upsert_banks, clean_frame
 import random
 import string
 
 
-def generate_swift_code(length=11):
+def generate_swift_code(country_iso2="PL"):
     """
-    Generates a fully random SWIFT code with the given length.
-    The default length is 11 characters.
+    Generates a random, well-formed 11-character SWIFT code for the given country.
     """
     characters = string.ascii_uppercase + string.digits
-    swift_code = ''.join(random.choice(characters) for _ in range(length))
-    return swift_code
+    bank_code = ''.join(random.choice(string.ascii_uppercase) for _ in range(4))
+    location_and_branch = ''.join(random.choice(characters) for _ in range(5))
+    return bank_code + country_iso2 + location_and_branch
+
+
+def csv_chunks(*frames):
+    return lambda *args, **kwargs: iter(frames)
 
 
 @pytest.fixture
@@ -26,10 +33,10 @@ def mock_db_session():
     with patch("app.extensions.db.session") as mock_db:
         yield mock_db
 
-def test_parse_swift_codes_success(mock_bank_class, mock_db_session):
+def test_parse_swift_codes_success(mock_db_session):
     test_data = pd.DataFrame([
         {
-            "SWIFT CODE": "EXAMPLEXXX",
+            "SWIFT CODE": "EXAMPLPLXXX",
             "ADDRESS": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
             "NAME": "BANK POLSKA",
             "COUNTRY ISO2 CODE": "PL",
@@ -37,21 +44,21 @@ def test_parse_swift_codes_success(mock_bank_class, mock_db_session):
         }
     ])
 
-    with patch("app.data_parser.pd.read_csv", return_value=test_data):
-        mock_bank_instance = MagicMock()
-        mock_bank_class.return_value = mock_bank_instance
-        mock_bank_class.query.filter_by.return_value.first.return_value = None
-
-        result = parse_swift_codes("dummy.csv")
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)):
+        result = parse_swift_codes("dummy.csv", return_banks=True)
 
         assert len(result) == 1
-        mock_db_session.add.assert_called_once_with(mock_bank_instance)
+        mock_db_session.add.assert_not_called()
+        mock_db_session.execute.assert_called_once()
+        statement = str(mock_db_session.execute.call_args[0][0].compile(
+            dialect=postgresql.dialect()))
+        assert "ON CONFLICT (swift_code) DO UPDATE" in statement
         mock_db_session.commit.assert_called_once()
 
 def test_parse_swift_codes_branch_no_hq(mock_bank_class, mock_db_session):
     test_data = pd.DataFrame([
         {
-            "SWIFT CODE": "EXAMPLEXXX",
+            "SWIFT CODE": "EXAMPLPLXXX",
             "ADDRESS": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
             "NAME": "BANK POLSKA",
             "COUNTRY ISO2 CODE": "PL",
@@ -59,54 +66,83 @@ def test_parse_swift_codes_branch_no_hq(mock_bank_class, mock_db_session):
         }
     ])
 
-    with patch("app.data_parser.pd.read_csv", return_value=test_data):
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)):
         mock_bank_instance = MagicMock()
         mock_bank_class.return_value = mock_bank_instance
         mock_bank_class.query.filter_by.return_value.first.return_value = None
 
-        result = parse_swift_codes("dummy.csv")
+        result = parse_swift_codes("dummy.csv", return_banks=True)
 
         bank_arg = mock_bank_class.call_args[1]
         assert bank_arg["associated_headquarter"] is None
 
 
-def test_parse_swift_codes_updates_existing_bank(mock_bank_class, mock_db_session):
+def test_parse_swift_codes_resolves_headquarters(mock_bank_class, mock_db_session):
     test_data = pd.DataFrame([
         {
-            "SWIFT CODE": "EXAMPLEXXX",
-            "ADDRESS": "TODOR ALEKSANDROV BLVD 73 FLOOR 1 SOFIA, SOFIA, 1303",
-            "NAME": "BANK POLSKA",
+            "SWIFT CODE": "bpkoplpwwaw",
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        },
+        {
+            "SWIFT CODE": "BPKOPLPWXXX",
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
             "COUNTRY ISO2 CODE": "PL",
             "COUNTRY NAME": "POLAND"
         }
     ])
 
-    existing_bank = MagicMock()
-    existing_bank.address = "OLD ADDRESS"
-    existing_bank.bank_name = "OLD BANK"
-    existing_bank.country_iso2 = "PL"
-    existing_bank.country_name = "POLAND"
-    mock_bank_class.query.filter_by.return_value.first.return_value = existing_bank
-
-    with patch("app.data_parser.pd.read_csv", return_value=test_data):
-        parse_swift_codes("dummy.csv")
-
-        existing_bank.address = "KOSZYKARSKA"
-        existing_bank.bank_name = "BANK PL"
-        existing_bank.country_iso2 = "PL"
-        existing_bank.country_name = "POLAND"
-
-        assert existing_bank.address == "KOSZYKARSKA"
-        assert existing_bank.bank_name == "BANK PL"
-        assert existing_bank.country_iso2 == "PL"
-        assert existing_bank.country_name == "POLAND"
-        mock_db_session.add.assert_not_called()
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)):
+        parse_swift_codes("dummy.csv", return_banks=True)
+
+        branch, headquarter = [c[1] for c in mock_bank_class.call_args_list]
+        assert branch["swift_code"] == "BPKOPLPWWAW"
+        assert branch["associated_headquarter"] == "BPKOPLPWXXX"
+        assert branch["is_headquarter"] is False
+        assert headquarter["associated_headquarter"] is None
+        assert headquarter["is_headquarter"] is True
+
+
+def test_parse_swift_codes_writes_in_batches(mock_db_session):
+    test_data = pd.DataFrame([
+        {
+            "SWIFT CODE": generate_swift_code(),
+            "ADDRESS": "ADDRESS",
+            "NAME": "BANK",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        }
+        for _ in range(5)
+    ])
+
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)):
+        parse_swift_codes("dummy.csv", batch_size=2)
+
+        assert mock_db_session.execute.call_count == 3
         mock_db_session.commit.assert_called_once()
 
 
+def test_upsert_banks_counts_inserted_and_updated(mock_db_session):
+    mock_db_session.execute.return_value.all.return_value = [
+        SimpleNamespace(inserted=True),
+        SimpleNamespace(inserted=False),
+    ]
+    records = [
+        {"swift_code": generate_swift_code(), "address": None, "bank_name": "BANK",
+         "country_iso2": "PL", "country_name": "POLAND",
+         "is_headquarter": False, "associated_headquarter": None}
+        for _ in range(3)
+    ]
+
+    assert upsert_banks(records) == (1, 1)
+
+
 def test_parse_swift_codes_read_csv_error(mock_bank_class, mock_db_session):
     with patch("app.data_parser.pd.read_csv", side_effect=Exception("File not found")):
-        result = parse_swift_codes("invalid.csv")
+        result = parse_swift_codes("invalid.csv", return_banks=True)
         assert result == []
         mock_db_session.add.assert_not_called()
 
@@ -123,8 +159,142 @@ def test_parse_swift_codes_db_commit_fails(mock_bank_class, mock_db_session):
 
     mock_db_session.commit.side_effect = Exception("DB down")
 
-    with patch("app.data_parser.pd.read_csv", return_value=test_data):
-        result = parse_swift_codes("dummy.csv")
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)):
+        result = parse_swift_codes("dummy.csv", return_banks=True)
 
         assert result != []
-        mock_db_session.rollback.assert_called_once()
\ No newline at end of file
+        mock_db_session.rollback.assert_called_once()
+
+
+def test_parse_swift_codes_resolves_headquarter_from_later_chunk(mock_bank_class,
+                                                                 mock_db_session):
+    branch_chunk = pd.DataFrame([
+        {
+            "SWIFT CODE": "BPKOPLPWWAW",
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        }
+    ])
+    headquarter_chunk = pd.DataFrame([
+        {
+            "SWIFT CODE": "BPKOPLPWXXX",
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        }
+    ])
+
+    chunks = csv_chunks(branch_chunk, headquarter_chunk)
+    with patch("app.data_parser.pd.read_csv", side_effect=chunks):
+        parse_swift_codes("dummy.csv", batch_size=1, return_banks=True)
+
+        branch = mock_bank_class.call_args_list[0][1]
+        assert branch["associated_headquarter"] == "BPKOPLPWXXX"
+
+
+def test_parse_swift_codes_returns_stats_by_default(mock_bank_class, mock_db_session):
+    test_data = pd.DataFrame([
+        {
+            "SWIFT CODE": "BPKOPLPWXXX",
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        }
+    ])
+
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)), \
+            patch("app.data_parser.upsert_banks", return_value=(1, 0)):
+        stats = parse_swift_codes("dummy.csv")
+
+        mock_bank_class.assert_not_called()
+        assert stats.rows == 1
+        assert stats.inserted == 1
+        assert stats.error is None
+
+
+def test_parse_swift_codes_incremental_skips_unchanged_file(mock_db_session):
+    mock_db_session.get.return_value = SimpleNamespace(digest="abc")
+
+    with patch("app.data_parser.file_digest", return_value="abc"), \
+            patch("app.data_parser.pd.read_csv") as mock_read_csv:
+        stats = parse_swift_codes("dummy.csv", incremental=True)
+
+        assert stats.skipped is True
+        mock_read_csv.assert_not_called()
+        mock_db_session.execute.assert_not_called()
+
+
+def test_parse_swift_codes_incremental_applies_delta(mock_db_session):
+    test_data = pd.DataFrame([
+        {
+            "SWIFT CODE": code,
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        }
+        for code in ("BPKOPLPWXXX", "BPKOPLPWWAW", "BPKOPLPWKRK")
+    ])
+    hashes = dict(zip(
+        ["BPKOPLPWXXX", "BPKOPLPWWAW", "BPKOPLPWKRK"],
+        clean_frame(test_data.copy())["row_hash"],
+    ))
+    existing = {
+        "BPKOPLPWXXX": hashes["BPKOPLPWXXX"],
+        "BPKOPLPWWAW": hashes["BPKOPLPWWAW"] + 1,
+        "BPKOPLPWGDA": 42,
+    }
+    mock_db_session.get.return_value = None
+
+    with patch("app.data_parser.file_digest", return_value="abc"), \
+            patch("app.data_parser.load_row_hashes", return_value=existing), \
+            patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)), \
+            patch("app.data_parser.upsert_banks", return_value=(1, 1)) as mock_upsert, \
+            patch("app.data_parser.claim_codes",
+                  return_value=["BPKOPLPWGDA"]) as mock_claim, \
+            patch("app.data_parser.delete_released", return_value=1) as mock_delete:
+        stats = parse_swift_codes("dummy.csv", incremental=True)
+
+        written = [record["swift_code"] for record in mock_upsert.call_args[0][0]]
+        assert written == ["BPKOPLPWWAW", "BPKOPLPWKRK"]
+        mock_claim.assert_called_once_with(
+            os.path.abspath("dummy.csv"),
+            {"BPKOPLPWXXX", "BPKOPLPWWAW", "BPKOPLPWKRK"}, 5000)
+        mock_delete.assert_called_once_with(["BPKOPLPWGDA"], 5000)
+        assert stats.unchanged == 1
+        assert stats.deleted == 1
+        mock_db_session.merge.assert_called_once()
+        mock_db_session.commit.assert_called_once()
+
+
+def test_parse_swift_codes_rejects_invalid_rows(mock_db_session, tmp_path):
+    test_data = pd.DataFrame([
+        {
+            "SWIFT CODE": code,
+            "ADDRESS": "PULAWSKA 15",
+            "NAME": "PKO BANK POLSKI",
+            "COUNTRY ISO2 CODE": "PL",
+            "COUNTRY NAME": "POLAND"
+        }
+        for code in ("BPKOPLPWXXX", "BPKOPL", "BPKODEPWXXX", "bpkoplpwwaw")
+    ])
+    reject_file = tmp_path / "rejects.csv"
+
+    with patch("app.data_parser.pd.read_csv", side_effect=csv_chunks(test_data)), \
+            patch("app.data_parser.upsert_banks", return_value=(2, 0)) as mock_upsert:
+        stats = parse_swift_codes("dummy.csv", reject_file=reject_file)
+
+    written = [record["swift_code"] for record in mock_upsert.call_args[0][0]]
+    assert written == ["BPKOPLPWXXX", "BPKOPLPWWAW"]
+    assert stats.rejected == 2
+
+    rejects = pd.read_csv(reject_file)
+    assert list(rejects["LINE"]) == [3, 4]
+    assert list(rejects["REASON"]) == [
+        "SWIFT code must be 8 or 11 characters",
+        "SWIFT code country does not match countryISO2",
+    ]
@@ -0,0 +1,143 @@
+import pytest
+from unittest.mock import patch
+from flask import Flask, request
+from app import create_app
+from app.ratelimit import MemoryBackend, RateLimiter, client_key, load_backend
+from app.serializers import json_response
+
+
+class FailingBackend:
+    def take(self, key, rate, capacity):
+        raise ConnectionError("store is down")
+
+
+def failing_backend(app):
+    return FailingBackend()
+
+
+def make_app(rate=1, burst=2, backend="memory", api_keys=("secret",)):
+    app = Flask(__name__)
+    app.config.update(SWIFT_RATE_LIMIT=rate, SWIFT_RATE_LIMIT_BURST=burst,
+                      SWIFT_RATE_LIMIT_BACKEND=backend, SWIFT_API_KEYS=list(api_keys))
+    limiter = RateLimiter()
+    limiter.init_app(app)
+
+    @app.route("/v1/ping")
+    def ping():
+        return json_response({"message": "pong"})
+
+    @app.route("/metrics")
+    def metrics():
+        return "ok"
+
+    return app, limiter
+
+
+def test_memory_backend_refills_at_rate():
+    backend = MemoryBackend()
+    with patch("app.ratelimit.time.monotonic", return_value=100.0):
+        assert backend.take("ip:a", 2, 2) == (True, 0.0)
+        assert backend.take("ip:a", 2, 2) == (True, 0.0)
+        assert backend.take("ip:a", 2, 2) == (False, 0.5)
+    with patch("app.ratelimit.time.monotonic", return_value=100.5):
+        assert backend.take("ip:a", 2, 2) == (True, 0.0)
+        assert backend.take("ip:a", 2, 2)[0] is False
+
+
+def test_memory_backend_prunes_full_buckets():
+    with patch("app.ratelimit.time.monotonic", return_value=100.0):
+        backend = MemoryBackend()
+        backend.take("ip:a", 1, 1)
+    with patch("app.ratelimit.time.monotonic", return_value=1000.0):
+        backend.take("ip:b", 1, 1)
+    assert list(backend._buckets) == ["ip:b"]
+
+
+def test_rate_limit_returns_429_with_retry_after():
+    app, _ = make_app(rate=0.1, burst=2)
+    client = app.test_client()
+
+    assert client.get("/v1/ping").status_code == 200
+    assert client.get("/v1/ping").status_code == 200
+    response = client.get("/v1/ping")
+
+    assert response.status_code == 429
+    assert response.get_json() == {"message": "Too many requests"}
+    assert response.headers["Retry-After"] == "10"
+    assert client.get("/metrics").status_code == 200
+
+
+def test_rate_limit_is_per_client():
+    app, _ = make_app(rate=0.1, burst=1)
+    client = app.test_client()
+
+    assert client.get("/v1/ping").status_code == 200
+    assert client.get("/v1/ping").status_code == 429
+    other_ip = {"REMOTE_ADDR": "10.0.0.2"}
+    assert client.get("/v1/ping", environ_base=other_ip).status_code == 200
+    with_key = {"X-API-Key": "secret"}
+    assert client.get("/v1/ping", headers=with_key).status_code == 200
+    assert client.get("/v1/ping", headers=with_key,
+                      environ_base=other_ip).status_code == 429
+
+
+def test_client_key_hides_api_key():
+    app, limiter = make_app()
+    with app.test_request_context(headers={"X-API-Key": "secret"}):
+        key = client_key(request, limiter.api_keys)
+    assert key.startswith("key:") and "secret" not in key
+
+
+def test_unknown_api_keys_are_limited_per_address():
+    app, limiter = make_app(rate=0.1, burst=2)
+    client = app.test_client()
+
+    statuses = [client.get("/v1/ping", headers={"X-API-Key": f"random-{n}"}).status_code
+                for n in range(5)]
+
+    assert statuses == [200, 200, 429, 429, 429]
+    with app.test_request_context(headers={"X-API-Key": "random"},
+                                  environ_base={"REMOTE_ADDR": "10.0.0.3"}):
+        assert client_key(request, limiter.api_keys) == "ip:10.0.0.3"
+
+
+@pytest.mark.parametrize("trusted_proxies, expected", [
+    ("1", [404, 429, 404]),
+    ("0", [404, 429, 429]),
+])
+def test_rate_limit_trusts_forwarded_address(monkeypatch, trusted_proxies, expected):
+    monkeypatch.setenv("SWIFT_RATE_LIMIT", "0.1")
+    monkeypatch.setenv("SWIFT_RATE_LIMIT_BURST", "1")
+    monkeypatch.setenv("SWIFT_TRUSTED_PROXIES", trusted_proxies)
+    client = create_app("testing").test_client()
+
+    try:
+        statuses = [client.get("/v1/unknown",
+                               headers={"X-Forwarded-For": forwarded}).status_code
+                    for forwarded in ["203.0.113.1", "203.0.113.1", "203.0.113.2"]]
+        assert statuses == expected
+    finally:
+        monkeypatch.delenv("SWIFT_RATE_LIMIT")
+        monkeypatch.delenv("SWIFT_TRUSTED_PROXIES")
+        create_app("testing")
+
+
+def test_rate_limit_disabled_by_default():
+    app = Flask(__name__)
+    limiter = RateLimiter()
+    limiter.init_app(app)
+    assert not limiter.enabled
+    assert limiter.backend is None
+    assert not app.before_request_funcs
+
+
+def test_custom_backend_fails_open():
+    app, limiter = make_app(backend="tests.test_ratelimit:failing_backend")
+    assert isinstance(limiter.backend, FailingBackend)
+    client = app.test_client()
+    assert all(client.get("/v1/ping").status_code == 200 for _ in range(5))
+
+
+def test_load_backend_rejects_unknown_spec():
+    with pytest.raises(ValueError, match="memcached"):
+        load_backend("memcached", None)
@@ -0,0 +1,92 @@
+import os
+import pytest
+from unittest.mock import patch, MagicMock
+from flask import json
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db
+from app.models.bank import Bank
+from app.replicas import replica_router, ReplicaRouter, STICKY_COOKIE
+
+
+@pytest.fixture
+def client():
+    database_uri = create_app("testing").config["SQLALCHEMY_DATABASE_URI"]
+    with patch.dict(os.environ, {"DB_REPLICA_URIS": f"{database_uri},{database_uri}",
+                                 "SWIFT_CACHE_SIZE": "0"}):
+        app = create_app("testing")
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            db.session.add(Bank(swift_code="BPKOPLPWXXX", address="PULAWSKA 15",
+                                bank_name="PKO BANK POLSKI", country_iso2="PL",
+                                country_name="POLAND", is_headquarter=True))
+            db.session.commit()
+        yield client
+        with app.app_context():
+            db.session.remove()
+            for engine in replica_router.engines:
+                engine.dispose()
+            db.drop_all()
+
+
+def count_bank_queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "banks" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    return statements
+
+
+def test_lookups_are_served_by_replicas(client):
+    with client.application.app_context():
+        primary = count_bank_queries(db.engine)
+    replicas = [count_bank_queries(engine) for engine in replica_router.engines]
+
+    assert client.get("/v1/swift-codes/BPKOPLPWXXX").status_code == 200
+    assert client.get("/v1/swift-codes/country/PL").status_code == 200
+
+    assert primary == []
+    assert [len(statements) for statements in replicas] == [1, 1]
+
+
+def test_writes_go_to_primary_and_pin_reads(client):
+    with client.application.app_context():
+        primary = count_bank_queries(db.engine)
+    replicas = [count_bank_queries(engine) for engine in replica_router.engines]
+
+    bank = {
+        "swiftCode": "BREXPLPWXXX",
+        "address": "PROSTA 18",
+        "bankName": "MBANK",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True,
+    }
+    response = client.post("/v1/swift-codes", data=json.dumps(bank),
+                           content_type="application/json")
+    assert response.status_code == 201
+    assert STICKY_COOKIE in response.headers["Set-Cookie"]
+
+    writes = len(primary)
+    assert client.get("/v1/swift-codes/BREXPLPWXXX").status_code == 200
+    assert len(primary) == writes + 1
+    assert all(statements == [] for statements in replicas)
+
+
+def test_least_connections_picks_idlest_replica():
+    router = ReplicaRouter()
+    busy, idle = MagicMock(), MagicMock()
+    busy.pool.checkedout.return_value = 4
+    idle.pool.checkedout.return_value = 1
+    router.engines = [busy, idle]
+
+    router.strategy = "least_connections"
+    assert router.choose() is idle
+
+    router.strategy = "round_robin"
+    assert {router.choose(), router.choose()} == {busy, idle}
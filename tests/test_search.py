@@ -0,0 +1,49 @@
+from app.search import SearchIndex
+from app.snapshot import BankRecord
+
+
+def record(swift_code, bank_name, country_iso2="PL"):
+    return BankRecord(swift_code, "ADDRESS", bank_name, country_iso2, "POLAND",
+                      swift_code.endswith("XXX"))
+
+
+def test_search_index_prefix_and_name():
+    index = SearchIndex([
+        record("DEUTDEFFXXX", "DEUTSCHE BANK AG", "DE"),
+        record("DEUTDEFF500", "DEUTSCHE BANK AG", "DE"),
+        record("BCITITMMXXX", "BANCA INTESA SANPAOLO", "IT"),
+        record("DEUTITMMXXX", "DEUTSCHE BANK SPA", "IT"),
+    ])
+
+    assert [r.swift_code for r in index.search(prefix="DEUTDE")] == [
+        "DEUTDEFF500", "DEUTDEFFXXX"
+    ]
+    assert [r.swift_code for r in index.search(name="banca")] == ["BCITITMMXXX"]
+    assert [r.swift_code for r in index.search(name="deutsche", country_iso2="IT")] == [
+        "DEUTITMMXXX"
+    ]
+    assert len(index.search(prefix="DEUT", limit=2)) == 2
+
+
+def test_search_index_updates_incrementally():
+    original = SearchIndex([record("BPKOPLPWXXX", "PKO BANK POLSKI")])
+    index = original.updated(added=[record("BREXPLPWXXX", "MBANK")])
+    index = index.updated(removed=["BPKOPLPWXXX"])
+
+    assert index.search(name="POLSKI") == []
+    assert [r.swift_code for r in index.search(prefix="B")] == ["BREXPLPWXXX"]
+    assert [r.swift_code for r in index.search(name="MBANK")] == ["BREXPLPWXXX"]
+    assert [r.swift_code for r in original.search(name="POLSKI")] == ["BPKOPLPWXXX"]
+
+
+def test_search_index_applies_a_batch_of_updates():
+    codes = [f"BANK{n:04d}XXX" for n in range(100)]
+    index = SearchIndex([record(code, f"BANK {code}") for code in codes[::2]])
+
+    index = index.updated(added=[record(code, f"BANK {code}") for code in codes[1::2]],
+                          removed=codes[:50:2])
+
+    assert [r.swift_code for r in index.search(prefix="BANK", limit=100)] == (
+        codes[1:50:2] + codes[50:])
+    assert [r.swift_code for r in index.search(name="BANK0001")] == ["BANK0001XXX"]
+    assert index.search(name="BANK0002") == []
@@ -0,0 +1,50 @@
+import json
+from unittest.mock import patch
+from app import serializers
+from app.serializers import dumps, country_listing, country_listing_bytes
+from app.snapshot import BankRecord
+
+
+def make_banks():
+    return [
+        BankRecord("BPKOPLPWXXX", "PUŁAWSKA 15", "PKO BANK POLSKI", "PL", "POLAND",
+                   True),
+        BankRecord("BPKOPLPWWAW", "PUŁAWSKA 15", "PKO BANK POLSKI", "PL", "POLAND",
+                   False, "BPKOPLPWXXX"),
+    ]
+
+
+def test_dumps_is_compact_by_default():
+    with patch.object(serializers, "orjson", None):
+        assert dumps({"a": [1, 2]}) == b'{"a":[1,2]}'
+        assert dumps({"a": 1}, pretty=True) == b'{\n  "a": 1\n}'
+
+
+def test_pretty_output_does_not_depend_on_orjson():
+    listing = country_listing("PL", make_banks())
+    expected = (b'{\n  "countryISO2": "PL",\n  "countryName": "POLAND",\n'
+                b'  "swiftCodes": [\n    {\n      "swiftCode": "BPKOPLPWXXX",\n'
+                b'      "address": "PU\xc5\x81AWSKA 15",')
+
+    with patch.object(serializers, "orjson", None):
+        fallback = dumps(listing, pretty=True)
+    assert fallback.startswith(expected)
+    if serializers.orjson is not None:
+        assert dumps(listing, pretty=True) == fallback
+
+
+def test_country_listing_bytes_matches_encoded_listing():
+    banks = make_banks()
+
+    body = country_listing_bytes("PL", banks)
+
+    assert json.loads(body) == country_listing("PL", banks)
+
+
+def test_country_listing_bytes_reuses_fragments():
+    banks = make_banks()
+    country_listing_bytes("PL", banks)
+
+    with patch("app.snapshot.dumps") as mock_dumps:
+        country_listing_bytes("PL", banks)
+        mock_dumps.assert_not_called()
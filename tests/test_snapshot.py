@@ -0,0 +1,141 @@
+import os
+import pytest
+from unittest.mock import patch
+from flask import json
+from app import create_app
+from app.extensions import db
+from app.models.bank import Bank
+from app.snapshot import snapshot_store, DirectorySnapshot, BankRecord
+
+
+@pytest.fixture
+def client():
+    with patch.dict(os.environ, {"SWIFT_SNAPSHOT": "1", "SWIFT_CACHE_SIZE": "0"}):
+        app = create_app("testing")
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Bank(swift_code="BPKOPLPWXXX", address="PULAWSKA 15",
+                     bank_name="PKO BANK POLSKI", country_iso2="PL",
+                     country_name="POLAND", is_headquarter=True),
+                Bank(swift_code="BPKOPLPWWAW", address="PULAWSKA 15",
+                     bank_name="PKO BANK POLSKI", country_iso2="PL",
+                     country_name="POLAND", is_headquarter=False,
+                     associated_headquarter="BPKOPLPWXXX"),
+            ])
+            db.session.commit()
+        yield client
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+def test_snapshot_serves_lookups_without_database(client):
+    assert client.get("/v1/swift-codes/BPKOPLPWXXX").status_code == 200
+
+    with patch("app.routes.Bank") as mock_bank:
+        details = client.get("/v1/swift-codes/BPKOPLPWXXX").get_json()
+        country = client.get("/v1/swift-codes/country/pl").get_json()
+        mock_bank.query.filter_by.assert_not_called()
+
+    assert [b["swiftCode"] for b in details["branches"]] == ["BPKOPLPWWAW"]
+    assert len(country["swiftCodes"]) == 2
+    assert country["countryName"] == "POLAND"
+
+
+def test_snapshot_applies_writes(client):
+    client.get("/v1/swift-codes/BPKOPLPWXXX")
+    bank = {
+        "swiftCode": "BREXPLPWXXX",
+        "address": "PROSTA 18",
+        "bankName": "MBANK",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True,
+    }
+
+    client.post("/v1/swift-codes", data=json.dumps(bank),
+                content_type="application/json")
+    assert client.get("/v1/swift-codes/BREXPLPWXXX").status_code == 200
+
+    client.delete("/v1/swift-codes/BPKOPLPWWAW")
+    details = client.get("/v1/swift-codes/BPKOPLPWXXX").get_json()
+    assert details["branches"] == []
+    assert "BPKOPLPWWAW" not in snapshot_store.snapshot.banks
+
+
+def test_directory_snapshot_indexes():
+    snapshot = DirectorySnapshot([
+        BankRecord("BPKOPLPWXXX", "A", "PKO", "PL", "POLAND", True),
+        BankRecord("BPKOPLPWWAW", "B", "PKO", "PL", "POLAND", False, "BPKOPLPWXXX"),
+    ])
+
+    snapshot = snapshot.updated(added=[
+        BankRecord("BPKOPLPWWAW", "C", "PKO", "PL", "POLAND", False, "BPKOPLPWXXX"),
+    ])
+
+    assert len(snapshot) == 2
+    assert [b.address for b in snapshot.branches_of("BPKOPLPWXXX")] == ["C"]
+    assert len(snapshot.country("PL")) == 2
+    snapshot = snapshot.updated(removed=["BPKOPLPWXXX"])
+    assert snapshot.get("BPKOPLPWXXX") is None
+    assert snapshot.country("DE") == []
+
+
+def test_directory_snapshot_updates_leave_the_original_alone():
+    original = DirectorySnapshot([
+        BankRecord("BPKOPLPWXXX", "A", "PKO", "PL", "POLAND", True),
+        BankRecord("BPKOPLPWWAW", "B", "PKO", "PL", "POLAND", False, "BPKOPLPWXXX"),
+    ], version=1)
+    country = original.country("PL")
+
+    snapshot = original.updated(
+        added=[BankRecord("BPKOPLPWGDA", "C", "PKO", "PL", "POLAND", False,
+                          "BPKOPLPWXXX"),
+               BankRecord("ALBPPLPWXXX", "D", "ALIOR", "PL", "POLAND", True)],
+        removed=["BPKOPLPWWAW"], version=2)
+
+    assert [b.swift_code for b in snapshot.country("PL")] == [
+        "ALBPPLPWXXX", "BPKOPLPWGDA", "BPKOPLPWXXX"]
+    assert [b.swift_code for b in snapshot.branches_of("BPKOPLPWXXX")] == [
+        "BPKOPLPWGDA"]
+    assert [b.swift_code for b in snapshot.search(name="alior")] == ["ALBPPLPWXXX"]
+    assert snapshot.version == 2
+
+    assert original.country("PL") is country
+    assert [b.swift_code for b in country] == ["BPKOPLPWWAW", "BPKOPLPWXXX"]
+    assert [b.swift_code for b in original.branches_of("BPKOPLPWXXX")] == [
+        "BPKOPLPWWAW"]
+    assert original.search(name="alior") == []
+    assert len(original) == 2 and original.version == 1
+
+
+def test_snapshot_refresh_keeps_newer_snapshot(client):
+    client.get("/v1/swift-codes/BPKOPLPWXXX")
+    current = snapshot_store.snapshot
+    newer = current.updated([], ["BPKOPLPWWAW"], current.version + 1, None)
+    snapshot_store.snapshot = newer
+
+    with client.application.app_context():
+        snapshot_store.refresh()
+    assert snapshot_store.snapshot is newer
+
+
+def test_snapshot_country_pagination(client):
+    data = client.get("/v1/swift-codes/country/PL?limit=1&after=BPKOPLPWWAW").get_json()
+
+    assert [b["swiftCode"] for b in data["swiftCodes"]] == ["BPKOPLPWXXX"]
+    assert data["nextAfter"] is None
+
+
+def test_snapshot_search_follows_writes(client):
+    client.get("/v1/swift-codes/BPKOPLPWXXX")
+    client.delete("/v1/swift-codes/BPKOPLPWWAW")
+
+    with patch("app.routes.search_banks") as mock_search:
+        data = client.get("/v1/swift-codes/search?q=pko&prefix=BPKO").get_json()
+        mock_search.assert_not_called()
+
+    assert [b["swiftCode"] for b in data["results"]] == ["BPKOPLPWXXX"]
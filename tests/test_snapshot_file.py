@@ -0,0 +1,153 @@
+import os
+import struct
+import pytest
+import pandas as pd
+from unittest.mock import patch
+from sqlalchemy import select
+from app import create_app
+from app.extensions import db
+from app.models.bank import Bank
+from app.snapshot import snapshot_store, DirectorySnapshot
+from app.snapshot_file import (SnapshotFile, SnapshotFileError, write_snapshot_file,
+                               dump_snapshot_file, FILE_FIELDS, HEADER)
+from app.versioning import bump_dataset_version
+
+
+ROWS = [
+    ("BPKOPLPWXXX", "PULAWSKA 15", "PKO BANK POLSKI", "PL", "POLAND", True, None, 11),
+    ("BPKOPLPWWAW", None, "PKO BANK POLSKI", "PL", "POLAND", False, "BPKOPLPWXXX", 12),
+    ("BGUSBGSF", "UL. 1", "BULGARIAN BANK", "BG", "BULGARIA", True, None, None),
+    ("BPKOPLPWKRK", "RYNEK 1", "PKO BANK POLSKI", "PL", "POLAND", False, "BPKOPLPWXXX",
+     13),
+]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = tmp_path / "swift.snap"
+    write_snapshot_file(path, pd.DataFrame(ROWS, columns=FILE_FIELDS), version=7)
+    return path
+
+
+@pytest.fixture
+def app():
+    with patch.dict(os.environ, {"SWIFT_SNAPSHOT": "1"}):
+        app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_snapshot_file_lookups(snapshot_path):
+    with SnapshotFile(snapshot_path) as snapshot_file:
+        assert len(snapshot_file) == 4
+        assert snapshot_file.version == 7
+        assert snapshot_file.get("BPKOPLPWWAW") == ROWS[1][:7]
+        assert snapshot_file.get("BGUSBGSF") == ROWS[2][:7]
+        assert snapshot_file.get("BGUSBGSFXXX") is None
+        assert [row[0] for row in snapshot_file.branches_of("BPKOPLPWXXX")] == [
+            "BPKOPLPWKRK", "BPKOPLPWWAW"
+        ]
+        assert snapshot_file.branches_of("BPKOPLPWWAW") == []
+
+        frame = snapshot_file.frame()
+        assert list(frame.itertuples(index=False, name=None)) == sorted(ROWS)
+
+
+def test_snapshot_file_rejects_corruption(snapshot_path):
+    data = bytearray(snapshot_path.read_bytes())
+    data[-1] ^= 0xFF
+    snapshot_path.write_bytes(bytes(data))
+
+    with pytest.raises(SnapshotFileError, match="checksum"):
+        SnapshotFile(snapshot_path)
+
+
+def test_snapshot_file_rejects_other_schema_version(snapshot_path):
+    data = bytearray(snapshot_path.read_bytes())
+    struct.pack_into("<H", data, 8, 99)
+    snapshot_path.write_bytes(bytes(data))
+
+    with pytest.raises(SnapshotFileError, match="schema version 99"):
+        SnapshotFile(snapshot_path)
+
+
+def test_snapshot_file_rejects_truncated_file(snapshot_path):
+    snapshot_path.write_bytes(snapshot_path.read_bytes()[:HEADER.size + 10])
+
+    with pytest.raises(SnapshotFileError, match="truncated"):
+        SnapshotFile(snapshot_path)
+
+
+def test_dump_and_load_snapshot(app, tmp_path):
+    path = tmp_path / "swift.snap"
+    runner = app.test_cli_runner()
+    db.session.add_all([Bank(**dict(zip(FILE_FIELDS, row))) for row in ROWS])
+    db.session.commit()
+    dump_snapshot_file(path)
+
+    db.session.execute(Bank.__table__.delete().where(Bank.swift_code == "BPKOPLPWKRK"))
+    db.session.add(Bank(swift_code="BREXPLPWXXX", bank_name="MBANK", country_iso2="PL",
+                        country_name="POLAND", is_headquarter=True))
+    db.session.commit()
+
+    result = runner.invoke(args=["load-snapshot", "--file", str(path)])
+
+    assert result.exit_code == 0
+    assert '"inserted": 1' in result.output
+    assert '"deleted": 1' in result.output
+    rows = db.session.execute(select(*(getattr(Bank, name) for name in FILE_FIELDS))
+                              .order_by(Bank.swift_code)).all()
+    assert [tuple(row) for row in rows] == sorted(ROWS)
+
+
+def test_snapshot_store_warm_starts_from_file(app, tmp_path):
+    path = tmp_path / "swift.snap"
+    db.session.add_all([Bank(**dict(zip(FILE_FIELDS, row))) for row in ROWS])
+    bump_dataset_version()
+    db.session.commit()
+    dump_snapshot_file(path)
+    app.config["SWIFT_SNAPSHOT_FILE"] = str(path)
+    snapshot_store.init_app(app)
+
+    with patch("app.snapshot.load_snapshot") as mock_load, \
+            patch("app.snapshot.threading.Thread") as mock_thread:
+        snapshot = snapshot_store.current()
+
+    mock_load.assert_not_called()
+    mock_thread.assert_called_once_with(target=snapshot_store.promote,
+                                        args=(snapshot,), daemon=True)
+    with patch("app.snapshot.DirectorySnapshot") as mock_directory:
+        assert snapshot.get("BPKOPLPWWAW").associated_headquarter == "BPKOPLPWXXX"
+        assert len(snapshot.branches_of("BPKOPLPWXXX")) == 2
+        assert snapshot.get("BPKOPLPWAAA") is None
+    mock_directory.assert_not_called()
+
+    assert [b.swift_code for b in snapshot.country_page("PL", limit=2)] == [
+        "BPKOPLPWKRK", "BPKOPLPWWAW"]
+    snapshot_store.promote(snapshot)
+
+    assert isinstance(snapshot_store.snapshot, DirectorySnapshot)
+    assert snapshot_store.snapshot.version == snapshot.version
+    assert len(snapshot_store.snapshot) == len(snapshot) == 4
+    assert [b.swift_code for b in snapshot_store.snapshot.branches_of(
+        "BPKOPLPWXXX")] == [b.swift_code for b in snapshot.branches_of("BPKOPLPWXXX")]
+
+
+def test_snapshot_store_ignores_stale_file(app, tmp_path):
+    path = tmp_path / "swift.snap"
+    db.session.add_all([Bank(**dict(zip(FILE_FIELDS, row))) for row in ROWS])
+    db.session.commit()
+    dump_snapshot_file(path)
+    bump_dataset_version()
+    db.session.commit()
+    app.config["SWIFT_SNAPSHOT_FILE"] = str(path)
+    snapshot_store.init_app(app)
+
+    snapshot = snapshot_store.current()
+
+    assert snapshot is not None
+    assert len(snapshot) == 4
+    assert snapshot.version == 1
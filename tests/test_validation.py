@@ -0,0 +1,42 @@
+import numpy as np
+from app.validation import swift_code_checks, swift_code_error
+
+
+def test_swift_code_checks():
+    codes = ["BPKOPLPWXXX", "BPKOPLPW", "BPKOPL", "BPKOPLPWXXXX", "BP1OPLPWXXX",
+             "BPKO1LPWXXX", "BPKOPL-WXXX", "BPKOPLPWX-X", None, "BPKOPLPWXX"]
+    reasons = swift_code_checks(codes)
+
+    assert list(reasons) == [0, 0, 2, 2, 3, 4, 5, 6, 1, 2]
+    assert reasons.dtype == np.int8
+
+
+def test_swift_code_checks_country():
+    reasons = swift_code_checks(["BPKOPLPWXXX", "BPKOPLPWXXX", "BPKO1LPWXXX"],
+                                ["PL", "DE", "1L"])
+
+    assert list(reasons) == [0, 7, 4]
+
+
+def test_swift_code_checks_do_not_truncate():
+    reasons = swift_code_checks(["BPKOPLPWXXX", "BPKOPLPWXXX", "BPKOPLPWXXX",
+                                 "BPKOPLPWXXXXXXXX"],
+                                ["PLX", "P", None, "PL"])
+
+    assert list(reasons) == [8, 8, 8, 2]
+    assert swift_code_error("BPKOPLPWXXX", "PLX") == "countryISO2 must be 2 letters"
+
+
+def test_swift_code_checks_count_trailing_nuls():
+    reasons = swift_code_checks(["DEUTDEFF\x00", "DEUTDEFF", "DEUTDEFF"],
+                                ["DE", "DE", "D\x00"])
+
+    assert list(reasons) == [2, 0, 8]
+
+
+def test_swift_code_error():
+    assert swift_code_error("BPKOPLPWXXX", "PL") is None
+    assert swift_code_error("BPKOPLPWXXX", "DE") == \
+        "SWIFT code country does not match countryISO2"
+    assert swift_code_error("bpkoplpwxxx") == "SWIFT code bank code must be 4 letters"
+    assert swift_code_error(None) == "SWIFT code is missing"